@@ -0,0 +1,183 @@
+"""
+Benchmark of filename pattern detection and file matching.
+
+Pattern detection (detectar_mejor_patron): compares the pairwise
+implementation (every name against every later one, reproduced below) with
+the current one on synthetic folders that follow common drawing naming
+schemes, and checks that both find the same pattern.
+
+Matching (comparar_listas_completo): pairs a synthetic revision of a folder
+(renamed with a revision suffix, some drawings dropped, added or retitled)
+with the original, at each size. Reports the time, how many sources were
+paired with their true destination, and destinations claimed by more than
+one source. The previous implementation (every source against every
+destination, best ratio taken greedily) is run up to --max-por-pares sources.
+
+Usage:
+    python benchmarks/bench_emparejamiento.py [--archivos 5000] [--umbral 0.5]
+        [--tamanos 1000 10000 50000] [--max-por-pares 1000]
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import funciones_comparador as fc  # noqa: E402
+
+DISCIPLINAS = ["ARQ", "EST", "ELE", "HID", "MEC", "SAN", "URB", "PAI"]
+TITULOS = ["Planta Baja", "Planta Alta", "Cimentacion", "Cubierta", "Fachadas", "Secciones", "Detalles", "Cortes"]
+
+
+def patron_por_pares(lista_archivos: list[str], umbral: float) -> str | None:
+    """Previous implementation: SequenceMatcher.ratio() over every sorted pair."""
+    lista_ordenada = sorted(lista_archivos)
+    mejor_patron: str | None = None
+    max_repeticiones = 0
+    visitados: set[int] = set()
+    for i, base in enumerate(lista_ordenada):
+        if i in visitados:
+            continue
+        patron_candidato = base
+        contador = 1
+        visitados.add(i)
+        for j in range(i + 1, len(lista_ordenada)):
+            if j in visitados:
+                continue
+            candidato = lista_ordenada[j]
+            if SequenceMatcher(None, base, candidato).ratio() >= umbral:
+                visitados.add(j)
+                contador += 1
+                patron_candidato = fc.encontrar_texto_comun(patron_candidato, candidato)
+        patron_candidato = patron_candidato.strip()
+        if contador > max_repeticiones and len(patron_candidato) > 3:
+            max_repeticiones = contador
+            mejor_patron = patron_candidato
+    return mejor_patron
+
+
+def emparejar_por_pares(dic1: dict, dic2: dict, umbral: float) -> dict[str, str]:
+    """Previous matching: each source takes its most similar destination, even if already taken."""
+    pares = {}
+    for clave1, datos1 in dic1.items():
+        mejor = (None, 0.0)
+        for clave2, datos2 in dic2.items():
+            ratio = SequenceMatcher(None, datos1["valor"], datos2["valor"]).ratio()
+            if ratio > mejor[1]:
+                mejor = (clave2, ratio)
+        if mejor[0] is not None and mejor[1] >= umbral:
+            pares[clave1] = mejor[0]
+    return pares
+
+
+def diccionario_carpeta(nombres: list[str]) -> dict[str, dict[str, str]]:
+    """What procesar_carpeta returns for a folder with these files."""
+    patron = fc.detectar_mejor_patron(nombres)
+    return {nombre: {"valor": fc.valor_de_nombre(nombre, patron), "path": nombre} for nombre in nombres}
+
+
+def revision_sintetica(archivos: int, semilla: int = 0) -> tuple[list[str], list[str], dict[str, str]]:
+    """
+    A folder of drawings and its next revision.
+    
+    Returns:
+        Tuple (original names, revised names, original name -> revised name)
+    """
+    rng = random.Random(semilla)
+    origen = [
+        f"PRJ-{DISCIPLINAS[i % 8]}-{i:05d} {rng.choice(TITULOS)} Nivel {rng.randint(1, 20)}.pdf" 
+        for i in range(archivos)
+    ]
+    verdad = {}
+    for nombre in origen:
+        azar = rng.random()
+        if azar < 0.05:
+            continue  # Dropped from the revision
+        revisado = nombre.replace(" ", f"_R{rng.randint(1, 3)} ", 1)
+        if azar < 0.15:
+            revisado = revisado.rsplit(" Nivel", 1)[0] + f" {rng.choice(TITULOS)}.pdf"  # Retitled
+        verdad[nombre] = revisado
+    nuevos = [f"PRJ-{DISCIPLINAS[i % 8]}-{i:05d}_R1 {rng.choice(TITULOS)}.pdf" for i in range(archivos, archivos * 21 // 20)]
+    destino = list(verdad.values()) + nuevos
+    rng.shuffle(destino)
+    return origen, destino, verdad
+
+
+def medir_emparejamiento(archivos: int, umbral: float, max_por_pares: int) -> None:
+    """Print the matching figures for one folder size."""
+    origen, destino, verdad = revision_sintetica(archivos)
+    dic1, dic2 = diccionario_carpeta(origen), diccionario_carpeta(destino)
+    
+    inicio = time.perf_counter()
+    resultados = fc.comparar_listas_completo(dic1, dic2, umbral)
+    segundos = time.perf_counter() - inicio
+    pares = {r["origen"]["clave"]: r["destino"]["clave"] for r in resultados if r["tipo"] == "match"}
+    implementaciones = [("indexed + auction", segundos, pares)]
+    
+    if archivos <= max_por_pares:
+        inicio = time.perf_counter()
+        pares = emparejar_por_pares(dic1, dic2, umbral)
+        implementaciones.append(("pairwise greedy", time.perf_counter() - inicio, pares))
+    
+    for nombre, segundos, pares in implementaciones:
+        correctos = sum(pares.get(o) == d for o, d in verdad.items())
+        repetidos = len(pares) - len(set(pares.values()))
+        print(
+            f"{archivos:>7} files, {nombre:>17}: {segundos:8.2f} s  "
+            f"true pairs found {correctos}/{len(verdad)}  destinations claimed twice {repetidos}"
+        )
+
+
+def carpetas_sinteticas(archivos: int, semilla: int = 0) -> dict[str, list[str]]:
+    """Folders of `archivos` names in several naming schemes."""
+    rng = random.Random(semilla)
+    extras = ["Transmittal.pdf", "LEEME.txt", "Indice de planos.xlsx"]
+    return {
+        "one discipline": [f"PRJ-ARQ-{i:04d}.pdf" for i in range(archivos)],
+        "revisions": [f"PRJ-ARQ-{i:04d}_R{rng.randint(0, 3)}.pdf" for i in range(archivos)] + extras,
+        "disciplines": [f"PRJ-{DISCIPLINAS[i % 8]}-{i:04d}.pdf" for i in range(archivos)],
+        "titled": [
+            f"{rng.choice('AESM')}-{i:04d} {rng.choice(TITULOS)} Nivel {rng.randint(1, 20)}.pdf" 
+            for i in range(archivos)
+        ],
+        "unrelated": [
+            "".join(rng.choice("abcdefghijklmnopqrstuvwxyz_-0123456789") for _ in range(rng.randint(8, 30))) + ".pdf"
+            for _ in range(archivos)
+        ],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archivos", type=int, default=5000)
+    parser.add_argument("--umbral", type=float, default=0.5)
+    parser.add_argument("--tamanos", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--max-por-pares", type=int, default=1000)
+    args = parser.parse_args()
+
+    print("Pattern detection")
+
+    for nombre, archivos in carpetas_sinteticas(args.archivos).items():
+        tiempos = []
+        patrones = []
+        for funcion in (patron_por_pares, fc.detectar_mejor_patron):
+            inicio = time.perf_counter()
+            patrones.append(funcion(archivos, args.umbral))
+            tiempos.append(time.perf_counter() - inicio)
+        print(
+            f"{nombre:>15}: pairwise {tiempos[0]:8.2f} s  indexed {tiempos[1]:8.3f} s  "
+            f"same pattern: {patrones[0] == patrones[1]} ({patrones[1]!r})"
+        )
+
+    print("Matching")
+    for archivos in args.tamanos:
+        medir_emparejamiento(archivos, args.umbral, args.max_por_pares)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark of noise removal (limpiar_ruido_mascara) on speckled scans.
+
+Compares drawing every external contour whose cv2.contourArea is large
+enough (the previous implementation, reproduced below) with the current
+connected-component filter, on an A3 difference mask with growing amounts of
+scanner speckle. Reports the number of blobs, the time of each and how many
+pixels differ: the decisions and fills are the same, but drawContours'
+polygon fill can also paint the odd background pixel in a concave diagonal
+notch of a contour.
+
+Usage:
+    python benchmarks/bench_limpiar_ruido.py [--dpi 300] [--densidades 0 0.001 0.01 0.05]
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import funciones_comparador as fc  # noqa: E402
+
+
+def limpiar_por_contorno(mask: np.ndarray, min_area: int) -> np.ndarray:
+    """Previous implementation: contourArea and drawContours once per blob."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    mask_clean = np.zeros_like(mask)
+    for cnt in contours:
+        if cv2.contourArea(cnt) > min_area:
+            cv2.drawContours(mask_clean, [cnt], -1, 255, -1)
+    return mask_clean
+
+
+def mascara_escaneada(ancho: int, alto: int, densidad: float, semilla: int = 0) -> np.ndarray:
+    """A few real changes (outlines and text) plus a fraction `densidad` of speckle pixels."""
+    rng = np.random.default_rng(semilla)
+    mask = ((rng.random((alto, ancho)) < densidad) * 255).astype(np.uint8)
+    for _ in range(20):
+        x, y = int(rng.integers(0, ancho - 400)), int(rng.integers(60, alto - 300))
+        cv2.rectangle(mask, (x, y), (x + int(rng.integers(40, 400)), y + int(rng.integers(30, 300))), 255, 3)
+        cv2.putText(mask, "REV B", (x, y), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 255, 3)
+    return mask
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--densidades", type=float, nargs="+", default=[0, 0.001, 0.01, 0.05])
+    args = parser.parse_args()
+
+    ancho, alto = int(420 / 25.4 * args.dpi), int(297 / 25.4 * args.dpi)
+    min_area = fc.get_min_contour_area()
+    print(f"Mask: {ancho}x{alto} px, min_contour_area {min_area}")
+
+    for densidad in args.densidades:
+        mask = mascara_escaneada(ancho, alto, densidad)
+        blobs = cv2.connectedComponents(mask, connectivity=8)[0] - 1
+        tiempos = []
+        salidas = []
+        for funcion in (limpiar_por_contorno, fc.limpiar_ruido_mascara):
+            inicio = time.perf_counter()
+            salidas.append(funcion(mask, min_area))
+            tiempos.append(time.perf_counter() - inicio)
+        print(
+            f"speckle {densidad:6.3f}: {blobs:>8} blobs  per contour {tiempos[0]:7.3f} s  "
+            f"components {tiempos[1]:7.3f} s  differing pixels {np.count_nonzero(salidas[0] != salidas[1])}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark of the diff kernel (NucleoDiferencias).
+
+Compares the diff + composition stages as separate full-frame passes (the
+previous implementation, reproduced below) against the kernel with reused
+buffers and table-lookup composition. Reports wall time per page and the
+memory allocated per page (tracemalloc), and checks that both produce the
+same image.
+
+Usage:
+    python benchmarks/bench_nucleo_diferencias.py [archivo.pdf] [--dpi 300] [--repeticiones 5]
+
+Without a PDF, a synthetic A3 drawing is used.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import funciones_comparador as fc  # noqa: E402
+
+
+def diferencias_por_pasadas(gray_base: np.ndarray, gray_new: np.ndarray) -> np.ndarray:
+    """Previous implementation: one allocation per stage, boolean-mask colouring."""
+    fondo = gray_base
+    if fc.get_usar_blur():
+        gray_base = cv2.GaussianBlur(gray_base, (5, 5), 0)
+        gray_new = cv2.GaussianBlur(gray_new, (5, 5), 0)
+
+    umbral_bin = fc.get_umbral_bin()
+    _, bin_base = cv2.threshold(cv2.bitwise_not(gray_base), umbral_bin, 255, cv2.THRESH_BINARY)
+    _, bin_new = cv2.threshold(cv2.bitwise_not(gray_new), umbral_bin, 255, cv2.THRESH_BINARY)
+
+    kernel = np.ones((fc.get_kernel_size(), fc.get_kernel_size()), np.uint8)
+    base_dilatada = cv2.dilate(bin_base, kernel, iterations=fc.get_iteraciones())
+    new_dilatada = cv2.dilate(bin_new, kernel, iterations=fc.get_iteraciones())
+
+    min_area = fc.get_min_contour_area()
+    mask_green = fc.limpiar_ruido_mascara(cv2.subtract(bin_new, base_dilatada), min_area)
+    mask_magenta = fc.limpiar_ruido_mascara(cv2.subtract(bin_base, new_dilatada), min_area)
+
+    ghost_bg = cv2.addWeighted(fondo, 0.3, np.full_like(fondo, 255), 0.7, 0)
+    final_img = cv2.cvtColor(ghost_bg, cv2.COLOR_GRAY2RGB)
+    final_img[mask_green > 0] = fc.Colors.GREEN
+    final_img[mask_magenta > 0] = fc.Colors.MAGENTA
+    return final_img
+
+
+def diferencias_nucleo(gray_base: np.ndarray, gray_new: np.ndarray) -> np.ndarray:
+    """Current implementation: reused buffers and one table lookup to compose."""
+    nucleo = fc.obtener_nucleo_diferencias()
+    mask_green, mask_magenta = nucleo.mascaras(gray_base, gray_new, fc.get_min_contour_area())
+    return nucleo.componer(gray_base, mask_green, mask_magenta, out=nucleo.buffer_composicion(gray_base.shape))
+
+
+def pagina_sintetica(ancho: int, alto: int, semilla: int) -> np.ndarray:
+    """A drawing-like page: frames, lines and text on white."""
+    rng = np.random.default_rng(semilla)
+    pagina = np.full((alto, ancho), 255, dtype=np.uint8)
+    for _ in range(400):
+        x, y = int(rng.integers(0, ancho - 400)), int(rng.integers(0, alto - 300))
+        w, h = int(rng.integers(40, 400)), int(rng.integers(30, 300))
+        cv2.rectangle(pagina, (x, y), (x + w, y + h), 0, 3)
+        cv2.line(pagina, (x, y), (x + w + 100, y + h // 2), 0, 2)
+    for _ in range(150):
+        x, y = int(rng.integers(0, ancho - 600)), int(rng.integers(40, alto))
+        cv2.putText(pagina, f"COTA {int(rng.integers(0, 9999))}", (x, y), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+    return pagina
+
+
+def cargar_paginas(ruta: str | None, dpi: int) -> tuple[np.ndarray, np.ndarray]:
+    """A base page and a modified copy of it."""
+    if ruta:
+        with fc.DocumentoPDF(ruta) as doc:
+            base = doc.renderizar_pagina(0, dpi, gris=True)
+    else:
+        # A3 landscape at the requested DPI
+        base = pagina_sintetica(int(420 / 25.4 * dpi), int(297 / 25.4 * dpi), 0)
+
+    nueva = base.copy()
+    alto, ancho = nueva.shape
+    cv2.circle(nueva, (ancho // 2, alto // 2), alto // 10, 0, 6)
+    cv2.putText(nueva, "NOTA NUEVA", (ancho // 3, alto // 3), cv2.FONT_HERSHEY_SIMPLEX, 3, 0, 6)
+    nueva[alto // 5:alto // 5 + 200, ancho // 5:ancho // 5 + 600] = 255
+    return base, nueva
+
+
+def medir(funcion, base: np.ndarray, nueva: np.ndarray, repeticiones: int) -> tuple[float, float]:
+    """Seconds per page and peak MB allocated during one page."""
+    funcion(base, nueva)  # Warm-up (first-use buffers, cached tables)
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion(base, nueva)
+    segundos = (time.perf_counter() - inicio) / repeticiones
+
+    # NumPy reports its array allocations to tracemalloc (OpenCV outputs are NumPy arrays)
+    tracemalloc.start()
+    funcion(base, nueva)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return segundos, pico / 2 ** 20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf", nargs="?", help="PDF whose first page is used (default: synthetic A3)")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    base, nueva = cargar_paginas(args.pdf, args.dpi)
+    print(f"Page: {base.shape[1]}x{base.shape[0]} px")
+
+    referencia = diferencias_por_pasadas(base, nueva)
+    resultado = diferencias_nucleo(base, nueva)
+    print(f"Identical output: {np.array_equal(referencia, resultado)}")
+
+    for nombre, funcion in (("separate passes", diferencias_por_pasadas), ("kernel", diferencias_nucleo)):
+        segundos, megas = medir(funcion, base, nueva, args.repeticiones)
+        print(f"{nombre:>16}: {segundos * 1000:8.1f} ms/page  {megas:8.1f} MB peak allocation")
+
+
+if __name__ == "__main__":
+    main()
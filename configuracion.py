@@ -18,23 +18,51 @@ class ConfiguracionApp:
     
     # PDF to Image conversion
     dpi: int = 200
+    renderizado_gris: bool = False
     
     # Batch processing
     batch_size: int = 5
+    tamano_tesela: int = 0
+    modo_adaptativo: bool = False
+    dpi_previo: int = 72
+    despacho_paginas: str = "principal"
+    paginas_salida: str = "todas"
+    indice_cambios: bool = False
+    codificacion_salida: str = "jpeg"
+    compresion_salida: int = 1
+    
+    # Rendered page cache
+    usar_cache: bool = False
+    cache_max_mb: int = 512
     
     # Image comparison
+    motor_comparacion: str = "raster"
     min_contour_area: int = 15
     usar_blur: bool = True
     umbral_bin: int = 50
     kernel_size: int = 3
     iteraciones: int = 2
+    bloque_sin_cambios: int = 0
     
     # File matching
     similarity_threshold: float = 0.5
+    recorrer_subcarpetas: bool = False
+    filtro_archivos: str = "*.pdf"
+    estrategia_emparejamiento: str = "nombre"
     
     # Image alignment
     orb_max_features: int = 20000
+    rejilla_orb: int = 0
+    emparejador_orb: str = "fuerza_bruta"
+    lsh_tablas: int = 12
+    lsh_tamano_clave: int = 20
+    lsh_sondeo: int = 2
+    lsh_comprobaciones: int = 50
     min_matches_homography: int = 20
+    prealineacion: bool = False
+    reutilizar_alineacion: bool = False
+    resolucion_alineacion: int = 0
+    refinar_alineacion: bool = True
 
     def to_dict(self) -> dict[str, Any]:
         """Convert configuration to dictionary."""
@@ -56,6 +84,12 @@ def get_config() -> ConfiguracionApp:
     return _config
 
 
+def set_config(config: ConfiguracionApp) -> None:
+    """Replace the current configuration without saving it to file."""
+    global _config
+    _config = config
+
+
 def save_config(config: ConfiguracionApp) -> None:
     """Save configuration to file and update global instance."""
     global _config
@@ -104,6 +138,16 @@ CONFIG_OPTIONS = {
         "default": 200,
         "type": "combo"
     },
+    "renderizado_gris": {
+        "label": "Renderizado en Grises",
+        "description": "Canales usados al convertir y comparar páginas.\n"
+                      "• Sí: Un canal, 3 veces menos memoria (recomendado para planos)\n"
+                      "• No: Color RGB (convertido a grises al comparar)",
+        "values": [True, False],
+        "display_values": ["Sí", "No"],
+        "default": False,
+        "type": "combo"
+    },
     "batch_size": {
         "label": "Tamaño de Lote",
         "description": "Páginas procesadas simultáneamente.\n"
@@ -116,6 +160,139 @@ CONFIG_OPTIONS = {
         "default": 5,
         "type": "combo"
     },
+    "tamano_tesela": {
+        "label": "Procesamiento por Teselas",
+        "description": "Divide las hojas muy grandes (A0/A1 a alta resolución) en teselas.\n"
+                      "Renderizado y diferencias usan memoria según la tesela; la limpieza\n"
+                      "de ruido final usa 1 byte por píxel de la hoja. Mismo resultado.\n"
+                      "• Desactivado: Procesar la hoja completa\n"
+                      "• 2048 px: Mínimo consumo de RAM\n"
+                      "• 4096 px: Balance (recomendado para A0)\n"
+                      "• 8192 px: Menos teselas, más RAM",
+        "values": [0, 2048, 4096, 8192],
+        "display_values": ["Desactivado", "2048 px", "4096 px", "8192 px"],
+        "default": 0,
+        "type": "combo"
+    },
+    "modo_adaptativo": {
+        "label": "Comparación en Dos Pasadas",
+        "description": "Detecta primero las zonas con cambios a baja resolución y\n"
+                      "solo esas zonas se procesan a la resolución completa.\n"
+                      "• Sí: Mucho más rápido cuando hay pocos cambios por hoja;\n"
+                      "  el plano original se sigue dibujando a la resolución completa\n"
+                      "• No: Procesar toda la hoja a la resolución completa",
+        "values": [True, False],
+        "display_values": ["Sí", "No"],
+        "default": False,
+        "type": "combo"
+    },
+    "dpi_previo": {
+        "label": "Resolución de Detección",
+        "description": "Resolución de la primera pasada (Comparación en Dos Pasadas).\n"
+                      "• 50: Más rápido, zonas a refinar más amplias\n"
+                      "• 72: Balance (recomendado)\n"
+                      "• 100: Detecta cambios más finos",
+        "values": [50, 72, 100],
+        "default": 72,
+        "type": "combo"
+    },
+    "despacho_paginas": {
+        "label": "Conversión en Paralelo",
+        "description": "Dónde se convierten las páginas a imagen.\n"
+                      "• En cada proceso: Cada proceso abre los PDF y convierte sus páginas;\n"
+                      "  no se copian imágenes entre procesos (recomendado)\n"
+                      "• En el proceso principal: Se convierten antes de repartirlas",
+        "values": ["trabajadores", "principal"],
+        "display_values": ["En cada proceso", "En el proceso principal"],
+        "default": "principal",
+        "type": "combo"
+    },
+    "paginas_salida": {
+        "label": "Páginas en el PDF Comparativo",
+        "description": "Qué páginas se guardan en el PDF comparativo.\n"
+                      "• Todas: Todas las páginas, con o sin cambios\n"
+                      "• Solo las que cambian: Omite las páginas sin cambios; cada página\n"
+                      "  lleva rotulado su número original (mucho más rápido y ligero)\n"
+                      "• Marcador en las que no cambian: Mantiene la numeración con una\n"
+                      "  página en blanco que indica que no hay cambios",
+        "values": ["todas", "cambiadas", "marcador"],
+        "display_values": ["Todas", "Solo las que cambian", "Marcador en las que no cambian"],
+        "default": "todas",
+        "type": "combo"
+    },
+    "indice_cambios": {
+        "label": "Índice de Cambios (JSON)",
+        "description": "Guardar junto a cada PDF comparativo un archivo .json con las\n"
+                      "páginas que cambian, la superficie añadida/eliminada y la posición\n"
+                      "de cada zona de cambios, para revisar lotes sin abrir los PDF.\n"
+                      "• Sí: Generar el índice (recomendado)\n"
+                      "• No: Solo el PDF comparativo",
+        "values": [True, False],
+        "display_values": ["Sí", "No"],
+        "default": False,
+        "type": "combo"
+    },
+    "codificacion_salida": {
+        "label": "Codificación del PDF Comparativo",
+        "description": "Cómo se guardan las páginas del PDF comparativo.\n"
+                      "• JPEG: Imagen a color con pérdida (como hasta ahora)\n"
+                      "• Paleta: Solo los grises del fondo y los dos colores de resaltado,\n"
+                      "  sin pérdida y del orden de la mitad de tamaño\n"
+                      "• Fondo + máscaras: Fondo en grises y cada color como máscara de\n"
+                      "  1 bit; sin componer la imagen a color (rápida y ligera)\n"
+                      "• PDF original + máscaras: Copia la página original en vectores,\n"
+                      "  atenuada, con los cambios encima; el texto se puede buscar y el\n"
+                      "  archivo es del tamaño del original",
+        "values": ["jpeg", "paleta", "mascaras", "vectorial"],
+        "display_values": ["JPEG", "Paleta", "Fondo + máscaras", "PDF original + máscaras"],
+        "default": "jpeg",
+        "type": "combo"
+    },
+    "compresion_salida": {
+        "label": "Compresión del PDF Comparativo",
+        "description": "Nivel de compresión (Flate) de las codificaciones sin pérdida (Paleta y máscaras).\n"
+                      "• Rápida: Escribe antes, archivo algo mayor (recomendado)\n"
+                      "• Media / Alta: Archivo más pequeño, escritura más lenta\n"
+                      "No afecta a JPEG.",
+        "values": [1, 3, 6],
+        "display_values": ["Rápida", "Media", "Alta"],
+        "default": 1,
+        "type": "combo"
+    },
+    "usar_cache": {
+        "label": "Caché de Páginas",
+        "description": "Guardar en disco las páginas ya convertidas, en la carpeta\n"
+                      "de caché del usuario (no junto a la aplicación).\n"
+                      "• Sí: Repetir comparaciones de los mismos PDFs es mucho más rápido\n"
+                      "• No: Convertir siempre desde el PDF (recomendado)",
+        "values": [True, False],
+        "display_values": ["Sí", "No"],
+        "default": False,
+        "type": "combo"
+    },
+    "cache_max_mb": {
+        "label": "Tamaño Máximo de Caché",
+        "description": "Espacio en disco para la caché de páginas.\n"
+                      "Al llenarse se eliminan las páginas usadas hace más tiempo.\n"
+                      "• 256 MB: Mínimo\n"
+                      "• 512 MB: Balance (recomendado)\n"
+                      "• 4 GB: Carpetas muy grandes",
+        "values": [256, 512, 1024, 2048, 4096],
+        "display_values": ["256 MB", "512 MB", "1 GB", "2 GB", "4 GB"],
+        "default": 512,
+        "type": "combo"
+    },
+    "motor_comparacion": {
+        "label": "Motor de Comparación",
+        "description": "Cómo se detectan los cambios entre páginas.\n"
+                      "• Raster: Compara imágenes (funciona con todo)\n"
+                      "• Vectorial: Compara líneas y textos de PDFs exportados de CAD,\n"
+                      "  mucho más rápido; las páginas escaneadas usan Raster",
+        "values": ["raster", "vectorial"],
+        "display_values": ["Raster", "Vectorial"],
+        "default": "raster",
+        "type": "combo"
+    },
     "min_contour_area": {
         "label": "Área Mínima de Detección",
         "description": "Tamaño mínimo de mancha a detectar.\n"
@@ -170,6 +347,19 @@ CONFIG_OPTIONS = {
         "default": 2,
         "type": "combo"
     },
+    "bloque_sin_cambios": {
+        "label": "Omitir Zonas Sin Cambios",
+        "description": "Divide la página alineada en bloques y solo analiza los que\n"
+                      "tienen algún píxel distinto (y su entorno). El resultado es el mismo.\n"
+                      "• Desactivado: Analizar siempre la página completa\n"
+                      "• 32 px: Bloques pequeños, omite más en cambios dispersos\n"
+                      "• 64 px: Balance (recomendado)\n"
+                      "• 128 px: Bloques grandes, menos zonas a analizar",
+        "values": [0, 32, 64, 128],
+        "display_values": ["Desactivado", "32 px", "64 px", "128 px"],
+        "default": 0,
+        "type": "combo"
+    },
     "similarity_threshold": {
         "label": "Umbral de Similitud",
         "description": "Porcentaje mínimo para emparejar archivos.\n"
@@ -183,6 +373,41 @@ CONFIG_OPTIONS = {
         "default": 0.50,
         "type": "combo"
     },
+    "recorrer_subcarpetas": {
+        "label": "Incluir Subcarpetas",
+        "description": "Buscar archivos también dentro de las subcarpetas (árboles de proyecto).\n"
+                      "Los comparativos se guardan en las mismas subcarpetas dentro de la\n"
+                      "carpeta de salida.\n"
+                      "• Sí: Recorrer toda la carpeta\n"
+                      "• No: Solo los archivos de la carpeta seleccionada",
+        "values": [True, False],
+        "display_values": ["Sí", "No"],
+        "default": False,
+        "type": "combo"
+    },
+    "filtro_archivos": {
+        "label": "Archivos a Emparejar",
+        "description": "Qué archivos de las carpetas se tienen en cuenta.\n"
+                      "• Solo PDF: Ignora el resto de archivos (recomendado)\n"
+                      "• Todos los archivos: Lista todo lo que haya en la carpeta",
+        "values": ["*.pdf", "*"],
+        "display_values": ["Solo PDF", "Todos los archivos"],
+        "default": "*.pdf",
+        "type": "combo"
+    },
+    "estrategia_emparejamiento": {
+        "label": "Emparejar Por",
+        "description": "Cómo se emparejan los archivos de origen y destino.\n"
+                      "• Nombre: Similitud de los nombres (rápido)\n"
+                      "• Contenido: Páginas, tamaño de hoja, texto del rótulo y\n"
+                      "  miniatura de la primera página (archivos renombrados)\n"
+                      "• Nombre o contenido: La mejor de las dos similitudes\n"
+                      "Las huellas de contenido se guardan en la carpeta de caché del usuario",
+        "values": ["nombre", "contenido", "combinada"],
+        "display_values": ["Nombre", "Contenido", "Nombre o contenido"],
+        "default": "nombre",
+        "type": "combo"
+    },
     "orb_max_features": {
         "label": "Puntos de Alineación",
         "description": "Puntos de referencia para alinear páginas.\n"
@@ -190,11 +415,75 @@ CONFIG_OPTIONS = {
                       "• 15000: Balance\n"
                       "• 20000: Alta precisión (recomendado)\n"
                       "• 25000: Muy alta precisión\n"
-                      "• 30000: Máxima precisión, muy lento",
+                      "• 30000: Máxima precisión, más lento",
         "values": [10000, 15000, 20000, 25000, 30000],
         "default": 20000,
         "type": "combo"
     },
+    "rejilla_orb": {
+        "label": "Reparto de Puntos",
+        "description": "Divide la página en una rejilla y reparte los puntos de alineación\n"
+                      "entre sus celdas, para que zonas muy densas (rayados, textos)\n"
+                      "no se queden con todos.\n"
+                      "• Desactivado: Los puntos más fuertes de toda la página\n"
+                      "• 4x4: Reparto grueso\n"
+                      "• 8x8: Balance (recomendado)\n"
+                      "• 16x16: Reparto fino",
+        "values": [0, 4, 8, 16],
+        "display_values": ["Desactivado", "4x4", "8x8", "16x16"],
+        "default": 0,
+        "type": "combo"
+    },
+    "emparejador_orb": {
+        "label": "Búsqueda de Coincidencias",
+        "description": "Cómo se buscan los puntos equivalentes entre páginas.\n"
+                      "• Índice (FLANN): Muy rápido con muchos puntos (recomendado)\n"
+                      "• Exhaustiva: Compara todos con todos, lento con muchos puntos",
+        "values": ["flann", "fuerza_bruta"],
+        "display_values": ["Índice (FLANN)", "Exhaustiva"],
+        "default": "fuerza_bruta",
+        "type": "combo"
+    },
+    "lsh_tablas": {
+        "label": "Tablas del Índice",
+        "description": "Tablas hash del índice FLANN.\n"
+                      "• 6: Más rápido, encuentra menos coincidencias\n"
+                      "• 12: Balance (recomendado)\n"
+                      "• 20: Más coincidencias, más memoria",
+        "values": [6, 12, 20],
+        "default": 12,
+        "type": "combo"
+    },
+    "lsh_tamano_clave": {
+        "label": "Tamaño de Clave del Índice",
+        "description": "Bits de cada clave hash del índice FLANN.\n"
+                      "• 12: Cubetas grandes, búsqueda más lenta y completa\n"
+                      "• 20: Balance (recomendado)\n"
+                      "• 24: Cubetas pequeñas, búsqueda más rápida",
+        "values": [12, 20, 24],
+        "default": 20,
+        "type": "combo"
+    },
+    "lsh_sondeo": {
+        "label": "Sondeo del Índice",
+        "description": "Cubetas vecinas revisadas en cada tabla del índice FLANN.\n"
+                      "• 0: Solo la cubeta exacta\n"
+                      "• 1: Conservador\n"
+                      "• 2: Balance (recomendado)",
+        "values": [0, 1, 2],
+        "default": 2,
+        "type": "combo"
+    },
+    "lsh_comprobaciones": {
+        "label": "Comprobaciones del Índice",
+        "description": "Candidatos revisados por cada punto en el índice FLANN.\n"
+                      "• 32: Más rápido\n"
+                      "• 50: Balance (recomendado)\n"
+                      "• 100: Más exhaustivo",
+        "values": [32, 50, 100],
+        "default": 50,
+        "type": "combo"
+    },
     "min_matches_homography": {
         "label": "Mínimo de Coincidencias",
         "description": "Puntos mínimos para calcular alineación.\n"
@@ -206,6 +495,53 @@ CONFIG_OPTIONS = {
         "values": [10, 15, 20, 25, 30],
         "default": 20,
         "type": "combo"
+    },
+    "prealineacion": {
+        "label": "Alineación Rápida",
+        "description": "Antes de buscar puntos de alineación, comprueba si la página\n"
+                      "está en la misma posición o solo desplazada, que es lo habitual\n"
+                      "entre revisiones de un mismo plano.\n"
+                      "• Sí: Mucho más rápido en revisiones (recomendado)\n"
+                      "• No: Buscar siempre puntos de alineación",
+        "values": [True, False],
+        "display_values": ["Sí", "No"],
+        "default": False,
+        "type": "combo"
+    },
+    "reutilizar_alineacion": {
+        "label": "Reutilizar Alineación",
+        "description": "Probar primero la alineación de la página anterior del mismo\n"
+                      "documento (hojas del mismo trazador o escáner suelen compartirla).\n"
+                      "• Sí: Solo se recalcula si no encaja (recomendado)\n"
+                      "• No: Calcular la alineación de cada página por separado",
+        "values": [True, False],
+        "display_values": ["Sí", "No"],
+        "default": False,
+        "type": "combo"
+    },
+    "resolucion_alineacion": {
+        "label": "Resolución de Alineación",
+        "description": "Tamaño (lado mayor) al que se reduce la página para buscar\n"
+                      "puntos de alineación. Reducir acelera mucho las hojas a alta resolución.\n"
+                      "• 1000 px: Más rápido\n"
+                      "• 1500 px: Balance (recomendado)\n"
+                      "• 2500 px: Más puntos de alineación\n"
+                      "• Completa: Sin reducir (lento a 300 DPI o más)",
+        "values": [1000, 1500, 2500, 0],
+        "display_values": ["1000 px", "1500 px", "2500 px", "Completa"],
+        "default": 0,
+        "type": "combo"
+    },
+    "refinar_alineacion": {
+        "label": "Refinar Alineación",
+        "description": "Tras alinear la página reducida, ajusta la alineación a resolución\n"
+                      "completa con unas pocas zonas de muestra.\n"
+                      "• Sí: Misma precisión que sin reducir (recomendado)\n"
+                      "• No: Algo más rápido, menos preciso",
+        "values": [True, False],
+        "display_values": ["Sí", "No"],
+        "default": True,
+        "type": "combo"
     }
 }
 
@@ -278,12 +614,22 @@ class InterfazConfiguracion:
         ).pack(pady=(0, 15))
         
         # Create config sections
-        self._crear_seccion(main_frame, "📄 Conversión PDF", ["dpi", "batch_size"])
+        self._crear_seccion(main_frame, "📄 Conversión PDF", ["dpi", "renderizado_gris", "batch_size", "tamano_tesela",
+                                                          "modo_adaptativo", "dpi_previo", "despacho_paginas",
+                                                          "paginas_salida", "indice_cambios",
+                                                          "codificacion_salida", "compresion_salida"])
+        self._crear_seccion(main_frame, "💾 Caché de Páginas", ["usar_cache", "cache_max_mb"])
         self._crear_seccion(main_frame, "🔍 Detección de Cambios", 
-                           ["min_contour_area", "usar_blur", "umbral_bin", "kernel_size", "iteraciones"])
-        self._crear_seccion(main_frame, "📁 Emparejamiento de Archivos", ["similarity_threshold"])
+                           ["motor_comparacion", "min_contour_area", "usar_blur", "umbral_bin", 
+                            "kernel_size", "iteraciones", "bloque_sin_cambios"])
+        self._crear_seccion(main_frame, "📁 Emparejamiento de Archivos", 
+                           ["similarity_threshold", "recorrer_subcarpetas", "filtro_archivos",
+                            "estrategia_emparejamiento"])
         self._crear_seccion(main_frame, "🎯 Alineación de Imágenes", 
-                           ["orb_max_features", "min_matches_homography"])
+                           ["prealineacion", "reutilizar_alineacion", "orb_max_features",
+                            "min_matches_homography", "resolucion_alineacion", "refinar_alineacion",
+                            "rejilla_orb", "emparejador_orb", "lsh_tablas", "lsh_tamano_clave",
+                            "lsh_sondeo", "lsh_comprobaciones"])
         
         # Buttons frame (fixed at bottom, outside scroll area)
         frame_botones = tk.Frame(self.root)
@@ -5,13 +5,25 @@ Provides functionality to compare PDF documents and highlight differences.
 from __future__ import annotations
 
 import gc
+import hashlib
+import io
+import json
 import logging
+import math
 import multiprocessing
 import os
+import re
 import sys
+import threading
+import time
+import zlib
+from collections import Counter
 from contextlib import contextmanager
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 from difflib import SequenceMatcher
+from fnmatch import fnmatchcase
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 from typing import TYPE_CHECKING, Callable
 
@@ -25,7 +37,7 @@ if sys.platform == 'win32' and getattr(sys, 'frozen', False):
     multiprocessing.freeze_support()
 
 if TYPE_CHECKING:
-    from collections.abc import Generator
+    from collections.abc import Container, Generator, Iterable, Iterator
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -47,7 +59,7 @@ Image.MAX_IMAGE_PIXELS = None
 
 # Import configuration module
 try:
-    from configuracion import get_config
+    from configuracion import ConfiguracionApp, get_config, set_config
     CONFIG_AVAILABLE = True
 except ImportError:
     CONFIG_AVAILABLE = False
@@ -57,10 +69,70 @@ def get_dpi() -> int:
     """Get DPI setting."""
     return get_config().dpi if CONFIG_AVAILABLE else 200
 
+def get_renderizado_gris() -> bool:
+    """Get grayscale rendering setting."""
+    return get_config().renderizado_gris if CONFIG_AVAILABLE else False
+
 def get_batch_size() -> int:
     """Get batch size setting."""
     return get_config().batch_size if CONFIG_AVAILABLE else 5
 
+def get_tamano_tesela() -> int:
+    """Get tile size setting (pixels, 0 = tiling disabled)."""
+    return get_config().tamano_tesela if CONFIG_AVAILABLE else 0
+
+def get_modo_adaptativo() -> bool:
+    """Get coarse-to-fine (two-pass) comparison setting."""
+    return get_config().modo_adaptativo if CONFIG_AVAILABLE else False
+
+def get_dpi_previo() -> int:
+    """Get DPI of the coarse detection pass."""
+    return get_config().dpi_previo if CONFIG_AVAILABLE else 72
+
+def get_usar_cache() -> bool:
+    """Get rendered page cache setting."""
+    return get_config().usar_cache if CONFIG_AVAILABLE else False
+
+def get_cache_max_mb() -> int:
+    """Get rendered page cache size cap (MB) setting."""
+    return get_config().cache_max_mb if CONFIG_AVAILABLE else 512
+
+def get_despacho_paginas() -> str:
+    """Get page dispatch setting ("trabajadores" or "principal")."""
+    return get_config().despacho_paginas if CONFIG_AVAILABLE else "principal"
+
+def get_paginas_salida() -> str:
+    """Get which pages go to the comparison PDF ("todas", "cambiadas" or "marcador")."""
+    return get_config().paginas_salida if CONFIG_AVAILABLE else "todas"
+
+def get_indice_cambios() -> bool:
+    """Get setting for writing the JSON change index next to each comparison PDF."""
+    return get_config().indice_cambios if CONFIG_AVAILABLE else False
+
+def get_codificacion_salida() -> str:
+    """Get comparison page encoding ("jpeg", "paleta", "mascaras" or "vectorial")."""
+    return get_config().codificacion_salida if CONFIG_AVAILABLE else "jpeg"
+
+def get_compresion_salida() -> int:
+    """Get Flate compression level of the lossless output encodings."""
+    return get_config().compresion_salida if CONFIG_AVAILABLE else 1
+
+def get_recorrer_subcarpetas() -> bool:
+    """Get setting for scanning subfolders when listing a folder."""
+    return get_config().recorrer_subcarpetas if CONFIG_AVAILABLE else False
+
+def get_filtro_archivos() -> str:
+    """Get file name filter of folder scans (glob patterns separated by ";")."""
+    return get_config().filtro_archivos if CONFIG_AVAILABLE else "*.pdf"
+
+def get_estrategia_emparejamiento() -> str:
+    """Get file pairing strategy ("nombre", "contenido" or "combinada")."""
+    return get_config().estrategia_emparejamiento if CONFIG_AVAILABLE else "nombre"
+
+def get_motor_comparacion() -> str:
+    """Get comparison engine setting ("raster" or "vectorial")."""
+    return get_config().motor_comparacion if CONFIG_AVAILABLE else "raster"
+
 def get_min_contour_area() -> int:
     """Get minimum contour area setting."""
     return get_config().min_contour_area if CONFIG_AVAILABLE else 15
@@ -81,6 +153,10 @@ def get_iteraciones() -> int:
     """Get dilation iterations setting."""
     return get_config().iteraciones if CONFIG_AVAILABLE else 2
 
+def get_bloque_sin_cambios() -> int:
+    """Get block side (pixels) of the unchanged-block pre-scan (0 = disabled)."""
+    return get_config().bloque_sin_cambios if CONFIG_AVAILABLE else 0
+
 def get_similarity_threshold() -> float:
     """Get similarity threshold setting."""
     return get_config().similarity_threshold if CONFIG_AVAILABLE else 0.5
@@ -89,6 +165,46 @@ def get_orb_max_features() -> int:
     """Get ORB max features setting."""
     return get_config().orb_max_features if CONFIG_AVAILABLE else 20000
 
+def get_resolucion_alineacion() -> int:
+    """Get largest image side (pixels) used for feature matching (0 = full resolution)."""
+    return get_config().resolucion_alineacion if CONFIG_AVAILABLE else 0
+
+def get_refinar_alineacion() -> bool:
+    """Get full-resolution alignment refinement setting."""
+    return get_config().refinar_alineacion if CONFIG_AVAILABLE else True
+
+def get_prealineacion() -> bool:
+    """Get fast pre-alignment setting (identity / phase correlation before ORB)."""
+    return get_config().prealineacion if CONFIG_AVAILABLE else False
+
+def get_reutilizar_alineacion() -> bool:
+    """Get setting for reusing the previous page's alignment within a document pair."""
+    return get_config().reutilizar_alineacion if CONFIG_AVAILABLE else False
+
+def get_emparejador_orb() -> str:
+    """Get ORB descriptor matcher setting ("fuerza_bruta" or "flann")."""
+    return get_config().emparejador_orb if CONFIG_AVAILABLE else "fuerza_bruta"
+
+def get_lsh_tablas() -> int:
+    """Get number of hash tables of the FLANN LSH index."""
+    return get_config().lsh_tablas if CONFIG_AVAILABLE else 12
+
+def get_lsh_tamano_clave() -> int:
+    """Get hash key size (bits) of the FLANN LSH index."""
+    return get_config().lsh_tamano_clave if CONFIG_AVAILABLE else 20
+
+def get_lsh_sondeo() -> int:
+    """Get multi-probe level of the FLANN LSH index."""
+    return get_config().lsh_sondeo if CONFIG_AVAILABLE else 2
+
+def get_lsh_comprobaciones() -> int:
+    """Get number of FLANN search checks."""
+    return get_config().lsh_comprobaciones if CONFIG_AVAILABLE else 50
+
+def get_rejilla_orb() -> int:
+    """Get grid cells per side for ORB keypoint selection (0 = disabled)."""
+    return get_config().rejilla_orb if CONFIG_AVAILABLE else 0
+
 def get_min_matches_homography() -> int:
     """Get minimum matches for homography setting."""
     return get_config().min_matches_homography if CONFIG_AVAILABLE else 20
@@ -114,6 +230,23 @@ def get_base_path() -> Path:
     return Path(__file__).parent
 
 
+def get_cache_path() -> Path:
+    """
+    Get the per-user cache folder of the application.
+    
+    The install folder may be read-only or on a shared drive, so caches go to
+    the user's cache location: %LOCALAPPDATA% on Windows, ~/Library/Caches on
+    macOS and $XDG_CACHE_HOME (~/.cache) elsewhere.
+    """
+    if sys.platform == 'win32':
+        raiz = os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local"
+    elif sys.platform == 'darwin':
+        raiz = Path.home() / "Library" / "Caches"
+    else:
+        raiz = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(raiz) / "PDFComparator"
+
+
 def verificar_pymupdf_disponible() -> bool:
     """Check if PyMuPDF is available."""
     return PYMUPDF_AVAILABLE
@@ -140,10 +273,77 @@ def encontrar_texto_comun(str1: str, str2: str) -> str:
     return str1[match.a:match.a + match.size] if match.size > 0 else ""
 
 
+def indice_caracteres(textos: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Character index of a list of strings, to bound their similarity in bulk.
+    
+    Returns:
+        Tuple (codes, counts). codes is (len(textos), longest length): each
+        character replaced by its column in the combined alphabet, padded with
+        the column past the alphabet. counts is (len(textos), alphabet size + 1):
+        how many times each character occurs in each string (zero for the padding)
+    """
+    longitudes = np.fromiter(map(len, textos), dtype=np.intp, count=len(textos))
+    alfabeto, columnas = np.unique(
+        np.frombuffer("".join(textos).encode("utf-32-le"), dtype=np.uint32), return_inverse=True
+    )
+    filas = np.repeat(np.arange(len(textos)), longitudes)
+    posiciones = np.arange(len(columnas)) - np.repeat(np.cumsum(longitudes) - longitudes, longitudes)
+    
+    codigos = np.full((len(textos), longitudes.max(initial=0)), len(alfabeto), dtype=np.int32)
+    codigos[filas, posiciones] = columnas
+    conteos = np.zeros((len(textos), len(alfabeto) + 1), dtype=np.int32)
+    np.add.at(conteos, (filas, columnas), 1)
+    return codigos, conteos
+
+
+def cota_subsecuencia_comun(base: np.ndarray, codigos: np.ndarray) -> np.ndarray:
+    """
+    Longest common subsequence between one coded string and many (codes of indice_caracteres).
+    
+    Bit-parallel over the characters of the base (Hyyro's algorithm on one
+    64-bit word), vectorised over the other strings. Exact for bases of up to
+    64 characters; past that, the rest of the base is added as is, which keeps
+    it an upper bound.
+    """
+    palabra = base[:64]
+    tabla = np.zeros(int(codigos.max(initial=base.max(initial=0))) + 1, dtype=np.uint64)
+    for posicion, columna in enumerate(palabra.tolist()):
+        tabla[columna] |= np.uint64(1 << posicion)
+    
+    v = np.full(len(codigos), np.uint64(2 ** 64 - 1))
+    for columna in codigos.T:
+        u = v & tabla[columna]
+        v = (v + u) | (v - u)
+    
+    # Each zero bit among the first len(palabra) is a character of the subsequence
+    ceros = ~v & np.uint64(2 ** len(palabra) - 1)
+    comunes = _BITS_POR_BYTE[ceros.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+    return comunes + (len(base) - len(palabra))
+
+
+def _ratio_desde_coincidencias(coincidencias: np.ndarray, totales: np.ndarray) -> np.ndarray:
+    """SequenceMatcher.ratio() for the given matched characters and total lengths, with its arithmetic."""
+    return np.where(totales > 0, 2.0 * coincidencias / np.maximum(totales, 1), 1.0)
+
+
 def detectar_mejor_patron(lista_archivos: list[str], umbral: float | None = None) -> str | None:
     """
     Detect the best common pattern among a list of filenames.
     
+    Names are grouped greedily in sorted order: each name not yet grouped
+    takes the later ones whose SequenceMatcher ratio to it reaches the
+    threshold, and the group's pattern is the text its names share. The
+    pattern of the biggest group wins.
+    
+    Most pairs never need their ratio computed. The matched characters of a
+    pair are at most the characters they share (the bound of
+    SequenceMatcher.quick_ratio) and at most their longest common subsequence;
+    a character index of the names gives both bounds for every remaining name
+    in a few vectorised steps, and only names whose bound reaches the
+    threshold are compared. The search also stops once the names left cannot
+    form a bigger group. The result is the same as comparing every pair.
+    
     Args:
         lista_archivos: List of filenames to analyze
         umbral: Similarity threshold (0.0 to 1.0)
@@ -158,27 +358,38 @@ def detectar_mejor_patron(lista_archivos: list[str], umbral: float | None = None
         return None
     
     lista_ordenada = sorted(lista_archivos)
+    codigos, conteos = indice_caracteres(lista_ordenada)
+    longitudes = conteos.sum(axis=1)
+    pendientes = np.ones(len(lista_ordenada), dtype=bool)
     mejor_patron: str | None = None
     max_repeticiones = 0
-    visitados: set[int] = set()
 
     for i, base in enumerate(lista_ordenada):
-        if i in visitados:
+        if not pendientes[i]:
             continue
+        pendientes[i] = False
+        
+        restantes = np.flatnonzero(pendientes[i + 1:]) + i + 1
+        if len(restantes) + 1 <= max_repeticiones:
+            break  # No group left can outgrow the best one
+        
+        # Only the names whose upper bounds of the ratio reach the threshold are compared
+        comunes = np.minimum(conteos[restantes], conteos[i]).sum(axis=1)
+        restantes = restantes[_ratio_desde_coincidencias(comunes, longitudes[restantes] + longitudes[i]) >= umbral]
+        if len(restantes):
+            comunes = cota_subsecuencia_comun(
+                codigos[i, :longitudes[i]], codigos[restantes, :longitudes[restantes].max()]
+            )
+            restantes = restantes[_ratio_desde_coincidencias(comunes, longitudes[restantes] + longitudes[i]) >= umbral]
         
         patron_candidato = base
         contador = 1
-        visitados.add(i)
-
-        for j in range(i + 1, len(lista_ordenada)):
-            if j in visitados:
-                continue
-            
+        for j in restantes:
             candidato = lista_ordenada[j]
             ratio = SequenceMatcher(None, base, candidato).ratio()
             
             if ratio >= umbral:
-                visitados.add(j)
+                pendientes[j] = False
                 contador += 1
                 patron_candidato = encontrar_texto_comun(patron_candidato, candidato)
         
@@ -190,95 +401,345 @@ def detectar_mejor_patron(lista_archivos: list[str], umbral: float | None = None
     return mejor_patron
 
 
-def procesar_carpeta(ruta: str | Path) -> dict[str, dict[str, str]]:
+def valor_de_nombre(nombre_archivo: str, patron: str | None) -> str:
+    """
+    Part of a filename that identifies it for matching: what follows the
+    folder's common pattern (see detectar_mejor_patron), or the whole name.
+    """
+    if not patron:
+        return nombre_archivo
+    try:
+        valor_procesado = nombre_archivo.split(patron)[-1]
+    except (ValueError, IndexError):
+        valor_procesado = nombre_archivo.replace(patron, "").strip()
+    return valor_procesado.strip("-_.")
+
+
+@dataclass
+class ArchivoEncontrado:
+    """
+    File found by escanear_carpeta, with the size and modification time read
+    while scanning. relativa is its path from the scanned folder, with "/"
+    separators.
+    """
+    ruta: str
+    relativa: str
+    tamano: int
+    modificado: float
+    
+    @property
+    def nombre(self) -> str:
+        return self.relativa.rsplit("/", 1)[-1]
+
+
+def escanear_carpeta(
+    ruta: str | Path, 
+    recursivo: bool = False, 
+    patrones: Iterable[str] = ("*.pdf",)
+) -> Iterator[ArchivoEncontrado]:
+    """
+    Files of a folder, yielded as they are found.
+    
+    Built on os.scandir: the listing already tells files from folders, so
+    only the files that pass the filter are stat'ed, once. When recursive,
+    subfolders are walked depth first, skipping hidden ones (".git",
+    ".cache_paginas") and links to folders, which could loop. Folders that
+    cannot be read are logged and skipped.
+    
+    Args:
+        ruta: Folder to scan
+        recursivo: Also scan subfolders
+        patrones: Glob patterns matched against file names, ignoring case ("*" = every file)
+    """
+    patrones = [patron.casefold() for patron in patrones]
+    pendientes = [(os.fspath(ruta), "")]
+    
+    while pendientes:
+        carpeta, prefijo = pendientes.pop()
+        subcarpetas: list[tuple[str, str]] = []
+        try:
+            with os.scandir(carpeta) as entradas:
+                for entrada in entradas:
+                    try:
+                        if entrada.is_dir(follow_symlinks=False):
+                            if recursivo and not entrada.name.startswith("."):
+                                subcarpetas.append((entrada.path, f"{prefijo}{entrada.name}/"))
+                        elif entrada.is_file() and any(fnmatchcase(entrada.name.casefold(), p) for p in patrones):
+                            info = entrada.stat()
+                            yield ArchivoEncontrado(entrada.path, prefijo + entrada.name, info.st_size, info.st_mtime)
+                    except OSError as e:
+                        logger.warning(f"Skipping {entrada.path}: {e}")
+        except OSError as e:
+            logger.warning(f"Could not read folder {carpeta}: {e}")
+        pendientes.extend(sorted(subcarpetas, reverse=True))
+
+
+def procesar_carpeta(
+    ruta: str | Path, 
+    recursivo: bool | None = None, 
+    patrones: Iterable[str] | None = None
+) -> dict[str, dict]:
     """
     Process a folder and extract file information with pattern detection.
     
     Args:
         ruta: Path to the folder
+        recursivo: Include subfolders (default from configuration)
+        patrones: Glob patterns of the files to keep (default from configuration)
     
     Returns:
-        Dictionary with filename as key and metadata as value
+        Dictionary keyed by file name (path from the folder when scanning
+        subfolders) with the matching value, full path, size and modification time
     """
     path_obj = Path(ruta)
     if not path_obj.exists():
         return {}
     
-    archivos = [f.name for f in path_obj.iterdir() if f.is_file()]
+    if recursivo is None:
+        recursivo = get_recorrer_subcarpetas()
+    if patrones is None:
+        patrones = [patron.strip() for patron in get_filtro_archivos().split(";") if patron.strip()]
+    
+    archivos = list(escanear_carpeta(path_obj, recursivo, patrones))
     if not archivos:
         return {}
 
-    patron = detectar_mejor_patron(archivos)
-    resultados: dict[str, dict[str, str]] = {}
-
-    for nombre_archivo in archivos:
-        ruta_completa = path_obj / nombre_archivo
-        
-        if patron:
-            try:
-                valor_procesado = nombre_archivo.split(patron)[-1]
-            except (ValueError, IndexError):
-                valor_procesado = nombre_archivo.replace(patron, "").strip()
-            valor_procesado = valor_procesado.strip("-_.")
-        else:
-            valor_procesado = nombre_archivo
+    patron = detectar_mejor_patron([archivo.nombre for archivo in archivos])
+    resultados: dict[str, dict] = {}
 
-        resultados[nombre_archivo] = {
-            "valor": valor_procesado,
-            "path": str(ruta_completa)
+    for archivo in archivos:
+        # The subfolder is part of the value, so equal names are paired within the same subfolder
+        valor = valor_de_nombre(archivo.nombre, patron)
+        resultados[archivo.relativa] = {
+            "valor": archivo.relativa[:-len(archivo.nombre)] + valor,
+            "path": archivo.ruta,
+            "tamano": archivo.tamano,
+            "modificado": archivo.modificado,
         }
     
     return resultados
 
 
+# Destinations shortlisted per source by the trigram index before their similarity is computed
+CANDIDATOS_POR_ORIGEN = 10
+
+# Postings read per query in the trigram index (rarest trigrams first)
+PRESUPUESTO_TRIGRAMAS = 4000
+
+# Similarities are raised to this power before the assignment, so one strong pair outweighs two
+# weaker ones (0.95 and nothing, rather than 0.9 and 0.75)
+EXPONENTE_ASIGNACION = 8
+
+# Bid increment of the assignment auction; the total benefit is within n * epsilon of the best
+EPSILON_SUBASTA = 1e-4
+
+
+def trigramas(texto: str) -> set[str]:
+    """Trigrams of a string, case-folded and padded so its start and end are trigrams too."""
+    relleno = f"  {texto.casefold()} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceTrigramas:
+    """
+    Inverted trigram index of a list of strings, to shortlist the ones most
+    similar to a query without comparing it with all of them.
+    
+    Candidates are ranked by the summed inverse document frequency of the
+    trigrams they share with the query. Only the postings of the query's
+    rarest trigrams are read, up to a budget, so trigrams that nearly every
+    name has (".pdf", the project code) cost nothing and tell nothing.
+    """
+    
+    def __init__(self, textos: list[str], presupuesto: int = PRESUPUESTO_TRIGRAMAS) -> None:
+        listas: dict[str, list[int]] = {}
+        for indice, texto in enumerate(textos):
+            for trigrama in self.tokens(texto):
+                listas.setdefault(trigrama, []).append(indice)
+        
+        self._listas = {trigrama: np.array(lista, dtype=np.int32) for trigrama, lista in listas.items()}
+        self._num_textos = len(textos)
+        self.presupuesto = presupuesto
+    
+    @staticmethod
+    def tokens(texto: str) -> set[str]:
+        """Terms a string is indexed and queried by."""
+        return trigramas(texto)
+    
+    def candidatos(self, texto: str, k: int) -> np.ndarray:
+        """Indices of up to k indexed strings sharing trigrams with texto, best first."""
+        listas = sorted((self._listas[t] for t in self.tokens(texto) if t in self._listas), key=len)
+        leidas: list[np.ndarray] = []
+        total = 0
+        for lista in listas:
+            if leidas and total + len(lista) > self.presupuesto:
+                break
+            leidas.append(lista)
+            total += len(lista)
+        if not leidas:
+            return np.empty(0, dtype=np.int32)
+        
+        pesos = np.repeat([np.log(self._num_textos / len(lista)) + 1.0 for lista in leidas], list(map(len, leidas)))
+        indices, posiciones = np.unique(np.concatenate(leidas), return_inverse=True)
+        puntuaciones = np.bincount(posiciones, weights=pesos)
+        
+        if len(indices) > k:
+            mejores = np.argpartition(-puntuaciones, k - 1)[:k]
+            indices, puntuaciones = indices[mejores], puntuaciones[mejores]
+        return indices[np.argsort(-puntuaciones, kind="stable")]
+
+
+def asignar_subasta(
+    candidatos: list[tuple[list[int], list[float]]], 
+    num_destinos: int, 
+    epsilon: float = EPSILON_SUBASTA
+) -> list[int]:
+    """
+    One-to-one assignment of sources to destinations maximising the total
+    benefit, over sparse candidate lists (auction algorithm).
+    
+    Each unassigned source bids for its best destination at current prices,
+    raising its price by the margin over its second best plus epsilon and
+    taking it from its previous holder. Staying unassigned is an option worth
+    0, so a source drops out once no destination is worth its price. Sources
+    whose best destination nobody else wants bid once. The total benefit is
+    within len(candidatos) * epsilon of the best possible.
+    
+    Args:
+        candidatos: For each source, (destination indices, benefits)
+        num_destinos: Number of destinations
+        epsilon: Minimum bid increment
+    
+    Returns:
+        Destination assigned to each source, or -1
+    """
+    precios = [0.0] * num_destinos
+    duenos = [-1] * num_destinos
+    asignacion = [-1] * len(candidatos)
+    pendientes = [i for i, (destinos, _) in enumerate(candidatos) if destinos]
+    pendientes.reverse()  # Sources bid in order, so ties go to the first one
+    
+    while pendientes:
+        i = pendientes.pop()
+        destinos, beneficios = candidatos[i]
+        mejor, segundo, elegido = 0.0, 0.0, -1
+        for destino, beneficio in zip(destinos, beneficios):
+            valor = beneficio - precios[destino]
+            if valor > mejor:
+                mejor, segundo, elegido = valor, mejor, destino
+            elif valor > segundo:
+                segundo = valor
+        if elegido < 0:
+            continue  # Nothing is worth its price any more: stays unassigned
+        
+        precios[elegido] += mejor - segundo + epsilon
+        anterior = duenos[elegido]
+        if anterior >= 0:
+            asignacion[anterior] = -1
+            pendientes.append(anterior)
+        duenos[elegido] = i
+        asignacion[i] = elegido
+    
+    return asignacion
+
+
 def comparar_listas_completo(
     dic1: dict[str, dict[str, str]], 
     dic2: dict[str, dict[str, str]], 
-    umbral: float | None = None
+    umbral: float | None = None,
+    estrategia: str | None = None
 ) -> list[dict]:
     """
     Compare two file dictionaries and find matches.
     
+    Each source is compared with the destinations a trigram index shortlists
+    for it (all of them when there are few). Sources and destinations are then
+    paired one to one, maximising the total of the similarities raised to
+    EXPONENTE_ASIGNACION (asignar_subasta), so no destination is claimed twice.
+    
+    Files are compared by name, by content fingerprint (SimilitudContenido,
+    for files renamed between revisions) or by the better of both; with
+    content, the shortlist also takes the destinations with the closest
+    fingerprints.
+    
     Args:
         dic1: Source files dictionary
         dic2: Destination files dictionary
         umbral: Similarity threshold
+        estrategia: "nombre", "contenido" or "combinada" (default from configuration)
     
     Returns:
         List of match records
     """
     if umbral is None:
         umbral = get_similarity_threshold()
+    if estrategia is None:
+        estrategia = get_estrategia_emparejamiento()
+    por_nombre = estrategia != "contenido"
+    contenido = SimilitudContenido(dic1, dic2) if estrategia in ("contenido", "combinada") else None
+    
+    claves_destino = list(dic2)
+    valores_destino = [dic2[clave].get("valor", "") for clave in claves_destino]
+    pocos = len(claves_destino) <= CANDIDATOS_POR_ORIGEN
+    indice = IndiceTrigramas(valores_destino) if por_nombre and not pocos else None
+    todos = range(len(claves_destino))
+    
+    # Similarity of every source to its shortlisted destinations, keeping those above the threshold.
+    # A destination is shortlisted for several sources, so its matcher (and its index of the
+    # destination's characters) is kept
+    comparadores: dict[int, SequenceMatcher] = {}
+    candidatos: list[tuple[list[int], list[float]]] = []
+    for i, datos1 in enumerate(dic1.values()):
+        valor1 = datos1.get("valor", "")
+        if pocos:
+            preseleccion = todos
+        else:
+            preseleccion = indice.candidatos(valor1, CANDIDATOS_POR_ORIGEN).tolist() if indice else []
+            if contenido:
+                preseleccion = list(dict.fromkeys(preseleccion + contenido.candidatos(i, CANDIDATOS_POR_ORIGEN)))
+        
+        destinos: list[int] = []
+        ratios: list[float] = []
+        for j in preseleccion:
+            ratio = 0.0
+            if por_nombre:
+                comparador = comparadores.get(j)
+                if comparador is None:
+                    comparador = comparadores[j] = SequenceMatcher(None, "", valores_destino[j])
+                comparador.set_seq1(valor1)
+                ratio = comparador.ratio()
+            if contenido:
+                ratio = max(ratio, contenido.similitud(i, j))
+            if ratio >= umbral and ratio > 0:
+                destinos.append(j)
+                ratios.append(ratio)
+        candidatos.append((destinos, ratios))
+    
+    asignacion = asignar_subasta(
+        [(destinos, [ratio ** EXPONENTE_ASIGNACION for ratio in ratios]) for destinos, ratios in candidatos], 
+        len(claves_destino)
+    )
     
     resultados: list[dict] = []
     destinos_emparejados: set[str] = set()
 
-    # Find matches from source to destination
-    for clave1, datos1 in dic1.items():
+    for (clave1, datos1), (destinos, ratios), j in zip(dic1.items(), candidatos, asignacion):
         valor1 = datos1.get("valor", "")
         ruta1 = datos1.get("path", "")
         
-        mejor_match: tuple[str | None, dict | None, float] = (None, None, 0.0)
-
-        for clave2, datos2 in dic2.items():
-            valor2 = datos2.get("valor", "")
-            ratio = SequenceMatcher(None, valor1, valor2).ratio()
-
-            if ratio > mejor_match[2]:
-                mejor_match = (clave2, datos2, ratio)
-
-        if mejor_match[2] >= umbral and mejor_match[0] and mejor_match[1]:
+        if j >= 0:
+            clave2 = claves_destino[j]
             registro = {
                 "tipo": "match",
                 "origen": {"clave": clave1, "valor": valor1, "ruta": ruta1},
                 "destino": {
-                    "clave": mejor_match[0], 
-                    "valor": mejor_match[1]["valor"], 
-                    "ruta": mejor_match[1]["path"]
+                    "clave": clave2, 
+                    "valor": dic2[clave2]["valor"], 
+                    "ruta": dic2[clave2]["path"]
                 },
-                "similitud_pct": f"{mejor_match[2]:.0%}"
+                "similitud_pct": f"{ratios[destinos.index(j)]:.0%}"
             }
-            destinos_emparejados.add(mejor_match[0])
+            destinos_emparejados.add(clave2)
         else:
             registro = {
                 "tipo": "solo_origen",
@@ -302,216 +763,2258 @@ def comparar_listas_completo(
 
 
 # ==========================================
-# IMAGE PROCESSING
+# CONTENT FINGERPRINTS
 # ==========================================
 
-def limpiar_ruido_mascara(mask: np.ndarray, min_area: int | None = None) -> np.ndarray:
+# Pages whose sheet size is recorded in a content fingerprint
+PAGINAS_HUELLA = 5
+
+# Width in pixels of the first-page thumbnail the image hash is taken from
+ANCHO_MINIATURA_HUELLA = 256
+
+# Words of the title block kept in a content fingerprint
+MAX_PALABRAS_HUELLA = 200
+
+# With fewer words than this in the title-block corner, the words of the whole first page are used
+MIN_PALABRAS_ROTULO = 5
+
+# Sheet sizes closer than this (mm) count as the same size
+TOLERANCIA_TAMANO_MM = 5
+
+# Weight of the title-block text against the thumbnail hash when both files have text
+PESO_TEXTO_HUELLA = 0.6
+
+# Format of the fingerprint cache entries; entries of another version are recomputed
+VERSION_HUELLAS = 1
+
+# Fingerprints kept in the cache file; the least recently used are dropped beyond this
+MAX_HUELLAS_CACHE = 100_000
+
+
+@dataclass
+class HuellaContenido:
     """
-    Remove noise from a binary mask by filtering small contours.
-    
-    Args:
-        mask: Binary mask image
-        min_area: Minimum contour area to keep
-    
-    Returns:
-        Cleaned binary mask
+    Cheap fingerprint of a document's content, to pair files whose names do
+    not match. Read from the first page without rendering it at full size:
+    page count, sheet size of the first PAGINAS_HUELLA pages (mm, shorter
+    side first, so rotation does not matter), words of the title block and a
+    64-bit difference hash of a thumbnail.
     """
-    if min_area is None:
-        min_area = get_min_contour_area()
+    paginas: int
+    tamanos: list[tuple[int, int]]
+    texto: list[str]
+    imagen: int
     
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    mask_clean = np.zeros_like(mask)
-    
-    for cnt in contours:
-        if cv2.contourArea(cnt) > min_area:
-            cv2.drawContours(mask_clean, [cnt], -1, 255, -1)
+    @property
+    def palabras(self) -> set[str]:
+        return set(self.texto)
+
+
+def hash_diferencias(gray: np.ndarray) -> int:
+    """
+    64-bit difference hash of a grayscale image: one bit per cell of a 9x8
+    reduction, set when the cell is brighter than its right neighbour. Close
+    hashes (few differing bits) mean similar layouts, whatever the resolution
+    or the compression of the image.
+    """
+    reducida = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return int.from_bytes(np.packbits(reducida[:, 1:] > reducida[:, :-1]).tobytes(), "big")
+
+
+def _palabras_rotulo(page: fitz.Page) -> list[str]:
+    """Case-folded words of the title block (lower-right quarter) of a page, or of the whole page."""
+    r = page.rect
+    palabras = page.get_text("words", clip=fitz.Rect(r.x0 + r.width / 2, r.y0 + r.height / 2, r.x1, r.y1))
+    if len(palabras) < MIN_PALABRAS_ROTULO:
+        palabras = page.get_text("words")
     
-    return mask_clean
+    unicas = dict.fromkeys(
+        palabra for palabra in (p[4].strip(".,:;()[]").casefold() for p in palabras) if len(palabra) > 1
+    )
+    return list(islice(unicas, MAX_PALABRAS_HUELLA))
 
 
-def alinear_imagen(img_base: np.ndarray, img_a_mover: np.ndarray) -> np.ndarray:
+def huella_contenido(ruta: str | Path) -> HuellaContenido | None:
     """
-    Align an image to a base image using ORB feature matching and homography.
-    Uses CLAHE for better feature detection and knnMatch with ratio test.
+    Compute the content fingerprint of a document.
     
     Args:
-        img_base: Reference image
-        img_a_mover: Image to align
+        ruta: Path to the document
     
     Returns:
-        Aligned image
+        The fingerprint, or None if the file cannot be read as a document
     """
-    # Convert to grayscale if needed
-    gray_base = cv2.cvtColor(img_base, cv2.COLOR_RGB2GRAY) if img_base.ndim == 3 else img_base
-    gray_move = cv2.cvtColor(img_a_mover, cv2.COLOR_RGB2GRAY) if img_a_mover.ndim == 3 else img_a_mover
-
-    # Apply CLAHE for better feature detection
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-    gray_base = clahe.apply(gray_base)
-    gray_move = clahe.apply(gray_move)
-
-    # Feature detection
-    orb = cv2.ORB_create(get_orb_max_features())
-    keypoints1, descriptors1 = orb.detectAndCompute(gray_move, None)
-    keypoints2, descriptors2 = orb.detectAndCompute(gray_base, None)
+    try:
+        with open_pdf(ruta) as doc:
+            if doc.page_count == 0:
+                return None
+            
+            tamanos = [
+                tuple(sorted(round(lado * 25.4 / 72) for lado in (pagina.rect.width, pagina.rect.height)))
+                for pagina in islice(doc, PAGINAS_HUELLA)
+            ]
+            page = doc[0]
+            zoom = ANCHO_MINIATURA_HUELLA / max(page.rect.width, 1)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+            return HuellaContenido(doc.page_count, tamanos, _palabras_rotulo(page), hash_diferencias(pixmap_a_array(pix)))
+    except Exception as e:
+        logger.warning(f"Could not fingerprint {ruta}: {e}")
+        return None
 
-    # Fallback to resize if no descriptors
-    target_size = (img_base.shape[1], img_base.shape[0])
-    if descriptors1 is None or descriptors2 is None:
-        return cv2.resize(img_a_mover, target_size)
 
-    # Match features using knnMatch with ratio test
-    bf = cv2.BFMatcher(cv2.DESCRIPTOR_MATCHER_BRUTEFORCE_HAMMING, crossCheck=False)
-    matches = bf.knnMatch(descriptors1, descriptors2, k=2)
+class CacheHuellas:
+    """
+    Content fingerprints kept in one JSON file between runs, keyed by file
+    path and valid while the file keeps its size and modification time.
+    Entries are kept in order of last use, so the least recently used are
+    dropped first when the file grows past MAX_HUELLAS_CACHE entries.
+    """
+    
+    def __init__(self, ruta: str | Path) -> None:
+        self.ruta = Path(ruta)
+        self._entradas: dict[str, dict] | None = None
+    
+    def _cargar(self) -> dict[str, dict]:
+        if self._entradas is None:
+            try:
+                with open(self.ruta, encoding="utf-8") as f:
+                    datos = json.load(f)
+                self._entradas = datos["huellas"] if datos.get("version") == VERSION_HUELLAS else {}
+            except (OSError, ValueError, KeyError, AttributeError):
+                self._entradas = {}
+        return self._entradas
+    
+    def obtener(self, ruta: str, tamano: int, modificado: float) -> HuellaContenido | None:
+        """
+        Look up the fingerprint of a file.
+        
+        Args:
+            ruta: Path to the file
+            tamano: Current size of the file in bytes
+            modificado: Current modification time of the file
+        
+        Returns:
+            The cached fingerprint, or None if missing or stale
+        """
+        entradas = self._cargar()
+        entrada = entradas.pop(os.path.abspath(ruta), None)
+        if entrada is None or entrada["tamano"] != tamano or entrada["modificado"] != modificado:
+            return None
+        
+        entradas[os.path.abspath(ruta)] = entrada  # Mark as recently used
+        return HuellaContenido(entrada["paginas"], [tuple(t) for t in entrada["tamanos"]], entrada["texto"], entrada["imagen"])
+    
+    def guardar(self, ruta: str, tamano: int, modificado: float, huella: HuellaContenido) -> None:
+        """Record the fingerprint of a file (written to disk by escribir)."""
+        self._cargar()[os.path.abspath(ruta)] = {"tamano": tamano, "modificado": modificado, **asdict(huella)}
+    
+    def escribir(self) -> None:
+        """Write the cache file, dropping the least recently used entries over the cap."""
+        entradas = self._cargar()
+        for clave in list(islice(entradas, max(0, len(entradas) - MAX_HUELLAS_CACHE))):
+            del entradas[clave]
+        
+        try:
+            self.ruta.parent.mkdir(parents=True, exist_ok=True)
+            temporal = self.ruta.with_suffix(f".{os.getpid()}.tmp")
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump({"version": VERSION_HUELLAS, "huellas": entradas}, f, ensure_ascii=False)
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            logger.warning(f"Error writing fingerprint cache: {e}")
 
-    # Apply ratio test (Lowe's ratio test)
-    good_matches = []
-    for m, n in matches:
-        if m.distance < 0.70 * n.distance:
-            good_matches.append(m)
 
-    if len(good_matches) < get_min_matches_homography():
-        return cv2.resize(img_a_mover, target_size)
+_cache_huellas: CacheHuellas | None = None
 
-    # Calculate homography
-    src_pts = np.float32([keypoints1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
-    dst_pts = np.float32([keypoints2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
 
-    h_matrix, _ = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+def obtener_cache_huellas() -> CacheHuellas:
+    """
+    Get the process-wide fingerprint cache, in the per-user cache folder.
+    
+    Unlike the page cache it is always used: a fingerprint takes a few
+    hundred bytes.
     
-    if h_matrix is None:
-        return cv2.resize(img_a_mover, target_size)
+    Returns:
+        Shared CacheHuellas instance
+    """
+    global _cache_huellas
     
-    height, width = img_base.shape[:2]
-    return cv2.warpPerspective(img_a_mover, h_matrix, (width, height))
+    if _cache_huellas is None:
+        _cache_huellas = CacheHuellas(get_cache_path() / "huellas.json")
+    return _cache_huellas
 
 
-def procesar_hoja_premium(
-    img_base_pil: Image.Image | None, 
-    img_move_pil: Image.Image | None, 
-    index: int
-) -> Image.Image | None:
+def huellas_contenido(datos: dict[str, dict]) -> list[HuellaContenido | None]:
     """
-    Process a page pair and create a comparison image with differences highlighted.
-    Uses configurable blur, binary threshold, kernel size, and iterations.
+    Content fingerprints of the files of a procesar_carpeta dictionary,
+    taken from the cache when the file is unchanged.
     
     Args:
-        img_base_pil: Base/original page image
-        img_move_pil: New/modified page image
-        index: Page index (for logging)
+        datos: Files dictionary (path, and size and modification time when scanned)
     
     Returns:
-        Comparison image with differences highlighted, or None on error
+        Fingerprint of each file, in the dictionary's order (None if unreadable)
     """
-    try:
-        # Convert PIL to numpy
-        img_base_np = np.array(img_base_pil) if img_base_pil else None
-        img_move_raw = np.array(img_move_pil) if img_move_pil else None
-
-        # Handle missing pages
-        if img_base_np is None and img_move_raw is not None:
-            h, w = img_move_raw.shape[:2]
-            img_base = np.full((h, w, 3), 255, dtype=np.uint8)
-        elif img_move_raw is None and img_base_np is not None:
-            h, w = img_base_np.shape[:2]
-            img_base = img_base_np
-            img_move_raw = np.full((h, w, 3), 255, dtype=np.uint8)
-        elif img_base_np is None:
-            return None
-        else:
-            img_base = img_base_np
-
-        # Align images
-        try:
-            img_new = alinear_imagen(img_base, img_move_raw)
-        except Exception:
-            img_new = cv2.resize(img_move_raw, (img_base.shape[1], img_base.shape[0]))
-
-        # Convert to grayscale
-        gray_base = cv2.cvtColor(img_base, cv2.COLOR_RGB2GRAY) if len(img_base.shape) == 3 else img_base
-        gray_new = cv2.cvtColor(img_new, cv2.COLOR_RGB2GRAY) if len(img_new.shape) == 3 else img_new
-
-        # Apply blur if configured
-        if get_usar_blur():
-            gray_base = cv2.GaussianBlur(gray_base, (5, 5), 0)
-            gray_new = cv2.GaussianBlur(gray_new, (5, 5), 0)
-
-        # Binarization using configured threshold
-        umbral_bin = get_umbral_bin()
-        _, bin_base = cv2.threshold(cv2.bitwise_not(gray_base), umbral_bin, 255, cv2.THRESH_BINARY)
-        _, bin_new = cv2.threshold(cv2.bitwise_not(gray_new), umbral_bin, 255, cv2.THRESH_BINARY)
-
-        # Dilation using configured kernel size and iterations
-        k_size = get_kernel_size()
-        kernel = np.ones((k_size, k_size), np.uint8)
-        iteraciones = get_iteraciones()
+    cache = obtener_cache_huellas()
+    huellas: list[HuellaContenido | None] = []
+    
+    for datos_archivo in datos.values():
+        ruta = datos_archivo.get("path", "")
+        tamano, modificado = datos_archivo.get("tamano"), datos_archivo.get("modificado")
+        if tamano is None or modificado is None:
+            try:
+                info = os.stat(ruta)
+            except OSError:
+                huellas.append(None)
+                continue
+            tamano, modificado = info.st_size, info.st_mtime
         
-        base_dilatada = cv2.dilate(bin_base, kernel, iterations=iteraciones)
-        new_dilatada = cv2.dilate(bin_new, kernel, iterations=iteraciones)
-
-        # Calculate differences
-        raw_green = cv2.subtract(bin_new, base_dilatada)
-        raw_magenta = cv2.subtract(bin_base, new_dilatada)
+        huella = cache.obtener(ruta, tamano, modificado)
+        if huella is None:
+            huella = huella_contenido(ruta)
+            if huella is not None:
+                cache.guardar(ruta, tamano, modificado, huella)
+        huellas.append(huella)
+    
+    cache.escribir()
+    return huellas
 
-        # Clean noise using configured min_area
-        min_area = get_min_contour_area()
-        clean_green = limpiar_ruido_mascara(raw_green, min_area=min_area)
-        clean_magenta = limpiar_ruido_mascara(raw_magenta, min_area=min_area)
 
-        # Create output image
-        bg_gray = cv2.cvtColor(img_base, cv2.COLOR_RGB2GRAY) if len(img_base.shape) == 3 else img_base
-        ghost_bg = cv2.addWeighted(bg_gray, 0.3, np.full_like(bg_gray, 255), 0.7, 0)
-        final_img = cv2.cvtColor(ghost_bg, cv2.COLOR_GRAY2RGB)
+class IndicePalabras(IndiceTrigramas):
+    """IndiceTrigramas over word lists (the title-block text of content fingerprints)."""
+    
+    @staticmethod
+    def tokens(palabras: list[str]) -> set[str]:
+        return set(palabras)
 
-        final_img[clean_green > 0] = Colors.GREEN
-        final_img[clean_magenta > 0] = Colors.MAGENTA
 
-        return Image.fromarray(final_img)
+class SimilitudContenido:
+    """
+    Content similarity between the files of two folders, from their
+    fingerprints (see HuellaContenido).
     
-    except Exception as e:
-        logger.error(f"Error processing page {index}: {e}")
-        return None
+    The title-block words are compared by their overlap weighted with inverse
+    document frequency, so the words every sheet of a project shares (company,
+    "escala", "fecha") count for little and the sheet number and title for
+    much. The thumbnail hashes score 1 when equal and 0 from 32 differing bits
+    (unrelated images), and are the only evidence when either file has no
+    text, as with scans. Different page counts or sheet sizes lower the score
+    by up to half.
+    
+    For large folders, candidates are shortlisted from an index of the
+    title-block words and from the closest thumbnail hashes.
+    """
+    
+    def __init__(self, dic1: dict[str, dict], dic2: dict[str, dict]) -> None:
+        self.origen = huellas_contenido(dic1)
+        self.destino = huellas_contenido(dic2)
+        self._palabras_origen = [huella.palabras if huella else set() for huella in self.origen]
+        self._palabras_destino = [huella.palabras if huella else set() for huella in self.destino]
+        
+        frecuencias = Counter(palabra for palabras in self._palabras_origen + self._palabras_destino for palabra in palabras)
+        total = sum(huella is not None for huella in self.origen + self.destino)
+        self._pesos = {palabra: math.log((total + 1) / n) for palabra, n in frecuencias.items()}
+        
+        self._indice: IndicePalabras | None = None
+        self._hashes: np.ndarray | None = None
+        self._sin_huella: np.ndarray | None = None
+    
+    def similitud(self, i: int, j: int) -> float:
+        """Similarity in [0, 1] of source i and destination j."""
+        a, b = self.origen[i], self.destino[j]
+        if a is None or b is None:
+            return 0.0
+        
+        similitud = max(0.0, 1.0 - 2 * (a.imagen ^ b.imagen).bit_count() / 64)
+        if a.texto and b.texto:
+            palabras_a, palabras_b = self._palabras_origen[i], self._palabras_destino[j]
+            union = sum(self._pesos[palabra] for palabra in palabras_a | palabras_b)
+            comunes = sum(self._pesos[palabra] for palabra in palabras_a & palabras_b)
+            texto = comunes / union
+            similitud = PESO_TEXTO_HUELLA * texto + (1 - PESO_TEXTO_HUELLA) * similitud
+        
+        paginas = min(a.paginas, b.paginas) / max(a.paginas, b.paginas)
+        pares = list(zip(a.tamanos, b.tamanos))
+        tamanos = sum(
+            abs(ta[0] - tb[0]) <= TOLERANCIA_TAMANO_MM and abs(ta[1] - tb[1]) <= TOLERANCIA_TAMANO_MM 
+            for ta, tb in pares
+        ) / len(pares)
+        return similitud * (0.5 + 0.25 * paginas + 0.25 * tamanos)
+    
+    def candidatos(self, i: int, k: int) -> list[int]:
+        """Up to 2k destinations for source i: k by title-block words and k by thumbnail hash."""
+        huella = self.origen[i]
+        if huella is None:
+            return []
+        
+        if self._indice is None:
+            self._indice = IndicePalabras([huella.texto if huella else [] for huella in self.destino])
+            self._hashes = np.array([huella.imagen if huella else 0 for huella in self.destino], dtype=np.uint64)
+            self._sin_huella = np.array([huella is None for huella in self.destino])
+        
+        distancias = _BITS_POR_BYTE[(self._hashes ^ np.uint64(huella.imagen)).view(np.uint8)].reshape(-1, 8).sum(axis=1)
+        distancias[self._sin_huella] = 65  # Farther than any real hash
+        cercanos = np.argpartition(distancias, k - 1)[:k] if len(distancias) > k else np.arange(len(distancias))
+        
+        return list(dict.fromkeys(
+            self._indice.candidatos(huella.texto, k).tolist() 
+            + cercanos[np.argsort(distancias[cercanos], kind="stable")].tolist()
+        ))
 
 
 # ==========================================
-# PDF PROCESSING
+# IMAGE PROCESSING
 # ==========================================
 
-def obtener_numero_paginas(pdf_path: str | Path) -> int:
+# Block side (pixels) of the inked-area grouping in limpiar_ruido_mascara
+BLOQUE_LIMPIEZA = 64
+# Contour area, in half pixels, of a 2x2 cell between pixel centres by its number of inked corners:
+# the outer contour cuts a cell with three corners diagonally and runs along the edge of one with two
+_MEDIAS_AREA_CELDA = np.array([0, 0, 0, 1, 2] + [0] * 251, dtype=np.uint8)
+
+
+def area_componentes(relleno: np.ndarray, etiquetas: np.ndarray, n_etiquetas: int) -> np.ndarray:
     """
-    Get the number of pages in a PDF document.
+    Area of the outer contour of every labelled blob, as cv2.contourArea gives it.
+    
+    The contour runs through the centres of the blob's border pixels, so its
+    area is made of the 2x2 cells between pixel centres: whole cells with four
+    inked corners and half cells with three. Cells are counted with one box
+    filter and summed per label with np.bincount, so the cost does not depend
+    on the number of blobs.
     
     Args:
-        pdf_path: Path to the PDF file
+        relleno: Binary mask (0/255) with holes filled
+        etiquetas: Labels of relleno's 8-connected blobs (int32, 0 = background)
+        n_etiquetas: Number of labels, background included
     
     Returns:
-        Number of pages, or 1 on error
+        Contour area per label (entry 0 is the background and is meaningless)
     """
-    if not PYMUPDF_AVAILABLE:
-        try:
-            import PyPDF2
-            with open(pdf_path, 'rb') as f:
-                return len(PyPDF2.PdfReader(f).pages)
-        except Exception:
-            return 1
+    esquinas = cv2.boxFilter(
+        relleno & 1, -1, (2, 2), anchor=(0, 0), normalize=False, borderType=cv2.BORDER_CONSTANT
+    )
+    medias = cv2.LUT(esquinas, _MEDIAS_AREA_CELDA)
+    puntos = cv2.findNonZero(medias)
+    if puntos is None:
+        return np.zeros(n_etiquetas)
     
-    try:
-        with open_pdf(pdf_path) as doc:
+    # Every inked corner of a counted cell belongs to the same blob; the largest label skips the empty one
+    ancho = etiquetas.shape[1]
+    puntos = puntos.reshape(-1, 2)
+    celdas = puntos[:, 1].astype(np.intp) * ancho + puntos[:, 0]
+    plana = etiquetas.ravel()
+    etiqueta_celda = np.maximum(
+        np.maximum(plana[celdas], plana[celdas + 1]), 
+        np.maximum(plana[celdas + ancho], plana[celdas + ancho + 1]),
+    )
+    return np.bincount(etiqueta_celda, weights=medias.ravel()[celdas], minlength=n_etiquetas) / 2
+
+
+def _limpiar_ventana(ventana: np.ndarray, min_area: int) -> np.ndarray:
+    """Cleaned copy of a window of a mask; see limpiar_ruido_mascara."""
+    # Everything the flood fill from the margin cannot reach is a blob or one of its holes
+    relleno = cv2.copyMakeBorder(ventana, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    cv2.floodFill(relleno, None, (0, 0), 128)
+    relleno = cv2.compare(relleno, 128, cv2.CMP_NE)
+    
+    n_etiquetas, etiquetas = cv2.connectedComponents(relleno, connectivity=8, ltype=cv2.CV_32S)
+    quitar = area_componentes(relleno, etiquetas, n_etiquetas) <= min_area
+    quitar[0] = False
+    if quitar.any():
+        # Only inked pixels are looked up, so this step follows the ink, not the window size
+        puntos = cv2.findNonZero(relleno).reshape(-1, 2)
+        puntos = puntos[quitar[etiquetas[puntos[:, 1], puntos[:, 0]]]]
+        relleno[puntos[:, 1], puntos[:, 0]] = 0
+    return relleno[1:-1, 1:-1]
+
+
+def limpiar_ruido_mascara(mask: np.ndarray, min_area: int | None = None) -> np.ndarray:
+    """
+    Remove noise from a binary mask by filtering small blobs.
+    
+    Each 8-connected blob is filled (holes included) and kept if the area of its
+    outer contour exceeds min_area: the same decisions and fills as drawing every
+    external contour of cv2.findContours whose cv2.contourArea is large enough,
+    except for the odd background pixel that drawContours' polygon fill paints
+    in a concave diagonal notch.
+    
+    Holes are filled with one flood fill of the outside, blobs are labelled
+    with cv2.connectedComponents, their areas come from area_componentes, and
+    the pixels of dropped labels are cleared through a keep/drop table, so
+    there is no Python-level work per blob. Only the inked part of the frame is
+    processed: groups of 8-connected inked blocks (BLOQUE_LIMPIEZA pixels) are
+    cleaned one window at a time, since no blob spans two groups. On speckled
+    scans the blocks merge into a few large groups.
+    
+    Args:
+        mask: Binary mask image
+        min_area: Minimum contour area to keep
+    
+    Returns:
+        Cleaned binary mask
+    """
+    if min_area is None:
+        min_area = get_min_contour_area()
+    
+    mask_clean = np.zeros_like(mask)
+    alto, ancho = mask.shape[:2]
+    bloque = BLOQUE_LIMPIEZA
+    n_grupos, grupos, stats, _ = cv2.connectedComponentsWithStats(
+        (_reducir_por_bloques(mask, bloque) > 0).view(np.uint8), connectivity=8
+    )
+    
+    for grupo, (bx, by, bw, bh, _) in enumerate(stats[1:n_grupos], 1):
+        filas = slice(by * bloque, min(alto, (by + bh) * bloque))
+        columnas = slice(bx * bloque, min(ancho, (bx + bw) * bloque))
+        ventana = mask[filas, columnas]
+        
+        # Blocks of other groups that fall inside this window are left out
+        bloques_ventana = grupos[by:by + bh, bx:bx + bw]
+        if np.any((bloques_ventana != grupo) & (bloques_ventana != 0)):
+            propios = np.repeat(np.repeat(bloques_ventana == grupo, bloque, axis=0), bloque, axis=1)
+            ventana = np.where(propios[:ventana.shape[0], :ventana.shape[1]], ventana, 0).astype(np.uint8)
+        
+        destino = mask_clean[filas, columnas]
+        np.bitwise_or(destino, _limpiar_ventana(ventana, min_area), out=destino)
+    return mask_clean
+
+
+# FLANN index type for binary descriptors (locality-sensitive hashing)
+FLANN_INDEX_LSH = 6
+
+
+def seleccionar_en_rejilla(
+    keypoints: tuple, 
+    celdas: int, 
+    max_features: int, 
+    forma: tuple[int, ...]
+) -> list[cv2.KeyPoint]:
+    """
+    Keep the strongest keypoints of each cell of a grid over the image.
+    
+    Spreads the feature budget over the whole page instead of letting dense
+    areas (hatching, text blocks) take most of it.
+    
+    Args:
+        keypoints: Detected keypoints
+        celdas: Grid cells per side
+        max_features: Total number of keypoints to keep
+        forma: Shape of the image the keypoints come from
+    
+    Returns:
+        Selected keypoints (at most max_features)
+    """
+    alto, ancho = forma[:2]
+    por_celda = -(-max_features // (celdas * celdas))
+    cubetas: dict[tuple[int, int], list[cv2.KeyPoint]] = {}
+    for kp in keypoints:
+        x, y = kp.pt
+        celda = (min(celdas - 1, int(y * celdas / alto)), min(celdas - 1, int(x * celdas / ancho)))
+        cubetas.setdefault(celda, []).append(kp)
+    
+    seleccion = []
+    for puntos in cubetas.values():
+        puntos.sort(key=lambda kp: kp.response, reverse=True)
+        seleccion.extend(puntos[:por_celda])
+    return seleccion[:max_features] if len(seleccion) > max_features else seleccion
+
+
+def _detectar_orb(gray: np.ndarray, max_features: int) -> tuple[tuple, np.ndarray | None]:
+    """ORB keypoints and descriptors of a grayscale image, after CLAHE."""
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    gray = clahe.apply(gray)
+    
+    celdas = get_rejilla_orb()
+    if celdas <= 0:
+        return cv2.ORB_create(max_features).detectAndCompute(gray, None)
+    
+    # Over-detect, then spread the budget over the grid before computing descriptors
+    orb = cv2.ORB_create(2 * max_features)
+    keypoints = seleccionar_en_rejilla(orb.detect(gray, None), celdas, max_features, gray.shape)
+    return orb.compute(gray, keypoints)
+
+
+def crear_emparejador_orb() -> cv2.DescriptorMatcher:
+    """Descriptor matcher for ORB features, as configured (brute force or FLANN LSH)."""
+    if get_emparejador_orb() == "flann":
+        indice = dict(
+            algorithm=FLANN_INDEX_LSH, 
+            table_number=get_lsh_tablas(), 
+            key_size=get_lsh_tamano_clave(), 
+            multi_probe_level=get_lsh_sondeo(),
+        )
+        return cv2.FlannBasedMatcher(indice, dict(checks=get_lsh_comprobaciones()))
+    return cv2.BFMatcher(cv2.DESCRIPTOR_MATCHER_BRUTEFORCE_HAMMING, crossCheck=False)
+
+
+def _emparejar_orb(descriptores_mover: np.ndarray, descriptores_base: np.ndarray) -> list[cv2.DMatch]:
+    """Match ORB descriptors with knnMatch and Lowe's ratio test."""
+    if len(descriptores_base) < 2:
+        return []
+    matches = crear_emparejador_orb().knnMatch(descriptores_mover, descriptores_base, k=2)
+    return [par[0] for par in matches if len(par) == 2 and par[0].distance < 0.70 * par[1].distance]
+
+
+def _estimar_homografia_orb(
+    gray_base: np.ndarray, 
+    gray_move: np.ndarray, 
+    max_features: int
+) -> np.ndarray | None:
+    """ORB + knnMatch + RANSAC homography between two grayscale images."""
+    keypoints1, descriptors1 = _detectar_orb(gray_move, max_features)
+    keypoints2, descriptors2 = _detectar_orb(gray_base, max_features)
+
+    if descriptors1 is None or descriptors2 is None:
+        return None
+
+    good_matches = _emparejar_orb(descriptors1, descriptors2)
+    if len(good_matches) < get_min_matches_homography():
+        return None
+
+    src_pts = np.float32([keypoints1[m.queryIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+    dst_pts = np.float32([keypoints2[m.trainIdx].pt for m in good_matches]).reshape(-1, 1, 2)
+
+    h_matrix, _ = cv2.findHomography(src_pts, dst_pts, cv2.RANSAC, 5.0)
+    return h_matrix
+
+
+# Refinement samples a grid of windows (per side) of this size in full-resolution pixels
+VENTANAS_REFINADO = 3
+TAMANO_VENTANA_REFINADO = 512
+# Minimum phase correlation response for a window to be trusted
+MIN_RESPUESTA_REFINADO = 0.1
+
+
+def refinar_homografia(
+    gray_base: np.ndarray, 
+    gray_move: np.ndarray, 
+    h_inicial: np.ndarray, 
+    tolerancia: float
+) -> np.ndarray:
+    """
+    Refine a coarse homography at full resolution on a sample of small windows.
+    
+    A grid of windows is taken from the base page. For each one, the moving page
+    is warped into the window with the coarse homography and the remaining
+    shift is measured by phase correlation (sub-pixel). The shifts of the
+    windows define an affine correction that is applied on top of the coarse
+    homography.
+    
+    Args:
+        gray_base: Full-resolution reference image (single channel)
+        gray_move: Full-resolution image to align (single channel)
+        h_inicial: Coarse homography from gray_move to gray_base pixels
+        tolerancia: Largest residual shift (pixels) expected from the coarse homography
+    
+    Returns:
+        Refined homography, or h_inicial if the sample is not conclusive
+    """
+    alto, ancho = gray_base.shape[:2]
+    lado = min(TAMANO_VENTANA_REFINADO, ancho, alto)
+    hanning = cv2.createHanningWindow((lado, lado), cv2.CV_32F)
+    
+    origen, destino = [], []
+    for fila in range(VENTANAS_REFINADO):
+        for columna in range(VENTANAS_REFINADO):
+            # Window centred in its grid cell
+            x0 = int(np.clip((columna + 0.5) * ancho / VENTANAS_REFINADO - lado / 2, 0, ancho - lado))
+            y0 = int(np.clip((fila + 0.5) * alto / VENTANAS_REFINADO - lado / 2, 0, alto - lado))
+            ventana_base = gray_base[y0:y0 + lado, x0:x0 + lado]
+            if cv2.countNonZero(cv2.compare(ventana_base, 128, cv2.CMP_LT)) < lado:
+                continue  # Blank window: nothing to correlate
+            
+            traslacion = np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]], dtype=np.float64)
+            ventana_move = cv2.warpPerspective(
+                gray_move, traslacion @ h_inicial, (lado, lado), borderValue=255
+            )
+            (dx, dy), respuesta = cv2.phaseCorrelate(
+                np.float32(ventana_move), np.float32(ventana_base), hanning
+            )
+            if respuesta < MIN_RESPUESTA_REFINADO or max(abs(dx), abs(dy)) > tolerancia:
+                continue
+            
+            centro = (x0 + lado / 2, y0 + lado / 2)
+            origen.append(centro)
+            destino.append((centro[0] + dx, centro[1] + dy))
+    
+    if len(origen) < 3:
+        return h_inicial
+    
+    correccion, _ = cv2.estimateAffine2D(
+        np.float32(origen), np.float32(destino), method=cv2.RANSAC, ransacReprojThreshold=1.0
+    )
+    if correccion is None:
+        return h_inicial
+    return np.vstack([correccion, [0, 0, 1]]) @ h_inicial
+
+
+def estimar_homografia(img_base: np.ndarray, img_a_mover: np.ndarray) -> np.ndarray | None:
+    """
+    Estimate the homography that maps an image onto a base image.
+    Uses CLAHE for better feature detection, ORB features and knnMatch with ratio test.
+    
+    Large pages are aligned on a pyramid: features are detected and matched on a
+    reduced copy whose largest side is the configured alignment resolution, and
+    the homography found there is scaled up and, optionally, refined at full
+    resolution on a sample of windows (see refinar_homografia).
+    
+    Args:
+        img_base: Reference image
+        img_a_mover: Image to align
+    
+    Returns:
+        3x3 homography from img_a_mover to img_base coordinates, or None if
+        there are not enough reliable matches
+    """
+    # Convert to grayscale if needed
+    gray_base = cv2.cvtColor(img_base, cv2.COLOR_RGB2GRAY) if img_base.ndim == 3 else img_base
+    gray_move = cv2.cvtColor(img_a_mover, cv2.COLOR_RGB2GRAY) if img_a_mover.ndim == 3 else img_a_mover
+    
+    max_features = get_orb_max_features()
+    lado_max = max(*gray_base.shape[:2], *gray_move.shape[:2])
+    resolucion = get_resolucion_alineacion()
+    if resolucion <= 0 or lado_max <= resolucion:
+        return _estimar_homografia_orb(gray_base, gray_move, max_features)
+    
+    # Coarse level: the feature budget shrinks with the page area
+    escala = resolucion / lado_max
+    small_base = cv2.resize(gray_base, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    small_move = cv2.resize(gray_move, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    h_small = _estimar_homografia_orb(small_base, small_move, max(500, int(max_features * escala ** 2)))
+    if h_small is None:
+        return None
+    
+    h_matrix = escalar_homografia(
+        h_small, small_base.shape, small_move.shape, 
+        (gray_base.shape[1], gray_base.shape[0]), (gray_move.shape[1], gray_move.shape[0])
+    )
+    if not get_refinar_alineacion():
+        return h_matrix
+    
+    # A coarse pixel is 1/escala full-resolution pixels; allow a few of them
+    return refinar_homografia(gray_base, gray_move, h_matrix, 4.0 / escala)
+
+
+# Alignment tiers whose transform is worth offering to the next pages of a pair
+ALINEACIONES_REUTILIZABLES = ("reutilizada", "correlacion", "orb")
+# Largest side (pixels) of the reduced copies used by the pre-alignment tiers
+RESOLUCION_PREALINEACION = 1000
+# Phase correlation response below which the estimated shift is not trusted
+MIN_RESPUESTA_PREALINEACION = 0.05
+# Fraction of the ink that must overlap once a pre-alignment is applied
+MIN_PUNTUACION_ALINEACION = 0.9
+
+
+@dataclass
+class Alineacion:
+    """
+    Transform that maps a new page onto its base page, and the tier that found it.
+    
+    metodo is "identidad" (pages already aligned), "reutilizada" (the transform
+    of a previous page of the same pair, validated), "correlacion" (translation
+    from phase correlation, refined), "orb" (feature homography) or "ninguna"
+    (no transform found; the new page is stretched onto the base page).
+    """
+    homografia: np.ndarray | None
+    metodo: str
+    puntuacion: float = 0.0
+
+
+def reducir_par(
+    gray_base: np.ndarray, 
+    gray_move: np.ndarray, 
+    lado_max: int
+) -> tuple[np.ndarray, np.ndarray, float]:
+    """Copies of both pages reduced by the same factor so the largest side fits lado_max."""
+    escala = min(1.0, lado_max / max(*gray_base.shape[:2], *gray_move.shape[:2]))
+    if escala == 1.0:
+        return gray_base, gray_move, escala
+    return (
+        cv2.resize(gray_base, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA),
+        cv2.resize(gray_move, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA),
+        escala,
+    )
+
+
+def puntuar_alineacion(small_base: np.ndarray, small_move: np.ndarray, h_small: np.ndarray) -> float:
+    """
+    Ink overlap score of an alignment, on reduced copies of the pages.
+    
+    Returns the larger of the fractions of base ink covered by the aligned new
+    ink and vice versa (with one pixel of tolerance), so content added or
+    removed on one side only does not lower the score. 0.0 if a page is blank.
+    """
+    alto, ancho = small_base.shape[:2]
+    alineada = cv2.warpPerspective(small_move, h_small, (ancho, alto), borderValue=255)
+    
+    limite = 255 - get_umbral_bin()
+    tinta_base = cv2.compare(small_base, limite, cv2.CMP_LT)
+    tinta_move = cv2.compare(alineada, limite, cv2.CMP_LT)
+    n_base, n_move = cv2.countNonZero(tinta_base), cv2.countNonZero(tinta_move)
+    if not n_base or not n_move:
+        return 0.0
+    
+    kernel = np.ones((3, 3), np.uint8)
+    cubierta_base = cv2.countNonZero(cv2.bitwise_and(tinta_base, cv2.dilate(tinta_move, kernel))) / n_base
+    cubierta_move = cv2.countNonZero(cv2.bitwise_and(tinta_move, cv2.dilate(tinta_base, kernel))) / n_move
+    return max(cubierta_base, cubierta_move)
+
+
+def _validar_homografia(
+    gray_base: np.ndarray, 
+    gray_move: np.ndarray, 
+    small_base: np.ndarray, 
+    small_move: np.ndarray, 
+    escala: float, 
+    h_matrix: np.ndarray
+) -> tuple[np.ndarray, float]:
+    """Refine a candidate full-resolution homography and score it on the reduced copies."""
+    if get_refinar_alineacion():
+        h_matrix = refinar_homografia(gray_base, gray_move, h_matrix, 4.0 / escala)
+    
+    h_small = escalar_homografia(
+        h_matrix, gray_base.shape, gray_move.shape, 
+        (small_base.shape[1], small_base.shape[0]), (small_move.shape[1], small_move.shape[0])
+    )
+    return h_matrix, puntuar_alineacion(small_base, small_move, h_small)
+
+
+def alinear_paginas(
+    img_base: np.ndarray, 
+    img_a_mover: np.ndarray, 
+    misma_geometria: bool = False, 
+    pista: np.ndarray | None = None
+) -> Alineacion:
+    """
+    Find the transform that maps a page onto its base page, cheapest tier first.
+    
+    1. Identity: the page boxes and rotation match (misma_geometria) and phase
+       correlation finds no shift.
+    2. Reuse: the transform of a previous page of the pair (pista), refined at
+       full resolution (see refinar_homografia) and accepted if the ink of both
+       pages overlaps (see puntuar_alineacion).
+    3. Correlation: phase correlation on reduced copies gives a translation,
+       refined and validated the same way.
+    4. ORB homography (see estimar_homografia).
+    
+    Args:
+        img_base: Reference image
+        img_a_mover: Image to align
+        misma_geometria: Both pages have the same page boxes and rotation
+        pista: Homography that aligned a previous page of the same pair
+    
+    Returns:
+        Alignment result, with the tier used
+    """
+    gray_base = a_escala_grises(img_base)
+    gray_move = a_escala_grises(img_a_mover)
+    
+    if get_prealineacion() and gray_base.shape == gray_move.shape:
+        small_base, small_move, escala = reducir_par(gray_base, gray_move, RESOLUCION_PREALINEACION)
+        (dx, dy), respuesta = cv2.phaseCorrelate(np.float32(small_move), np.float32(small_base))
+        
+        # Below a quarter of a reduced pixel the shift is measurement noise
+        if respuesta >= MIN_RESPUESTA_PREALINEACION and misma_geometria and np.hypot(dx, dy) < 0.25:
+            return Alineacion(np.eye(3), "identidad", respuesta)
+        
+        if pista is not None:
+            h_matrix, puntuacion = _validar_homografia(
+                gray_base, gray_move, small_base, small_move, escala, pista
+            )
+            if puntuacion >= MIN_PUNTUACION_ALINEACION:
+                return Alineacion(h_matrix, "reutilizada", puntuacion)
+        
+        if respuesta >= MIN_RESPUESTA_PREALINEACION:
+            traslacion = np.array([[1, 0, dx / escala], [0, 1, dy / escala], [0, 0, 1]], dtype=np.float64)
+            h_matrix, puntuacion = _validar_homografia(
+                gray_base, gray_move, small_base, small_move, escala, traslacion
+            )
+            if puntuacion >= MIN_PUNTUACION_ALINEACION:
+                return Alineacion(h_matrix, "correlacion", puntuacion)
+    
+    try:
+        h_matrix = estimar_homografia(gray_base, gray_move)
+    except Exception:
+        h_matrix = None
+    return Alineacion(h_matrix, "orb" if h_matrix is not None else "ninguna")
+
+
+def aplicar_alineacion(
+    img_a_mover: np.ndarray, 
+    alineacion: Alineacion, 
+    tamano: tuple[int, int]
+) -> np.ndarray:
+    """
+    Bring an image onto the base page with an alignment result.
+    
+    Args:
+        img_a_mover: Image to align
+        alineacion: Result of alinear_paginas
+        tamano: (width, height) of the base page
+    
+    Returns:
+        Aligned image; stretched onto the base page if no transform was found
+    """
+    width, height = tamano
+    if alineacion.homografia is None:
+        return cv2.resize(img_a_mover, (width, height))
+    if alineacion.metodo == "identidad" and img_a_mover.shape[1::-1] == tamano:
+        return img_a_mover
+    return cv2.warpPerspective(img_a_mover, alineacion.homografia, (width, height))
+
+
+def alinear_imagen(img_base: np.ndarray, img_a_mover: np.ndarray) -> np.ndarray:
+    """
+    Align an image to a base image (see alinear_paginas).
+    Falls back to a plain resize when no transform can be estimated.
+    
+    Args:
+        img_base: Reference image
+        img_a_mover: Image to align
+    
+    Returns:
+        Aligned image
+    """
+    alineacion = alinear_paginas(img_base, img_a_mover)
+    return aplicar_alineacion(img_a_mover, alineacion, (img_base.shape[1], img_base.shape[0]))
+
+
+def a_escala_grises(img: np.ndarray) -> np.ndarray:
+    """Return a single-channel view of a page, converting RGB input once."""
+    return cv2.cvtColor(img, cv2.COLOR_RGB2GRAY) if img.ndim == 3 else img
+
+
+# Above this fraction of the frame to be processed around changed blocks, the whole frame is diffed
+MAX_COBERTURA_BLOQUES = 0.5
+# Pixel step of the sample that detects pages changed almost everywhere (rescans) early
+PASO_MUESTRA_BLOQUES = 4
+
+
+def _reducir_por_bloques(valores: np.ndarray, bloque: int) -> np.ndarray:
+    """Maximum of each bloque x bloque block of a frame (partial blocks at the edges)."""
+    alto, ancho = valores.shape[:2]
+    por_columnas = np.maximum.reduceat(valores, np.arange(0, ancho, bloque), axis=1)
+    return np.maximum.reduceat(por_columnas, np.arange(0, alto, bloque), axis=0)
+
+
+class NucleoDiferencias:
+    """
+    Diff and composition stages with preallocated, reused frame buffers.
+    
+    Every intermediate frame (blurred, binarized, dilated, raw difference,
+    faded base) lives in a buffer that is reused by the next page of
+    the same size, and the stages write into them in place. One instance is
+    kept per thread (see obtener_nucleo_diferencias).
+    
+    Before the morphology, a block pre-scan (see regiones_con_cambios) finds
+    the blocks where the aligned pages differ at all; only those, plus the
+    reach of the filters, go through blur/threshold/dilate/subtract. 
+    area_omitida holds the fraction of the last frame that was skipped.
+    """
+    
+    def __init__(self) -> None:
+        self._buffers: dict[str, np.ndarray] = {}
+        self.area_omitida = 0.0
+    
+    def _buffer(self, nombre: str, forma: tuple[int, ...], dtype: type = np.uint8) -> np.ndarray:
+        """Named scratch buffer, reallocated only when the page size changes."""
+        buffer = self._buffers.get(nombre)
+        if buffer is None or buffer.shape != forma or buffer.dtype != dtype:
+            buffer = self._buffers[nombre] = np.empty(forma, dtype=dtype)
+        return buffer
+    
+    def buffer_composicion(self, forma: tuple[int, ...]) -> np.ndarray:
+        """Reusable RGB output frame for pages of the given (height, width)."""
+        return self._buffer("composicion", (*forma[:2], 3))
+    
+    def _buffer_opcional(self, nombre: str, forma: tuple[int, ...], reutilizar: bool) -> np.ndarray | None:
+        """Named buffer, or None (let OpenCV allocate) for one-off region frames."""
+        return self._buffer(nombre, forma) if reutilizar else None
+    
+    def binarizar(self, gray: np.ndarray, nombre: str, reutilizar: bool = True) -> np.ndarray:
+        """
+        Ink mask of a page: optional blur, then threshold.
+        
+        threshold(bitwise_not(g), t) > 0 is the same as g <= 254 - t, so the
+        inversion and the threshold are a single inverted threshold pass.
+        """
+        forma = gray.shape[:2]
+        if get_usar_blur():
+            gray = cv2.GaussianBlur(gray, (5, 5), 0, dst=self._buffer_opcional(f"blur_{nombre}", forma, reutilizar))
+        binaria = self._buffer_opcional(f"bin_{nombre}", forma, reutilizar)
+        _, binaria = cv2.threshold(gray, 254 - get_umbral_bin(), 255, cv2.THRESH_BINARY_INV, dst=binaria)
+        return binaria
+    
+    def diferencias(
+        self, 
+        gray_base: np.ndarray, 
+        gray_new: np.ndarray, 
+        reutilizar: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Raw (green, magenta) differences before noise removal.
+        
+        Binarizes both pages, dilates each one and subtracts it from the other.
+        With reutilizar=False the frames are freshly allocated instead of taken
+        from the page buffers (used for the regions of the block pre-scan).
+        """
+        forma = gray_base.shape[:2]
+        bin_base = self.binarizar(gray_base, "base", reutilizar)
+        bin_new = self.binarizar(gray_new, "new", reutilizar)
+        
+        k_size = get_kernel_size()
+        kernel = np.ones((k_size, k_size), np.uint8)
+        iteraciones = get_iteraciones()
+        base_dilatada = cv2.dilate(
+            bin_base, kernel, dst=self._buffer_opcional("dil_base", forma, reutilizar), iterations=iteraciones
+        )
+        new_dilatada = cv2.dilate(
+            bin_new, kernel, dst=self._buffer_opcional("dil_new", forma, reutilizar), iterations=iteraciones
+        )
+        
+        raw_green = cv2.subtract(bin_new, base_dilatada, dst=self._buffer_opcional("raw_green", forma, reutilizar))
+        raw_magenta = cv2.subtract(bin_base, new_dilatada, dst=self._buffer_opcional("raw_magenta", forma, reutilizar))
+        return raw_green, raw_magenta
+    
+    def regiones_con_cambios(
+        self, 
+        gray_base: np.ndarray, 
+        gray_new: np.ndarray, 
+        bloque: int
+    ) -> list[tuple[tuple[slice, slice], tuple[slice, slice]]] | None:
+        """
+        Block pre-scan: the parts of an aligned pair that can hold differences.
+        
+        A pixel can only end up in a raw difference mask if the two pages differ
+        within the blur radius of it (elsewhere both binarize the same, and a
+        dilated mask always covers the undilated one). Blocks with any differing
+        pixel are grouped into connected regions; each region's bounding box,
+        grown by the blur radius, is a core whose raw masks are exact when
+        computed on a window that adds the blur and dilation reach around it.
+        
+        Args:
+            gray_base: Base page (single channel)
+            gray_new: New page aligned to the base (single channel)
+            bloque: Block side in pixels
+        
+        Returns:
+            List of (core, window) slice pairs in page coordinates, or None when
+            the windows would cover too much of the page to be worth it
+        """
+        alto, ancho = gray_base.shape[:2]
+        
+        # A sparse sample already shows most blocks changed on rescans, for a fraction of the cost
+        paso = PASO_MUESTRA_BLOQUES
+        if bloque % paso == 0:
+            muestra = np.not_equal(gray_base[::paso, ::paso], gray_new[::paso, ::paso])
+            if _reducir_por_bloques(muestra, bloque // paso).mean() > MAX_COBERTURA_BLOQUES:
+                return None
+        
+        diferencia = cv2.absdiff(gray_base, gray_new, dst=self._buffer("diferencia", (alto, ancho)))
+        bloques = _reducir_por_bloques(diferencia, bloque)
+        
+        n_regiones, _, stats, _ = cv2.connectedComponentsWithStats(
+            (bloques > 0).view(np.uint8), connectivity=8
+        )
+        radio_blur = 2 if get_usar_blur() else 0
+        alcance = radio_blur + get_kernel_size() * get_iteraciones()
+        
+        regiones = []
+        area_ventanas = 0
+        for bx, by, bw, bh, _ in stats[1:n_regiones]:
+            x0, x1 = max(0, bx * bloque - radio_blur), min(ancho, (bx + bw) * bloque + radio_blur)
+            y0, y1 = max(0, by * bloque - radio_blur), min(alto, (by + bh) * bloque + radio_blur)
+            vx0, vx1 = max(0, x0 - alcance), min(ancho, x1 + alcance)
+            vy0, vy1 = max(0, y0 - alcance), min(alto, y1 + alcance)
+            regiones.append(((slice(y0, y1), slice(x0, x1)), (slice(vy0, vy1), slice(vx0, vx1))))
+            area_ventanas += (vx1 - vx0) * (vy1 - vy0)
+        
+        if area_ventanas > MAX_COBERTURA_BLOQUES * ancho * alto:
+            return None
+        self.area_omitida = 1 - area_ventanas / (ancho * alto)
+        return regiones
+    
+    def diferencias_en_bruto(self, gray_base: np.ndarray, gray_new: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Raw (green, magenta) differences of a whole frame, skipping unchanged blocks.
+        
+        The result is the same as diferencias(); only the regions found by the
+        block pre-scan go through the filters. The frames are the kernel's
+        buffers, valid until the next call.
+        """
+        self.area_omitida = 0.0
+        bloque = get_bloque_sin_cambios()
+        regiones = self.regiones_con_cambios(gray_base, gray_new, bloque) if bloque > 0 else None
+        
+        if regiones is None:
+            raw_green, raw_magenta = self.diferencias(gray_base, gray_new)
+        else:
+            forma = gray_base.shape[:2]
+            raw_green = self._buffer("raw_green", forma)
+            raw_magenta = self._buffer("raw_magenta", forma)
+            raw_green.fill(0)
+            raw_magenta.fill(0)
+            for (cy, cx), (vy, vx) in regiones:
+                green_ventana, magenta_ventana = self.diferencias(gray_base[vy, vx], gray_new[vy, vx], reutilizar=False)
+                # Only the core is exact; the rest of the window was context for the filters
+                nucleo = (slice(cy.start - vy.start, cy.stop - vy.start), slice(cx.start - vx.start, cx.stop - vx.start))
+                raw_green[cy, cx] = green_ventana[nucleo]
+                raw_magenta[cy, cx] = magenta_ventana[nucleo]
+        return raw_green, raw_magenta
+    
+    def mascaras(
+        self, 
+        gray_base: np.ndarray, 
+        gray_new: np.ndarray, 
+        min_area: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Cleaned (green, magenta) masks; see calcular_mascaras_diferencia."""
+        raw_green, raw_magenta = self.diferencias_en_bruto(gray_base, gray_new)
+        
+        # Noise removal runs on the whole frame, so blobs crossing region borders keep their full area
+        return (
+            limpiar_ruido_mascara(raw_green, min_area=min_area), 
+            limpiar_ruido_mascara(raw_magenta, min_area=min_area),
+        )
+    
+    def componer(
+        self, 
+        gray_base: np.ndarray, 
+        mask_green: np.ndarray | None = None, 
+        mask_magenta: np.ndarray | None = None, 
+        out: np.ndarray | None = None
+    ) -> np.ndarray:
+        """
+        RGB comparison page; see componer_comparacion.
+        
+        The faded base is a 256-entry table lookup (tabla_fantasma) expanded
+        straight into the output frame, and each highlight is painted in place
+        through its mask, with no boolean index arrays.
+        """
+        forma = gray_base.shape[:2]
+        if out is None:
+            out = np.empty((*forma, 3), dtype=np.uint8)
+        
+        fantasma = cv2.LUT(gray_base, tabla_fantasma(), dst=self._buffer("fantasma", forma))
+        cv2.cvtColor(fantasma, cv2.COLOR_GRAY2RGB, dst=out)
+        
+        for mascara, color in ((mask_green, Colors.GREEN), (mask_magenta, Colors.MAGENTA)):
+            if mascara is not None:
+                cv2.bitwise_and(out, (0, 0, 0, 0), dst=out, mask=mascara)
+                cv2.bitwise_or(out, (*color, 0), dst=out, mask=mascara)
+        return out
+
+
+@lru_cache(maxsize=1)
+def tabla_fantasma() -> np.ndarray:
+    """
+    Faded base value for every gray level.
+    
+    Computed with the same cv2.addWeighted call as a full page, so the lookup
+    reproduces it exactly.
+    """
+    grises = np.arange(256, dtype=np.uint8).reshape(1, -1)
+    tabla = cv2.addWeighted(grises, 0.3, np.full_like(grises, 255), 0.7, 0)
+    tabla.flags.writeable = False
+    return tabla
+
+
+@lru_cache(maxsize=1)
+def paleta_comparacion() -> tuple[np.ndarray, bytes]:
+    """
+    Palette of the comparison page, for indexed output.
+    
+    The faded base only takes a few dozen distinct levels, so the palette is
+    those levels in gray followed by the green and magenta highlights.
+    
+    Returns:
+        Tuple (table from base gray level to palette index, RGB palette bytes)
+    """
+    niveles, indices = np.unique(tabla_fantasma(), return_inverse=True)
+    tabla = indices.astype(np.uint8).reshape(1, -1)
+    tabla.flags.writeable = False
+    paleta = np.concatenate([np.repeat(niveles, 3), Colors.GREEN, Colors.MAGENTA]).astype(np.uint8)
+    return tabla, paleta.tobytes()
+
+
+_nucleos_diferencias = threading.local()
+
+
+def obtener_nucleo_diferencias() -> NucleoDiferencias:
+    """Diff kernel of the current thread, so its buffers are reused page after page."""
+    nucleo = getattr(_nucleos_diferencias, "nucleo", None)
+    if nucleo is None:
+        nucleo = _nucleos_diferencias.nucleo = NucleoDiferencias()
+    return nucleo
+
+
+def calcular_mascaras_diferencia(
+    gray_base: np.ndarray, 
+    gray_new: np.ndarray,
+    min_area: int | None = None
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the added/removed masks between two aligned grayscale pages.
+    
+    Args:
+        gray_base: Base/original page (single channel)
+        gray_new: New page aligned to the base (single channel)
+        min_area: Minimum blob area to keep (default from configuration)
+    
+    Returns:
+        Tuple (green, magenta) of cleaned binary masks for new and removed content
+    """
+    if min_area is None:
+        min_area = get_min_contour_area()
+    return obtener_nucleo_diferencias().mascaras(gray_base, gray_new, min_area)
+
+
+def componer_comparacion(
+    gray_base: np.ndarray, 
+    mask_green: np.ndarray | None = None, 
+    mask_magenta: np.ndarray | None = None
+) -> np.ndarray:
+    """
+    Compose the output page: a faded base page with the differences in colour.
+    
+    This is the only stage that works with colour; everything before it is
+    single-channel.
+    
+    Args:
+        gray_base: Base/original page (single channel)
+        mask_green: Mask of new content (None = no new content)
+        mask_magenta: Mask of removed content (None = no removed content)
+    
+    Returns:
+        RGB comparison image
+    """
+    return obtener_nucleo_diferencias().componer(gray_base, mask_green, mask_magenta)
+
+
+def _empaquetar_mascara(mask: np.ndarray | None) -> np.ndarray | None:
+    """Bit-pack a binary mask along its rows (None if the mask is empty)."""
+    if mask is None or not cv2.countNonZero(mask):
+        return None
+    return np.packbits(mask > 0, axis=1)
+
+
+# Set bits of every byte value, to count pixels of bit-packed masks
+_BITS_POR_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+# Side (pixels) of the cells in which bit-packed masks are grouped into zones; one byte wide
+CELDA_ZONAS = 8
+
+
+def contar_pixeles(mascara: np.ndarray | None) -> int:
+    """Set pixels of a bit-packed mask."""
+    if mascara is None:
+        return 0
+    return int(np.bincount(mascara.ravel(), minlength=256) @ _BITS_POR_BYTE)
+
+
+def zonas_de_cambio(
+    mascara: np.ndarray | None, 
+    tamano: tuple[int, int], 
+    separacion: int
+) -> list[tuple[int, int, int, int]]:
+    """
+    Bounding boxes of the clusters of changes in a bit-packed mask.
+    
+    The mask is reduced to CELDA_ZONAS-pixel cells (a cell is changed if any of its
+    pixels is), cells closer than the separation are grouped, and each group is
+    boxed by its changed cells, so the boxes are exact to one cell.
+    
+    Args:
+        mascara: Mask bit-packed along rows (see ResultadoHoja), or None
+        tamano: (width, height) of the page in pixels
+        separacion: Changes closer than this many pixels belong to the same zone
+    
+    Returns:
+        List of (x0, y0, x1, y1) boxes in page pixels, largest first
+    """
+    if mascara is None:
+        return []
+    ancho, alto = tamano
+    celdas = np.logical_or.reduceat(mascara != 0, np.arange(0, alto, CELDA_ZONAS), axis=0).view(np.uint8)
+    
+    radio = max(1, separacion // (2 * CELDA_ZONAS))
+    agrupadas = cv2.dilate(celdas, np.ones((2 * radio + 1, 2 * radio + 1), np.uint8))
+    n_zonas, etiquetas = cv2.connectedComponents(agrupadas, connectivity=8)
+    
+    filas, columnas = np.nonzero(celdas)
+    zona = etiquetas[filas, columnas]
+    x0 = np.full(n_zonas, celdas.shape[1])
+    y0 = np.full(n_zonas, celdas.shape[0])
+    x1 = np.zeros(n_zonas, dtype=np.intp)
+    y1 = np.zeros(n_zonas, dtype=np.intp)
+    np.minimum.at(x0, zona, columnas)
+    np.minimum.at(y0, zona, filas)
+    np.maximum.at(x1, zona, columnas + 1)
+    np.maximum.at(y1, zona, filas + 1)
+    
+    cajas = [
+        (int(a) * CELDA_ZONAS, int(b) * CELDA_ZONAS, min(ancho, int(c) * CELDA_ZONAS), min(alto, int(d) * CELDA_ZONAS))
+        for a, b, c, d in zip(x0[1:], y0[1:], x1[1:], y1[1:])
+    ]
+    return sorted(cajas, key=lambda c: (c[2] - c[0]) * (c[3] - c[1]), reverse=True)
+
+
+@dataclass
+class ResultadoHoja:
+    """
+    Comparison result of one page, in a compact form that is cheap to pickle.
+    
+    Holds the grayscale base page and the two difference masks bit-packed along
+    rows (None when a mask is empty), and how the page was aligned (an
+    Alineacion tier, "vectorial", or None for unchanged pages) with the
+    homography used, if any. area_omitida is the fraction of the page whose
+    raster diff was skipped as unchanged (None when the page was not diffed),
+    and segundos the time the page took to compare. The RGB page is only
+    composed by the process that writes the output.
+    """
+    pagina: int
+    fondo: np.ndarray
+    verde: np.ndarray | None = None
+    magenta: np.ndarray | None = None
+    alineacion: str | None = None
+    homografia: np.ndarray | None = None
+    area_omitida: float | None = None
+    segundos: float | None = None
+    
+    @classmethod
+    def sin_renderizar(cls, pagina: int, tamano: tuple[int, int]) -> ResultadoHoja:
+        """
+        Result of an unchanged page that was never rendered.
+        
+        The background is a blank page of the given (width, height), held as a
+        broadcast view, so it takes no memory.
+        """
+        ancho, alto = tamano
+        return cls(pagina, np.broadcast_to(np.uint8(Colors.WHITE), (alto, ancho)))
+    
+    @property
+    def tiene_cambios(self) -> bool:
+        """Whether any difference was detected on the page."""
+        return self.verde is not None or self.magenta is not None
+    
+    @classmethod
+    def desde_mascaras(
+        cls, 
+        pagina: int, 
+        fondo: np.ndarray, 
+        mask_green: np.ndarray | None = None, 
+        mask_magenta: np.ndarray | None = None, 
+        alineacion: str | None = None, 
+        homografia: np.ndarray | None = None, 
+        area_omitida: float | None = None
+    ) -> ResultadoHoja:
+        """Build a result from full (unpacked) difference masks."""
+        return cls(
+            pagina, fondo, _empaquetar_mascara(mask_green), _empaquetar_mascara(mask_magenta), 
+            alineacion, homografia, area_omitida
+        )
+    
+    def mascaras(self) -> tuple[np.ndarray | None, np.ndarray | None]:
+        """Unpacked (green, magenta) masks, as 0/1 arrays the size of the page."""
+        ancho = self.fondo.shape[1]
+        return tuple(
+            np.unpackbits(m, axis=1, count=ancho) if m is not None else None
+            for m in (self.verde, self.magenta)
+        )
+    
+    def resumen(self, separacion: int) -> dict:
+        """
+        Entry of the page in the change index (see escribir_indice_cambios).
+        
+        Args:
+            separacion: Changes closer than this many pixels form one zone
+        """
+        tamano = (self.fondo.shape[1], self.fondo.shape[0])
+        mascaras = [m for m in (self.verde, self.magenta) if m is not None]
+        union = np.bitwise_or.reduce(mascaras) if mascaras else None
+        
+        return {
+            "pagina": self.pagina,
+            "cambios": self.tiene_cambios,
+            "ancho": tamano[0],
+            "alto": tamano[1],
+            "pixeles_anadidos": contar_pixeles(self.verde),
+            "pixeles_eliminados": contar_pixeles(self.magenta),
+            "zonas": [list(caja) for caja in zonas_de_cambio(union, tamano, separacion)],
+            "alineacion": self.alineacion,
+            "area_omitida": None if self.area_omitida is None else round(self.area_omitida, 4),
+            "segundos": None if self.segundos is None else round(self.segundos, 3),
+        }
+    
+    def componer(self) -> np.ndarray:
+        """RGB comparison page (see componer_comparacion)."""
+        return componer_comparacion(self.fondo, *self.mascaras())
+    
+    def indices(self) -> np.ndarray:
+        """
+        Comparison page as indices into paleta_comparacion().
+        
+        Same pixels as componer(), one byte each instead of three.
+        """
+        tabla, paleta = paleta_comparacion()
+        indices = cv2.LUT(self.fondo, tabla)
+        for valor, mascara in enumerate(self.mascaras(), start=len(paleta) // 3 - 2):
+            if mascara is not None:
+                np.putmask(indices, mascara, valor)
+        return indices
+    
+    def imagen(self) -> Image.Image:
+        """RGB comparison page as a PIL image."""
+        # PIL copies RGB arrays into its own storage, so the frame buffer can be reused
+        nucleo = obtener_nucleo_diferencias()
+        rgb = nucleo.componer(self.fondo, *self.mascaras(), out=nucleo.buffer_composicion(self.fondo.shape))
+        return Image.fromarray(rgb)
+
+
+def comparar_hoja(
+    img_base_in: np.ndarray | Image.Image | None, 
+    img_move_in: np.ndarray | Image.Image | None, 
+    index: int, 
+    misma_geometria: bool = False, 
+    pista: np.ndarray | None = None
+) -> ResultadoHoja | None:
+    """
+    Align and diff a rendered page pair.
+    Uses configurable blur, binary threshold, kernel size, and iterations.
+    
+    Args:
+        img_base_in: Base/original page (array from the renderer, or PIL image)
+        img_move_in: New/modified page (array from the renderer, or PIL image)
+        index: Page number (for logging)
+        misma_geometria: Both pages have the same page boxes and rotation
+        pista: Homography that aligned a previous page of the same pair
+    
+    Returns:
+        Compact comparison result, or None on error
+    """
+    try:
+        # Work in grayscale from the start; RGB input is converted once
+        gray_base = a_escala_grises(np.asarray(img_base_in)) if img_base_in is not None else None
+        gray_move = a_escala_grises(np.asarray(img_move_in)) if img_move_in is not None else None
+
+        # Handle missing pages
+        if gray_base is None and gray_move is not None:
+            gray_base = np.full_like(gray_move, 255)
+        elif gray_move is None and gray_base is not None:
+            gray_move = np.full_like(gray_base, 255)
+        elif gray_base is None:
+            return None
+
+        # Align images
+        try:
+            alineacion = alinear_paginas(gray_base, gray_move, misma_geometria, pista)
+        except Exception:
+            alineacion = Alineacion(None, "ninguna")
+        gray_new = aplicar_alineacion(gray_move, alineacion, (gray_base.shape[1], gray_base.shape[0]))
+
+        mask_green, mask_magenta = calcular_mascaras_diferencia(gray_base, gray_new)
+        area_omitida = obtener_nucleo_diferencias().area_omitida
+        logger.debug(f"Page {index}: aligned by {alineacion.metodo}, {area_omitida:.0%} skipped as unchanged")
+
+        return ResultadoHoja.desde_mascaras(
+            index, gray_base, mask_green, mask_magenta, alineacion.metodo, alineacion.homografia, area_omitida
+        )
+    
+    except Exception as e:
+        logger.error(f"Error processing page {index}: {e}")
+        return None
+
+
+def procesar_hoja_premium(
+    img_base_in: np.ndarray | Image.Image | None, 
+    img_move_in: np.ndarray | Image.Image | None, 
+    index: int
+) -> Image.Image | None:
+    """
+    Process a page pair and create a comparison image with differences highlighted.
+    
+    Args:
+        img_base_in: Base/original page (array from the renderer, or PIL image)
+        img_move_in: New/modified page (array from the renderer, or PIL image)
+        index: Page index (for logging)
+    
+    Returns:
+        Comparison image with differences highlighted, or None on error
+    """
+    resultado = comparar_hoja(img_base_in, img_move_in, index)
+    return resultado.imagen() if resultado is not None else None
+
+
+def procesar_hoja_sin_cambios(
+    img_base_in: np.ndarray | Image.Image | None, 
+    index: int
+) -> ResultadoHoja | None:
+    """
+    Build the comparison result for a page known to be unchanged.
+    
+    Skips alignment and diffing entirely: the result is the faded base page
+    with no highlighted differences.
+    
+    Args:
+        img_base_in: Base/original page
+        index: Page number (for logging)
+    
+    Returns:
+        Comparison result without differences, or None on error
+    """
+    if img_base_in is None:
+        return None
+    
+    try:
+        return ResultadoHoja(index, a_escala_grises(np.asarray(img_base_in)))
+    except Exception as e:
+        logger.error(f"Error processing page {index}: {e}")
+        return None
+
+
+# ==========================================
+# VECTOR COMPARISON ENGINE
+# ==========================================
+
+# Grid (PDF points) used to compare primitive coordinates
+CUANTO_VECTORIAL = 0.25
+
+# Pages whose images cover more than this fraction of the page are treated as scanned
+MAX_COBERTURA_IMAGENES = 0.5
+
+# Bezier curves are flattened to this many points
+PUNTOS_CURVA = 8
+
+
+@dataclass
+class PrimitivasPagina:
+    """
+    Vector content of a born-digital page, in PDF points.
+    
+    Each stroke is a tuple (polylines, stroke colour, fill colour, width);
+    each word is a tuple (text, x0, y0, x1, y1).
+    """
+    ancho: float
+    alto: float
+    trazos: list[tuple]
+    palabras: list[tuple[str, float, float, float, float]]
+
+
+def extraer_primitivas(page: fitz.Page) -> PrimitivasPagina | None:
+    """
+    Extract drawing paths and words from a page.
+    
+    Args:
+        page: PyMuPDF page
+    
+    Returns:
+        The page primitives, or None if the page is not suitable for vector
+        comparison (rotated, scanned, or without vector content)
+    """
+    if page.rotation:
+        return None
+    
+    area_pagina = page.rect.width * page.rect.height
+    area_imagenes = sum(fitz.Rect(info["bbox"]).get_area() for info in page.get_image_info())
+    if area_pagina <= 0 or area_imagenes > MAX_COBERTURA_IMAGENES * area_pagina:
+        return None
+    
+    trazos: list[tuple] = []
+    for dibujo in page.get_drawings():
+        polilineas = []
+        for item in dibujo["items"]:
+            op = item[0]
+            if op == "l":
+                puntos = [item[1], item[2]]
+            elif op == "c":
+                p0, p1, p2, p3 = item[1:5]
+                puntos = [
+                    p0 * (1 - t) ** 3 + p1 * 3 * t * (1 - t) ** 2 + p2 * 3 * t ** 2 * (1 - t) + p3 * t ** 3
+                    for t in np.linspace(0.0, 1.0, PUNTOS_CURVA)
+                ]
+            elif op == "re":
+                r = item[1]
+                puntos = [r.tl, r.tr, r.br, r.bl, r.tl]
+            elif op == "qu":
+                q = item[1]
+                puntos = [q.ul, q.ur, q.lr, q.ll, q.ul]
+            else:
+                continue
+            polilineas.append(tuple((round(p.x, 3), round(p.y, 3)) for p in puntos))
+        
+        trazos.append((
+            tuple(polilineas),
+            tuple(round(c, 2) for c in dibujo.get("color") or ()),
+            tuple(round(c, 2) for c in dibujo.get("fill") or ()),
+            round(dibujo.get("width") or 0.0, 2),
+        ))
+    
+    palabras = [(w[4], w[0], w[1], w[2], w[3]) for w in page.get_text("words")]
+    
+    if not trazos and not palabras:
+        return None
+    
+    return PrimitivasPagina(page.rect.width, page.rect.height, trazos, palabras)
+
+
+def estimar_desplazamiento_vectorial(
+    prim_base: PrimitivasPagina, 
+    prim_nueva: PrimitivasPagina
+) -> tuple[float, float]:
+    """
+    Estimate the translation between two pages from words that appear once in each.
+    
+    Returns:
+        (dx, dy) in points to subtract from the new page to bring it onto the base
+    """
+    def unicas(palabras: list[tuple]) -> dict[str, tuple]:
+        conteo = Counter(p[0] for p in palabras)
+        return {p[0]: p for p in palabras if conteo[p[0]] == 1}
+    
+    base, nueva = unicas(prim_base.palabras), unicas(prim_nueva.palabras)
+    comunes = base.keys() & nueva.keys()
+    if len(comunes) < 3:
+        return 0.0, 0.0
+    
+    dx = float(np.median([nueva[t][1] - base[t][1] for t in comunes]))
+    dy = float(np.median([nueva[t][2] - base[t][2] for t in comunes]))
+    return dx, dy
+
+
+def _clave_trazo(trazo: tuple, dx: float, dy: float) -> tuple:
+    polilineas, color, relleno, ancho = trazo
+    return (
+        tuple(
+            tuple((round((x - dx) / CUANTO_VECTORIAL), round((y - dy) / CUANTO_VECTORIAL)) for x, y in poli) 
+            for poli in polilineas
+        ),
+        color, relleno, ancho,
+    )
+
+
+def _clave_palabra(palabra: tuple, dx: float, dy: float) -> tuple:
+    texto, x0, y0, x1, y1 = palabra
+    return (texto, *(round((v - d) / CUANTO_VECTORIAL) for v, d in ((x0, dx), (y0, dy), (x1, dx), (y1, dy))))
+
+
+def _sin_pareja(elementos: list[tuple], claves: list[tuple], otras: Counter) -> list[tuple]:
+    """Return the elements whose key is not matched (as a multiset) by the other page."""
+    restantes = Counter(claves) - otras
+    sobrantes = []
+    for elemento, clave in zip(elementos, claves):
+        if restantes[clave] > 0:
+            restantes[clave] -= 1
+            sobrantes.append(elemento)
+    return sobrantes
+
+
+def diferenciar_primitivas(
+    prim_base: PrimitivasPagina, 
+    prim_nueva: PrimitivasPagina
+) -> tuple[PrimitivasPagina, PrimitivasPagina, tuple[float, float]]:
+    """
+    Diff two pages geometrically at the primitive level.
+    
+    Args:
+        prim_base: Primitives of the base/original page
+        prim_nueva: Primitives of the new page
+    
+    Returns:
+        Tuple (removed, added, (dx, dy)): primitives only in the base page, primitives
+        only in the new page (in new-page coordinates), and the estimated translation
+    """
+    dx, dy = estimar_desplazamiento_vectorial(prim_base, prim_nueva)
+    
+    claves_trazos_a = [_clave_trazo(t, 0.0, 0.0) for t in prim_base.trazos]
+    claves_trazos_b = [_clave_trazo(t, dx, dy) for t in prim_nueva.trazos]
+    claves_palabras_a = [_clave_palabra(p, 0.0, 0.0) for p in prim_base.palabras]
+    claves_palabras_b = [_clave_palabra(p, dx, dy) for p in prim_nueva.palabras]
+    
+    eliminadas = PrimitivasPagina(
+        prim_base.ancho, prim_base.alto,
+        _sin_pareja(prim_base.trazos, claves_trazos_a, Counter(claves_trazos_b)),
+        _sin_pareja(prim_base.palabras, claves_palabras_a, Counter(claves_palabras_b)),
+    )
+    agregadas = PrimitivasPagina(
+        prim_nueva.ancho, prim_nueva.alto,
+        _sin_pareja(prim_nueva.trazos, claves_trazos_b, Counter(claves_trazos_a)),
+        _sin_pareja(prim_nueva.palabras, claves_palabras_b, Counter(claves_palabras_a)),
+    )
+    return eliminadas, agregadas, (dx, dy)
+
+
+def mascara_primitivas(
+    forma: tuple[int, int], 
+    primitivas: PrimitivasPagina, 
+    escala: float, 
+    desplazamiento: tuple[float, float] = (0.0, 0.0),
+    margen: int = 0
+) -> np.ndarray:
+    """
+    Rasterise the area covered by a set of primitives.
+    
+    Args:
+        forma: (height, width) of the mask in pixels
+        primitivas: Primitives to draw
+        escala: Pixels per PDF point
+        desplazamiento: (dx, dy) in points subtracted before drawing
+        margen: Extra pixels around every primitive
+    
+    Returns:
+        Binary mask (255 where a primitive is drawn)
+    """
+    mask = np.zeros(forma, dtype=np.uint8)
+    dx, dy = desplazamiento
+    
+    for polilineas, _color, relleno, ancho in primitivas.trazos:
+        grosor = max(1, int(round(ancho * escala))) + 2 * margen
+        for poli in polilineas:
+            pts = np.round((np.array(poli) - (dx, dy)) * escala).astype(np.int32)
+            if relleno and len(pts) > 2:
+                cv2.fillPoly(mask, [pts], 255)
+            cv2.polylines(mask, [pts], False, 255, thickness=grosor)
+    
+    for _texto, x0, y0, x1, y1 in primitivas.palabras:
+        p0 = (int((x0 - dx) * escala) - margen, int((y0 - dy) * escala) - margen)
+        p1 = (int(np.ceil((x1 - dx) * escala)) + margen, int(np.ceil((y1 - dy) * escala)) + margen)
+        cv2.rectangle(mask, p0, p1, 255, -1)
+    
+    return mask
+
+
+def procesar_hoja_vectorial(
+    img_base_in: np.ndarray, 
+    img_move_in: np.ndarray, 
+    prim_base: PrimitivasPagina, 
+    prim_nueva: PrimitivasPagina, 
+    dpi: int, 
+    index: int
+) -> ResultadoHoja | None:
+    """
+    Compare a born-digital page pair through its vector primitives.
+    
+    Primitives present in only one page define where changes are; the rendered
+    ink inside those areas (minus ink shared by both pages) is highlighted.
+    Alignment is a translation estimated from the text, so no ORB is needed.
+    
+    Args:
+        img_base_in: Rendered base/original page
+        img_move_in: Rendered new page
+        prim_base: Primitives of the base page
+        prim_nueva: Primitives of the new page
+        dpi: Resolution the pages were rendered at
+        index: Page number (for logging)
+    
+    Returns:
+        Compact comparison result, or None on error
+    """
+    try:
+        gray_base = a_escala_grises(np.asarray(img_base_in))
+        gray_move = a_escala_grises(np.asarray(img_move_in))
+        escala = dpi / 72.0
+        
+        eliminadas, agregadas, (dx, dy) = diferenciar_primitivas(prim_base, prim_nueva)
+        
+        # Bring the new page onto the base page with the estimated translation
+        height, width = gray_base.shape[:2]
+        traslacion = np.float32([[1, 0, -dx * escala], [0, 1, -dy * escala]])
+        gray_new = cv2.warpAffine(gray_move, traslacion, (width, height), borderValue=255)
+        
+        # Ink of each page, and tolerance bands around it
+        umbral_bin = get_umbral_bin()
+        _, bin_base = cv2.threshold(cv2.bitwise_not(gray_base), umbral_bin, 255, cv2.THRESH_BINARY)
+        _, bin_new = cv2.threshold(cv2.bitwise_not(gray_new), umbral_bin, 255, cv2.THRESH_BINARY)
+        kernel = np.ones((get_kernel_size(), get_kernel_size()), np.uint8)
+        iteraciones = get_iteraciones()
+        base_dilatada = cv2.dilate(bin_base, kernel, iterations=iteraciones)
+        new_dilatada = cv2.dilate(bin_new, kernel, iterations=iteraciones)
+        
+        # Changed areas from the primitive diff, restricted to ink that is really new/removed
+        margen = get_kernel_size() * iteraciones
+        zona_eliminada = mascara_primitivas((height, width), eliminadas, escala, margen=margen)
+        zona_agregada = mascara_primitivas((height, width), agregadas, escala, (dx, dy), margen=margen)
+        
+        mask_green = cv2.bitwise_and(cv2.subtract(bin_new, base_dilatada), zona_agregada)
+        mask_magenta = cv2.bitwise_and(cv2.subtract(bin_base, new_dilatada), zona_eliminada)
+        
+        return ResultadoHoja.desde_mascaras(index, gray_base, mask_green, mask_magenta, "vectorial")
+    
+    except Exception as e:
+        logger.error(f"Error processing page {index}: {e}")
+        return None
+
+
+# ==========================================
+# CONTENT FINGERPRINTS
+# ==========================================
+
+# Indirect reference inside a PDF object definition ("12 0 R")
+_REFERENCIA_PDF = re.compile(r"(\d+) \d+ R")
+
+# Back-references that would pull the whole page tree into a page fingerprint
+_CLAVES_IGNORADAS_PDF = re.compile(r"/(?:Parent|P)\s+\d+ \d+ R")
+
+
+def huella_archivo(ruta: str | Path, bloque: int = 1 << 20) -> str:
+    """
+    Hash the bytes of a file.
+    
+    Args:
+        ruta: Path to the file
+        bloque: Read size in bytes
+    
+    Returns:
+        Hex SHA-256 digest of the file contents
+    """
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        while chunk := f.read(bloque):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _hash_definicion_pdf(
+    doc: fitz.Document, 
+    definicion: str, 
+    memo: dict[int, str], 
+    visitando: set[int]
+) -> str:
+    """
+    Hash a PDF object definition, replacing references by the hash of their target.
+    
+    Object numbers differ between two files with the same content, so every
+    indirect reference is resolved recursively instead of hashed literally.
+    """
+    h = hashlib.sha256()
+    partes = _REFERENCIA_PDF.split(_CLAVES_IGNORADAS_PDF.sub("", definicion))
+    for i, parte in enumerate(partes):
+        if i % 2:
+            h.update(_hash_objeto_pdf(doc, int(parte), memo, visitando).encode())
+        else:
+            h.update(parte.encode())
+    return h.hexdigest()
+
+
+def _hash_objeto_pdf(
+    doc: fitz.Document, 
+    xref: int, 
+    memo: dict[int, str], 
+    visitando: set[int]
+) -> str:
+    """Hash an indirect PDF object, including its decoded stream if it has one."""
+    if xref in memo:
+        return memo[xref]
+    if xref in visitando:
+        return "ciclo"
+    
+    visitando.add(xref)
+    huella = _hash_definicion_pdf(doc, doc.xref_object(xref, compressed=True), memo, visitando)
+    if doc.xref_is_stream(xref):
+        huella = hashlib.sha256(huella.encode() + (doc.xref_stream(xref) or b"")).hexdigest()
+    visitando.discard(xref)
+    
+    memo[xref] = huella
+    return huella
+
+
+def _clave_heredada_pdf(doc: fitz.Document, xref: int, clave: str) -> tuple[str, str]:
+    """Look up a page key, following the page tree for inherited attributes."""
+    while True:
+        tipo, valor = doc.xref_get_key(xref, clave)
+        if tipo != "null":
+            return tipo, valor
+        tipo, padre = doc.xref_get_key(xref, "Parent")
+        if tipo != "xref":
+            return "null", "null"
+        xref = int(padre.split()[0])
+
+
+def huella_pagina(doc: fitz.Document, indice: int, memo: dict[int, str] | None = None) -> str:
+    """
+    Fingerprint the content of a page independently of the file layout.
+    
+    Covers the decoded content streams, the (possibly inherited) resources
+    they reference, annotations, and the page boxes and rotation. Two pages
+    with the same fingerprint render identically.
+    
+    Args:
+        doc: Open PyMuPDF document
+        indice: Page index (0-indexed)
+        memo: Object hash cache shared between pages of the same document
+    
+    Returns:
+        Hex SHA-256 digest of the page content
+    """
+    if memo is None:
+        memo = {}
+    
+    page = doc[indice]
+    h = hashlib.sha256()
+    
+    # Page geometry
+    h.update(f"{tuple(page.mediabox)}|{tuple(page.cropbox)}|{page.rotation}".encode())
+    
+    # Content streams
+    for xref in page.get_contents():
+        h.update(doc.xref_stream(xref) or b"")
+    
+    # Resources and annotations, resolved by content rather than object number
+    recursos = _clave_heredada_pdf(doc, page.xref, "Resources")
+    anotaciones = doc.xref_get_key(page.xref, "Annots")
+    for clave, (tipo, valor) in (("Resources", recursos), ("Annots", anotaciones)):
+        if tipo == "xref":
+            valor = _hash_objeto_pdf(doc, int(valor.split()[0]), memo, set())
+        elif tipo != "null":
+            valor = _hash_definicion_pdf(doc, valor, memo, set())
+        h.update(f"{clave}:{valor}".encode())
+    
+    return h.hexdigest()
+
+
+def detectar_paginas_identicas(doc_a: DocumentoPDF, doc_b: DocumentoPDF) -> set[int]:
+    """
+    Find the pages whose content is identical in both documents.
+    
+    Byte-identical files short-circuit to "every page"; otherwise pages are
+    compared one by one through their content fingerprints.
+    
+    Args:
+        doc_a: Original document session
+        doc_b: New document session
+    
+    Returns:
+        Set of identical page indices (0-indexed)
+    """
+    n_comunes = min(doc_a.num_paginas, doc_b.num_paginas)
+    
+    try:
+        if doc_a.num_paginas == doc_b.num_paginas and doc_a.huella == doc_b.huella:
+            return set(range(n_comunes))
+        
+        return {
+            i for i in range(n_comunes) 
+            if doc_a.huella_pagina(i) == doc_b.huella_pagina(i)
+        }
+    except Exception as e:
+        logger.warning(f"Error fingerprinting pages: {e}")
+        return set()
+
+
+# ==========================================
+# RENDERED PAGE CACHE
+# ==========================================
+
+class CachePaginas:
+    """
+    Persistent on-disk cache of rendered pages with LRU eviction.
+    
+    Pages are stored as lossless PNG files named after a key built from the
+    file content hash, page index, DPI and colorspace, so a page is reused
+    across runs and across pairs sharing a file. The file modification time
+    records the last use; when the cache grows past its size cap the least
+    recently used pages are deleted. aciertos and fallos count the lookups
+    made through this instance; a comparison logs how they grew during it.
+    """
+    
+    EXTENSION = ".png"
+    
+    def __init__(self, directorio: str | Path, max_bytes: int) -> None:
+        self.directorio = Path(directorio)
+        self.max_bytes = max_bytes
+        self.aciertos = 0
+        self.fallos = 0
+        self._tamano: int | None = None
+    
+    @staticmethod
+    def clave(huella: str, indice: int, dpi: int, gris: bool) -> str:
+        """Build the cache key of a rendered page."""
+        espacio = "gray" if gris else "rgb"
+        return hashlib.sha256(f"{huella}:{indice}:{dpi}:{espacio}".encode()).hexdigest()
+    
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / f"{clave}{self.EXTENSION}"
+    
+    def obtener(self, clave: str) -> np.ndarray | None:
+        """
+        Look up a rendered page.
+        
+        Args:
+            clave: Cache key (see clave)
+        
+        Returns:
+            The cached page array, or None on a miss
+        """
+        ruta = self._ruta(clave)
+        try:
+            datos = np.fromfile(ruta, dtype=np.uint8)
+            pagina = cv2.imdecode(datos, cv2.IMREAD_UNCHANGED)
+            os.utime(ruta)  # Mark as recently used
+        except OSError:
+            pagina = None
+        
+        if pagina is None:
+            self.fallos += 1
+            return None
+        
+        self.aciertos += 1
+        return pagina
+    
+    def guardar(self, clave: str, pagina: np.ndarray) -> None:
+        """
+        Store a rendered page, evicting old pages if the size cap is exceeded.
+        
+        Args:
+            clave: Cache key (see clave)
+            pagina: Rendered page array
+        """
+        # Channel order is stored as-is: imdecode returns exactly what was encoded
+        ok, datos = cv2.imencode(self.EXTENSION, pagina, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        if not ok:
+            return
+        
+        try:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            ruta = self._ruta(clave)
+            temporal = ruta.with_suffix(f".{os.getpid()}.tmp")
+            datos.tofile(temporal)
+            os.replace(temporal, ruta)
+        except OSError as e:
+            logger.warning(f"Error writing page cache: {e}")
+            return
+        
+        self._tamano = (self._tamano if self._tamano is not None else self._calcular_tamano()) + datos.size
+        if self._tamano > self.max_bytes:
+            self._evictar()
+    
+    def _entradas(self) -> list[os.DirEntry]:
+        try:
+            with os.scandir(self.directorio) as it:
+                return [e for e in it if e.name.endswith(self.EXTENSION) and e.is_file()]
+        except OSError:
+            return []
+    
+    def _calcular_tamano(self) -> int:
+        return sum(e.stat().st_size for e in self._entradas())
+    
+    def _evictar(self) -> None:
+        """Delete least recently used pages until the cache is below 90% of its cap."""
+        entradas = sorted(self._entradas(), key=lambda e: e.stat().st_mtime)
+        total = sum(e.stat().st_size for e in entradas)
+        limite = int(self.max_bytes * 0.9)
+        
+        for entrada in entradas:
+            if total <= limite:
+                break
+            try:
+                os.remove(entrada.path)
+                total -= entrada.stat().st_size
+            except OSError:
+                pass  # Already evicted by another process
+        
+        self._tamano = total
+
+
+_cache_paginas: CachePaginas | None = None
+
+
+def obtener_cache_paginas() -> CachePaginas | None:
+    """
+    Get the process-wide page cache, or None if caching is disabled.
+    
+    Returns:
+        Shared CachePaginas instance sized from the current configuration
+    """
+    global _cache_paginas
+    
+    if not get_usar_cache():
+        return None
+    
+    max_bytes = get_cache_max_mb() * 1024 * 1024
+    if _cache_paginas is None:
+        _cache_paginas = CachePaginas(get_cache_path() / "paginas", max_bytes)
+    _cache_paginas.max_bytes = max_bytes
+    return _cache_paginas
+
+
+# ==========================================
+# PDF PROCESSING
+# ==========================================
+
+def obtener_numero_paginas(pdf_path: str | Path) -> int:
+    """
+    Get the number of pages in a PDF document.
+    
+    Args:
+        pdf_path: Path to the PDF file
+    
+    Returns:
+        Number of pages, or 1 on error
+    """
+    if not PYMUPDF_AVAILABLE:
+        try:
+            import PyPDF2
+            with open(pdf_path, 'rb') as f:
+                return len(PyPDF2.PdfReader(f).pages)
+        except Exception:
+            return 1
+    
+    try:
+        with open_pdf(pdf_path) as doc:
             return len(doc)
     except Exception:
-        try:
-            import PyPDF2
-            with open(pdf_path, 'rb') as f:
-                return len(PyPDF2.PdfReader(f).pages)
-        except Exception:
-            return 1
+        try:
+            import PyPDF2
+            with open(pdf_path, 'rb') as f:
+                return len(PyPDF2.PdfReader(f).pages)
+        except Exception:
+            return 1
+
+
+def pixmap_a_array(pix: fitz.Pixmap) -> np.ndarray:
+    """
+    Copy a pixmap into a NumPy array with a single copy of its samples.
+
+    The pixmap buffer is read through ``samples_mv`` (no intermediate bytes
+    object) and copied once, so the array stays valid after the pixmap is freed.
+
+    Args:
+        pix: Rendered pixmap
+
+    Returns:
+        uint8 array of shape (height, width, n), or (height, width) for one channel
+    """
+    buffer = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)
+    pixeles = buffer[:, :pix.width * pix.n].reshape(pix.height, pix.width, pix.n)
+    if pix.n == 1:
+        pixeles = pixeles[:, :, 0]
+    return pixeles.copy()
+
+
+class DocumentoPDF:
+    """
+    PDF document session that keeps the file open while its pages are rendered.
+
+    Opening a document parses its xref table and page tree once; every page
+    rendered through the session reuses that work instead of reopening the file.
+    """
+
+    def __init__(self, pdf_path: str | Path) -> None:
+        if not PYMUPDF_AVAILABLE:
+            raise ImportError("PyMuPDF not installed. Install with: pip install PyMuPDF")
+
+        self.ruta = Path(pdf_path)
+        self._doc: fitz.Document | None = fitz.open(str(pdf_path))
+        self._huella: str | None = None
+        self._memo_objetos: dict[int, str] = {}
+        self._lista_visual: tuple[int, fitz.DisplayList] | None = None
+
+    def __enter__(self) -> DocumentoPDF:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.cerrar()
+
+    @property
+    def num_paginas(self) -> int:
+        """Number of pages in the document."""
+        return len(self._doc) if self._doc is not None else 0
+
+    @property
+    def huella(self) -> str:
+        """SHA-256 of the file bytes, computed on first use."""
+        if self._huella is None:
+            self._huella = huella_archivo(self.ruta)
+        return self._huella
+
+    def huella_pagina(self, indice: int) -> str:
+        """Content fingerprint of a page (see huella_pagina)."""
+        return huella_pagina(self._doc, indice, self._memo_objetos)
+
+    def primitivas_pagina(self, indice: int) -> PrimitivasPagina | None:
+        """Vector primitives of a page, or None if it must be compared as a raster."""
+        try:
+            return extraer_primitivas(self._doc[indice])
+        except Exception as e:
+            logger.warning(f"Error extracting vector content from page {indice + 1}: {e}")
+            return None
+
+    def geometria_pagina(self, indice: int) -> tuple:
+        """Media box, crop box and rotation of a page."""
+        page = self._doc[indice]
+        return tuple(page.mediabox), tuple(page.cropbox), page.rotation
+
+    def _lista_pagina(self, indice: int) -> fitz.DisplayList:
+        """Display list of a page, kept for the last page so region renders skip re-parsing it."""
+        if self._lista_visual is None or self._lista_visual[0] != indice:
+            self._lista_visual = (indice, self._doc[indice].get_displaylist())
+        return self._lista_visual[1]
+
+    def cerrar(self) -> None:
+        """Close the underlying document."""
+        self._lista_visual = None
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+    def renderizar_pagina(
+        self,
+        indice: int,
+        dpi: int | None = None,
+        gris: bool | None = None
+    ) -> np.ndarray:
+        """
+        Render a single page straight into a NumPy array.
+
+        Full pages are looked up in (and stored into) the on-disk page cache
+        when it is enabled.
+
+        Args:
+            indice: Page index (0-indexed)
+            dpi: Resolution in DPI (default from configuration)
+            gris: Render with a gray colorspace (default from configuration)
+
+        Returns:
+            Rendered page as a (h, w) gray or (h, w, 3) RGB uint8 array
+        """
+        if dpi is None:
+            dpi = get_dpi()
+        if gris is None:
+            gris = get_renderizado_gris()
+
+        cache = obtener_cache_paginas()
+        if cache is not None:
+            clave = cache.clave(self.huella, indice, dpi, gris)
+            pagina = cache.obtener(clave)
+            if pagina is not None:
+                return pagina
+
+        zoom = dpi / 72.0
+        colorspace = fitz.csGRAY if gris else fitz.csRGB
+        pix = self._doc[indice].get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=colorspace)
+        pagina = pixmap_a_array(pix)
+
+        if cache is not None:
+            cache.guardar(clave, pagina)
+        return pagina
+
+    def tamano_pagina(self, indice: int, dpi: int) -> tuple[int, int]:
+        """
+        Pixel size of a page rendered at a given DPI, without rendering it.
+
+        Returns:
+            (width, height) in pixels
+        """
+        zoom = dpi / 72.0
+        irect = (self._doc[indice].rect * fitz.Matrix(zoom, zoom)).irect
+        return irect.width, irect.height
+
+    def renderizar_region(
+        self,
+        indice: int,
+        dpi: int,
+        region: tuple[int, int, int, int],
+        gris: bool | None = None
+    ) -> np.ndarray:
+        """
+        Render only a rectangular region of a page.
+
+        The page is interpreted once into a display list that is reused by
+        consecutive region renders of the same page.
+
+        Args:
+            indice: Page index (0-indexed)
+            dpi: Resolution in DPI
+            region: (x0, y0, x1, y1) in pixels of the full page render
+            gris: Render with a gray colorspace (default from configuration)
+
+        Returns:
+            uint8 array of exactly (y1 - y0, x1 - x0) pixels; areas outside the page are white
+        """
+        if gris is None:
+            gris = get_renderizado_gris()
+
+        x0, y0, x1, y1 = region
+        zoom = dpi / 72.0
+        clip = fitz.Rect(x0 / zoom, y0 / zoom, x1 / zoom, y1 / zoom)
+        colorspace = fitz.csGRAY if gris else fitz.csRGB
+        pix = self._lista_pagina(indice).get_pixmap(
+            matrix=fitz.Matrix(zoom, zoom), clip=clip, colorspace=colorspace, alpha=False
+        )
+
+        # The pixmap is snapped to whole device pixels; paste it into the exact region
+        salida = np.full((y1 - y0, x1 - x0) if gris else (y1 - y0, x1 - x0, 3), 255, dtype=np.uint8)
+        pixeles = pixmap_a_array(pix)
+        dx, dy = pix.x - x0, pix.y - y0
+        sx0, sy0 = max(0, -dx), max(0, -dy)
+        tx0, ty0 = max(0, dx), max(0, dy)
+        ancho = min(pixeles.shape[1] - sx0, salida.shape[1] - tx0)
+        alto = min(pixeles.shape[0] - sy0, salida.shape[0] - ty0)
+        if ancho > 0 and alto > 0:
+            salida[ty0:ty0 + alto, tx0:tx0 + ancho] = pixeles[sy0:sy0 + alto, sx0:sx0 + ancho]
+        return salida
+
+    def renderizar_paginas(
+        self,
+        dpi: int | None = None,
+        first_page: int | None = None,
+        last_page: int | None = None,
+        gris: bool | None = None,
+        omitir: Container[int] = ()
+    ) -> Generator[np.ndarray | None, None, None]:
+        """
+        Lazily render a range of pages, one page at a time.
+
+        Args:
+            dpi: Resolution in DPI (default from configuration)
+            first_page: First page to render (1-indexed, None = first)
+            last_page: Last page to render (1-indexed, None = last)
+            gris: Render with a gray colorspace (default from configuration)
+            omitir: Page indices (0-indexed) that are not rendered
+
+        Yields:
+            Rendered pages as uint8 arrays, or None for omitted pages
+        """
+        start_idx = (first_page - 1) if first_page else 0
+        end_idx = (last_page - 1) if last_page else (self.num_paginas - 1)
+
+        for page_num in range(start_idx, min(end_idx + 1, self.num_paginas)):
+            yield None if page_num in omitir else self.renderizar_pagina(page_num, dpi, gris)
+
+
+def abrir_documento(pdf_path: str | Path) -> DocumentoPDF | None:
+    """
+    Open a document session, logging instead of raising on failure.
+
+    Args:
+        pdf_path: Path to the PDF file
+
+    Returns:
+        Open document session, or None if the file could not be opened
+    """
+    try:
+        return DocumentoPDF(pdf_path)
+    except Exception as e:
+        logger.warning(f"Error opening {pdf_path}: {e}")
+        return None
+
+
+def misma_geometria(doc_a: DocumentoPDF | None, doc_b: DocumentoPDF | None, indice: int) -> bool:
+    """Whether a page has the same page boxes and rotation in both documents."""
+    if doc_a is None or doc_b is None or indice >= min(doc_a.num_paginas, doc_b.num_paginas):
+        return False
+    try:
+        return doc_a.geometria_pagina(indice) == doc_b.geometria_pagina(indice)
+    except Exception:
+        return False
 
 
 def pdf_a_imagenes(
     pdf_path: str | Path, 
     dpi: int | None = None, 
     first_page: int | None = None, 
-    last_page: int | None = None
+    last_page: int | None = None,
+    gris: bool | None = None
 ) -> list[Image.Image]:
     """
     Convert PDF pages to PIL Images using PyMuPDF.
@@ -521,6 +3024,7 @@ def pdf_a_imagenes(
         dpi: Resolution in DPI (default 300)
         first_page: First page to convert (1-indexed, None = first)
         last_page: Last page to convert (1-indexed, None = last)
+        gris: Render "L" images with a gray colorspace (default from configuration)
     
     Returns:
         List of PIL Image objects
@@ -532,29 +3036,873 @@ def pdf_a_imagenes(
     if not PYMUPDF_AVAILABLE:
         raise ImportError("PyMuPDF not installed. Install with: pip install PyMuPDF")
     
-    if dpi is None:
-        dpi = get_dpi()
+    try:
+        with DocumentoPDF(pdf_path) as doc:
+            return [
+                Image.fromarray(pagina) 
+                for pagina in doc.renderizar_paginas(dpi, first_page, last_page, gris)
+            ]
+    except Exception as e:
+        raise Exception(f"Error converting PDF to images: {e}") from e
+
+
+# ==========================================
+# TILED PROCESSING
+# ==========================================
+
+def halo_teselas() -> int:
+    """
+    Overlap (pixels) added around each tile so that its raw difference masks match a full-page run.
+    
+    Covers the blur radius and the dilation reach. Noise removal is not
+    local (a blob's area and fill depend on all of it), so it runs on the
+    stitched masks instead.
+    """
+    radio_blur = 2 if get_usar_blur() else 0
+    return radio_blur + get_kernel_size() * get_iteraciones()
+
+
+def limpiar_mascara_empaquetada(empaquetada: np.ndarray, ancho: int) -> np.ndarray | None:
+    """
+    Noise removal (limpiar_ruido_mascara) of a mask bit-packed along rows.
+    
+    Returns:
+        The cleaned mask, packed the same way, or None if nothing is left
+    """
+    if not empaquetada.any():
+        return None
+    mascara = np.unpackbits(empaquetada, axis=1, count=ancho)
+    mascara *= 255
+    mascara = limpiar_ruido_mascara(mascara)
+    return np.packbits(mascara, axis=1) if mascara.any() else None
+
+
+def requiere_teselas(
+    doc_a: DocumentoPDF | None, 
+    doc_b: DocumentoPDF | None, 
+    indice: int, 
+    dpi: int, 
+    tamano_tesela: int
+) -> bool:
+    """Whether either page of a pair is larger than one tile at the given DPI."""
+    if tamano_tesela <= 0:
+        return False
+    for doc in (doc_a, doc_b):
+        if doc and indice < doc.num_paginas and max(doc.tamano_pagina(indice, dpi)) > tamano_tesela:
+            return True
+    return False
+
+
+def alineacion_pagina_reducida(
+    doc_a: DocumentoPDF, 
+    doc_b: DocumentoPDF, 
+    indice: int, 
+    dpi: int, 
+    tamano_max: int
+) -> Alineacion:
+    """
+    Estimate a page-level alignment at full resolution from reduced renders.
+    
+    Both pages are rendered so that their largest side fits in tamano_max pixels;
+    the homography found there is rescaled to full-resolution pixel coordinates
+    (see escalar_homografia).
+    
+    Returns:
+        Alignment whose homography maps new-page to base-page pixels at the given
+        DPI (the stretch fallback when no transform was found)
+    """
+    wa, ha = doc_a.tamano_pagina(indice, dpi)
+    wb, hb = doc_b.tamano_pagina(indice, dpi)
+    
+    factor = min(1.0, tamano_max / max(wa, ha, wb, hb))
+    dpi_reducido = max(1, int(dpi * factor))
+    small_a = doc_a.renderizar_region(indice, dpi_reducido, (0, 0, *doc_a.tamano_pagina(indice, dpi_reducido)), True)
+    small_b = doc_b.renderizar_region(indice, dpi_reducido, (0, 0, *doc_b.tamano_pagina(indice, dpi_reducido)), True)
+    
+    alineacion = alinear_paginas(small_a, small_b, misma_geometria(doc_a, doc_b, indice))
+    alineacion.homografia = escalar_homografia(
+        alineacion.homografia, small_a.shape, small_b.shape, (wa, ha), (wb, hb)
+    )
+    return alineacion
+
+
+def escalar_homografia(
+    h_small: np.ndarray | None, 
+    forma_a: tuple[int, ...], 
+    forma_b: tuple[int, ...], 
+    tamano_a: tuple[int, int], 
+    tamano_b: tuple[int, int]
+) -> np.ndarray:
+    """
+    Rescale a homography found between reduced renders to full-resolution pixels.
+    
+    Args:
+        h_small: Homography between the reduced renders (None = not found)
+        forma_a: Shape of the reduced base render
+        forma_b: Shape of the reduced new render
+        tamano_a: (width, height) of the full-resolution base page
+        tamano_b: (width, height) of the full-resolution new page
+    
+    Returns:
+        3x3 homography from new-page to base-page pixels; without h_small, the new
+        page is stretched onto the base page (the same fallback as alinear_imagen)
+    """
+    (wa, ha), (wb, hb) = tamano_a, tamano_b
+    if h_small is None:
+        return np.diag([wa / wb, ha / hb, 1.0])
+    
+    escala_a = np.diag([wa / forma_a[1], ha / forma_a[0], 1.0])
+    escala_b = np.diag([forma_b[1] / wb, forma_b[0] / hb, 1.0])
+    return escala_a @ h_small @ escala_b
+
+
+def _region_alineada(
+    doc: DocumentoPDF, 
+    indice: int, 
+    dpi: int, 
+    region: tuple[int, int, int, int], 
+    h_matrix: np.ndarray
+) -> np.ndarray:
+    """
+    Render the part of a page that a homography maps onto a base-page region.
+    
+    Only the source rectangle that covers the region (plus an interpolation
+    margin) is rendered, then warped into the region.
+    """
+    x0, y0, x1, y1 = region
+    ancho_pag, alto_pag = doc.tamano_pagina(indice, dpi)
+    
+    esquinas = np.float32([[x0, y0], [x1, y0], [x1, y1], [x0, y1]]).reshape(-1, 1, 2)
+    origen = cv2.perspectiveTransform(esquinas, np.linalg.inv(h_matrix)).reshape(-1, 2)
+    mx0 = int(np.clip(np.floor(origen[:, 0].min()) - 2, 0, ancho_pag))
+    my0 = int(np.clip(np.floor(origen[:, 1].min()) - 2, 0, alto_pag))
+    mx1 = int(np.clip(np.ceil(origen[:, 0].max()) + 2, 0, ancho_pag))
+    my1 = int(np.clip(np.ceil(origen[:, 1].max()) + 2, 0, alto_pag))
+    
+    if mx1 <= mx0 or my1 <= my0:
+        # Region falls outside the new page: same as the warp border of alinear_imagen
+        return np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+    
+    fuente = doc.renderizar_region(indice, dpi, (mx0, my0, mx1, my1), True)
+    h_region = (
+        np.array([[1, 0, -x0], [0, 1, -y0], [0, 0, 1]], dtype=np.float64) 
+        @ h_matrix 
+        @ np.array([[1, 0, mx0], [0, 1, my0], [0, 0, 1]], dtype=np.float64)
+    )
+    return cv2.warpPerspective(fuente, h_region, (x1 - x0, y1 - y0))
+
+
+def procesar_hoja_teselada(
+    doc_a: DocumentoPDF | None, 
+    doc_b: DocumentoPDF | None, 
+    indice: int, 
+    dpi: int, 
+    tamano_tesela: int, 
+    sin_cambios: bool = False
+) -> ResultadoHoja | None:
+    """
+    Compare an oversized page pair tile by tile.
+    
+    A single page-level homography is estimated on reduced renders. Each tile is
+    then rendered from both documents with a clip rectangle, enlarged by a halo
+    (see halo_teselas), run through the usual threshold/dilate/diff stages,
+    and the core of its raw masks is stitched into bit-packed whole-sheet
+    masks. Noise removal then runs once per stitched mask, so blobs crossing
+    tile borders are filtered and filled as on a full-page run. Render and
+    diff buffers are bounded by the tile size; the grayscale base and the
+    packed masks span the whole sheet, and each mask is unpacked (one byte per
+    pixel) only while it is cleaned.
+    
+    Args:
+        doc_a: Original document session (None if unavailable)
+        doc_b: New document session (None if unavailable)
+        indice: Page index (0-indexed)
+        dpi: Resolution in DPI
+        tamano_tesela: Tile side in pixels
+        sin_cambios: The pages are known to be identical; only the faded base is drawn
     
+    Returns:
+        Compact comparison result, or None on error
+    """
     try:
-        with open_pdf(pdf_path) as doc:
-            # Adjust indices (PyMuPDF is 0-indexed, function is 1-indexed)
-            start_idx = (first_page - 1) if first_page else 0
-            end_idx = (last_page - 1) if last_page else (len(doc) - 1)
-            
-            # Calculate zoom matrix for DPI
-            zoom = dpi / 72.0
-            mat = fitz.Matrix(zoom, zoom)
-            
-            imagenes: list[Image.Image] = []
-            for page_num in range(start_idx, min(end_idx + 1, len(doc))):
-                page = doc[page_num]
-                pix = page.get_pixmap(matrix=mat)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                imagenes.append(img)
+        existe_a = doc_a is not None and indice < doc_a.num_paginas
+        existe_b = doc_b is not None and indice < doc_b.num_paginas
+        if not existe_a and not existe_b:
+            return None
+        
+        # The output follows the base page, or the new page when the base is missing
+        ancho, alto = (doc_a if existe_a else doc_b).tamano_pagina(indice, dpi)
+        if existe_a and existe_b and not sin_cambios:
+            alineacion = alineacion_pagina_reducida(doc_a, doc_b, indice, dpi, tamano_tesela)
+        else:
+            alineacion = Alineacion(np.eye(3), "identidad")
+        h_matrix = alineacion.homografia
+        
+        # Tiles start on whole bytes of the packed masks
+        tamano_tesela = max(8, tamano_tesela - tamano_tesela % 8)
+        fondo = np.empty((alto, ancho), dtype=np.uint8)
+        verde = np.zeros((alto, (ancho + 7) // 8), dtype=np.uint8)
+        magenta = np.zeros_like(verde)
+        halo = halo_teselas()
+        area_omitida = 0.0
+        
+        for ty0 in range(0, alto, tamano_tesela):
+            for tx0 in range(0, ancho, tamano_tesela):
+                tx1, ty1 = min(tx0 + tamano_tesela, ancho), min(ty0 + tamano_tesela, alto)
+                ex0, ey0 = max(0, tx0 - halo), max(0, ty0 - halo)
+                ex1, ey1 = min(ancho, tx1 + halo), min(alto, ty1 + halo)
+                region = (ex0, ey0, ex1, ey1)
+                
+                if existe_a:
+                    gray_base = doc_a.renderizar_region(indice, dpi, region, True)
+                else:
+                    gray_base = np.full((ey1 - ey0, ex1 - ex0), 255, dtype=np.uint8)
+                
+                if sin_cambios:
+                    mask_green = mask_magenta = None
+                else:
+                    if existe_b:
+                        gray_new = _region_alineada(doc_b, indice, dpi, region, h_matrix)
+                    else:
+                        gray_new = np.full_like(gray_base, 255)
+                    nucleo_diferencias = obtener_nucleo_diferencias()
+                    mask_green, mask_magenta = nucleo_diferencias.diferencias_en_bruto(gray_base, gray_new)
+                    area_omitida += nucleo_diferencias.area_omitida * (tx1 - tx0) * (ty1 - ty0)
+                    del gray_new
+                
+                # Keep only the tile core; the halo was context for the filters
+                nucleo = (slice(ty0 - ey0, ty1 - ey0), slice(tx0 - ex0, tx1 - ex0))
+                fondo[ty0:ty1, tx0:tx1] = gray_base[nucleo]
+                bytes_tesela = slice(tx0 // 8, (tx1 + 7) // 8)
+                if mask_green is not None:
+                    verde[ty0:ty1, bytes_tesela] = np.packbits(mask_green[nucleo] > 0, axis=1)
+                if mask_magenta is not None:
+                    magenta[ty0:ty1, bytes_tesela] = np.packbits(mask_magenta[nucleo] > 0, axis=1)
+        
+        return ResultadoHoja(
+            indice + 1, fondo, 
+            limpiar_mascara_empaquetada(verde, ancho), 
+            limpiar_mascara_empaquetada(magenta, ancho),
+            alineacion.metodo,
+            area_omitida=None if sin_cambios else area_omitida / (ancho * alto),
+        )
+    
+    except Exception as e:
+        logger.error(f"Error processing page {indice + 1}: {e}")
+        return None
+
+
+# ==========================================
+# COARSE-TO-FINE PROCESSING
+# ==========================================
+
+# Above this fraction of the page covered by candidate regions, the whole page is refined
+MAX_COBERTURA_CANDIDATAS = 0.5
+
+
+def regiones_candidatas(
+    mask_small: np.ndarray, 
+    factor: float, 
+    margen: int, 
+    tamano: tuple[int, int]
+) -> list[tuple[int, int, int, int]]:
+    """
+    Turn a low-resolution change mask into full-resolution regions to refine.
+    
+    Blobs are boxed, grown by the margin, merged where they touch, and scaled up.
+    
+    Args:
+        mask_small: Binary change mask at the coarse resolution
+        factor: Full-resolution pixels per coarse pixel
+        margen: Margin in full-resolution pixels added around every blob
+        tamano: (width, height) of the full-resolution page
+    
+    Returns:
+        List of (x0, y0, x1, y1) regions in full-resolution pixels
+    """
+    n, _, stats, _ = cv2.connectedComponentsWithStats(mask_small, connectivity=8)
+    if n <= 1:
+        return []
+    
+    m = int(np.ceil(margen / factor)) + 1
+    lienzo = np.zeros_like(mask_small)
+    for x, y, w, h, _area in stats[1:]:
+        cv2.rectangle(lienzo, (x - m, y - m), (x + w - 1 + m, y + h - 1 + m), 255, -1)
+    
+    ancho, alto = tamano
+    n, _, stats, _ = cv2.connectedComponentsWithStats(lienzo, connectivity=8)
+    return [
+        (
+            max(0, int(x * factor)), max(0, int(y * factor)),
+            min(ancho, int(np.ceil((x + w) * factor))), min(alto, int(np.ceil((y + h) * factor))),
+        )
+        for x, y, w, h, _area in stats[1:]
+    ]
+
+
+def mascara_previa(gray_base: np.ndarray, gray_new: np.ndarray, factor: float) -> np.ndarray:
+    """
+    Change mask of the detection pass, scaled so it finds what the final pass finds.
+    
+    The final-pass stages applied as-is to a coarse render would be about
+    factor times more tolerant than at full resolution. So here:
+    
+    - A coarse pixel is ink when any of the factor x factor pixels it averages
+      could be ink: the threshold darkness is divided by the pixel area.
+    - The dilation reach is divided by factor and reduced by one coarse pixel,
+      the spread of an anti-aliased edge.
+    - There is no blur, since the coarse render already averages.
+    - There is no area filter; blobs are only counted for noise at full resolution.
+    
+    Over-detection only costs a region refined for nothing.
+    
+    Args:
+        gray_base: Base page at the coarse resolution
+        gray_new: New page aligned to the base, at the coarse resolution
+        factor: Full-resolution pixels per coarse pixel
+    
+    Returns:
+        Binary mask (0/255) of the coarse pixels that may hold a change
+    """
+    umbral = 255 - (get_umbral_bin() + 1) / factor ** 2
+    _, bin_base = cv2.threshold(gray_base, umbral, 255, cv2.THRESH_BINARY_INV)
+    _, bin_new = cv2.threshold(gray_new, umbral, 255, cv2.THRESH_BINARY_INV)
+    
+    alcance = get_iteraciones() * ((get_kernel_size() - 1) // 2)
+    radio = max(0, int(alcance / factor) - 1)
+    if radio:
+        kernel = np.ones((2 * radio + 1, 2 * radio + 1), np.uint8)
+        base_dilatada, new_dilatada = cv2.dilate(bin_base, kernel), cv2.dilate(bin_new, kernel)
+    else:
+        base_dilatada, new_dilatada = bin_base, bin_new
+    return cv2.bitwise_or(cv2.subtract(bin_new, base_dilatada), cv2.subtract(bin_base, new_dilatada))
+
+
+def procesar_hoja_adaptativa(
+    doc_a: DocumentoPDF, 
+    doc_b: DocumentoPDF, 
+    indice: int, 
+    dpi: int, 
+    dpi_previo: int
+) -> ResultadoHoja | None:
+    """
+    Compare a page pair in two passes: coarse detection, then fine refinement.
+    
+    Both pages are rendered at dpi_previo, aligned, and diffed with stages
+    scaled to that resolution (see mascara_previa) to find candidate change
+    regions. Only those regions of the new page are rendered at full DPI,
+    with clip rectangles, and run through the normal diff stages against the
+    base page. Outside them the page has no changes.
+    
+    The base page is rendered whole at full DPI, since it is the background
+    of the output page; only a page without candidate regions that will not
+    be written (paginas_salida "cambiadas" or "marcador") keeps the detection
+    render scaled up as its background.
+    
+    Args:
+        doc_a: Original document session
+        doc_b: New document session
+        indice: Page index (0-indexed)
+        dpi: Final resolution in DPI
+        dpi_previo: Resolution of the detection pass
+    
+    Returns:
+        Compact comparison result, or None on error
+    """
+    try:
+        tamano_a = doc_a.tamano_pagina(indice, dpi)
+        tamano_b = doc_b.tamano_pagina(indice, dpi)
+        
+        # Pass 1: coarse alignment and candidate detection
+        small_a = doc_a.renderizar_pagina(indice, dpi_previo, gris=True)
+        small_b = doc_b.renderizar_pagina(indice, dpi_previo, gris=True)
+        alineacion = alinear_paginas(small_a, small_b, misma_geometria(doc_a, doc_b, indice))
+        h_small = alineacion.homografia
+        if h_small is None:
+            alto_s, ancho_s = small_a.shape[:2]
+            small_new = cv2.resize(small_b, (ancho_s, alto_s))
+        else:
+            small_new = cv2.warpPerspective(small_b, h_small, (small_a.shape[1], small_a.shape[0]))
+        
+        factor = tamano_a[0] / small_a.shape[1]
+        regiones = regiones_candidatas(
+            mascara_previa(small_a, small_new, factor), factor, halo_teselas() + int(np.ceil(factor)), tamano_a
+        )
+        del small_new
+        
+        # Pass 2: refine the candidate regions at full resolution. Only their clips of
+        # the new page are rendered; the base page is the background of the output
+        ancho, alto = tamano_a
+        area_candidata = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in regiones)
+        if area_candidata > MAX_COBERTURA_CANDIDATAS * ancho * alto:
+            regiones = [(0, 0, ancho, alto)]
+        
+        if regiones or get_paginas_salida() == "todas":
+            fondo = doc_a.renderizar_pagina(indice, dpi, gris=True)
+        else:
+            fondo = cv2.resize(small_a, (ancho, alto), interpolation=cv2.INTER_LINEAR)
+        verde = np.zeros((alto, (ancho + 7) // 8), dtype=np.uint8)
+        magenta = np.zeros_like(verde)
+        
+        h_matrix = escalar_homografia(h_small, small_a.shape, small_b.shape, tamano_a, tamano_b)
+        area_procesada = 0.0
+        for x0, y0, x1, y1 in regiones:
+            # Regions start and end on whole bytes of the packed masks
+            x0, x1 = x0 - x0 % 8, min(ancho, x1 + (-x1) % 8)
+            base_region = fondo[y0:y1, x0:x1]
+            new_region = _region_alineada(doc_b, indice, dpi, (x0, y0, x1, y1), h_matrix)
+            green_region, magenta_region = calcular_mascaras_diferencia(base_region, new_region)
+            area_procesada += (1 - obtener_nucleo_diferencias().area_omitida) * (x1 - x0) * (y1 - y0)
             
-            return imagenes
+            # Merged regions can share a byte column, so the bits are added rather than copied
+            bytes_region = slice(x0 // 8, (x1 + 7) // 8)
+            verde[y0:y1, bytes_region] |= np.packbits(green_region > 0, axis=1)
+            magenta[y0:y1, bytes_region] |= np.packbits(magenta_region > 0, axis=1)
+        
+        logger.debug(f"Page {indice + 1}: {len(regiones)} regions refined at {dpi} DPI")
+        return ResultadoHoja(
+            indice + 1, fondo, 
+            verde if verde.any() else None, 
+            magenta if magenta.any() else None, 
+            alineacion.metodo, 
+            area_omitida=max(0.0, 1 - area_procesada / (ancho * alto)),
+        )
+    
     except Exception as e:
-        raise Exception(f"Error converting PDF to images: {e}") from e
+        logger.error(f"Error processing page {indice + 1}: {e}")
+        return None
+
+
+# ==========================================
+# DOCUMENT PAIR PROCESSING
+# ==========================================
+
+def _siguiente_lote(
+    paginas: Iterator[np.ndarray],
+    cantidad: int,
+    etiqueta: str
+) -> list[np.ndarray | None]:
+    """Take the next batch of pages from a page generator, logging render errors."""
+    try:
+        return list(islice(paginas, cantidad))
+    except Exception as e:
+        logger.warning(f"Error loading {etiqueta} file: {e}")
+        return []
+
+
+def _primitivas_par(
+    doc_a: DocumentoPDF, 
+    doc_b: DocumentoPDF, 
+    indice: int
+) -> tuple[PrimitivasPagina, PrimitivasPagina] | None:
+    """Primitives of both pages if the pair can use the vector engine, else None."""
+    prim_a = doc_a.primitivas_pagina(indice)
+    prim_b = doc_b.primitivas_pagina(indice) if prim_a else None
+    
+    if not prim_a or not prim_b:
+        logger.info(f"Page {indice + 1}: no vector content, using raster engine")
+        return None
+    if abs(prim_a.ancho - prim_b.ancho) > 1 or abs(prim_a.alto - prim_b.alto) > 1:
+        logger.info(f"Page {indice + 1}: page sizes differ, using raster engine")
+        return None
+    return prim_a, prim_b
+
+
+def comparar_pagina(
+    doc_a: DocumentoPDF | None, 
+    doc_b: DocumentoPDF | None, 
+    indice: int, 
+    modo: str, 
+    identica: bool, 
+    dpi: int, 
+    pista: np.ndarray | None = None
+) -> ResultadoHoja | None:
+    """
+    Render and compare one page pair from open document sessions.
+    
+    Args:
+        doc_a: Original document session (None if unavailable)
+        doc_b: New document session (None if unavailable)
+        indice: Page index (0-indexed)
+        modo: "teselas", "adaptativa", "vectorial" or "raster"
+        identica: The pages are known to be identical
+        dpi: Resolution in DPI
+        pista: Homography that aligned a previous page of the same pair
+    
+    Returns:
+        Compact comparison result, or None on error
+    """
+    if modo == "teselas":
+        return procesar_hoja_teselada(doc_a, doc_b, indice, dpi, get_tamano_tesela(), identica)
+    
+    existe_a = doc_a is not None and indice < doc_a.num_paginas
+    existe_b = doc_b is not None and indice < doc_b.num_paginas
+    if modo == "adaptativa" and existe_a and existe_b and not identica:
+        return procesar_hoja_adaptativa(doc_a, doc_b, indice, dpi, get_dpi_previo())
+    
+    try:
+        pagina_a = doc_a.renderizar_pagina(indice, dpi) if existe_a else None
+        if identica:
+            return procesar_hoja_sin_cambios(pagina_a, indice + 1)
+        pagina_b = doc_b.renderizar_pagina(indice, dpi) if existe_b else None
+    except Exception as e:
+        logger.error(f"Error processing page {indice + 1}: {e}")
+        return None
+    
+    if modo == "vectorial" and existe_a and existe_b:
+        primitivas = _primitivas_par(doc_a, doc_b, indice)
+        if primitivas:
+            return procesar_hoja_vectorial(pagina_a, pagina_b, *primitivas, dpi, indice + 1)
+    return comparar_hoja(pagina_a, pagina_b, indice + 1, misma_geometria(doc_a, doc_b, indice), pista)
+
+
+def cronometrar(tarea: Callable[..., ResultadoHoja | None], *args) -> ResultadoHoja | None:
+    """Run a page task and record its wall time in the result (ResultadoHoja.segundos)."""
+    inicio = time.perf_counter()
+    resultado = tarea(*args)
+    if resultado is not None:
+        resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+
+def procesar_paginas_trabajador(
+    ruta_a: str, 
+    ruta_b: str, 
+    paginas: list[tuple[int, str, bool]], 
+    dpi: int, 
+    ajustes: dict | None = None, 
+    pista: np.ndarray | None = None
+) -> tuple[list[ResultadoHoja | None], tuple[int, int]]:
+    """
+    Worker task: open the documents, render and compare some page pairs and
+    close the documents again.
+    
+    Only paths, the page indices and the settings travel to the worker; the
+    results travel back in compact form (see ResultadoHoja). The documents
+    are open only while the task runs, so an idle worker holds no handle on
+    the user's files (on Windows an open file cannot be renamed or deleted).
+    The pages are compared in order, each one offered the transform that
+    aligned the page before it (when reuse is enabled).
+    
+    Args:
+        ruta_a: Path of the original PDF
+        ruta_b: Path of the new PDF
+        paginas: (page index, mode, identical) of each page, as in comparar_pagina
+        dpi: Resolution in DPI
+        ajustes: Configuration of the parent process (ConfiguracionApp.to_dict())
+        pista: Homography that aligned a page before these ones, for the first page
+    
+    Returns:
+        Compact result of each page (None on error), and the page cache hits
+        and misses of the task, which the parent cannot see
+    """
+    if CONFIG_AVAILABLE and ajustes and ajustes != get_config().to_dict():
+        set_config(ConfiguracionApp.from_dict(ajustes))
+    
+    cache = obtener_cache_paginas()
+    consultas_previas = (cache.aciertos, cache.fallos) if cache else (0, 0)
+    
+    reutilizar = get_reutilizar_alineacion()
+    resultados: list[ResultadoHoja | None] = []
+    doc_a, doc_b = abrir_documento(ruta_a), abrir_documento(ruta_b)
+    try:
+        for indice, modo, identica in paginas:
+            resultado = cronometrar(comparar_pagina, doc_a, doc_b, indice, modo, identica, dpi, pista)
+            if reutilizar and resultado is not None and resultado.alineacion in ALINEACIONES_REUTILIZABLES:
+                pista = resultado.homografia
+            resultados.append(resultado)
+    finally:
+        for doc in (doc_a, doc_b):
+            if doc:
+                doc.cerrar()
+    
+    if cache is None:
+        return resultados, (0, 0)
+    return resultados, (cache.aciertos - consultas_previas[0], cache.fallos - consultas_previas[1])
+
+
+# Changes closer than this (millimetres on the sheet) are reported as one zone in the index
+SEPARACION_ZONAS_MM = 10
+
+
+# JPEG quality of the comparison pages (the quality Pillow's PDF writer used)
+CALIDAD_JPEG_SALIDA = 75
+
+
+class EscritorPDF:
+    """
+    Comparison PDF written page by page, keeping memory flat.
+    
+    Each page is appended as soon as it is composed. volcar() appends the
+    pending pages to the file on disk with an incremental save and reopens it,
+    so their data leaves memory. Until cerrar() gives it its final name the
+    file is "<name>.parcial.pdf": a run that dies leaves a valid PDF with every
+    page flushed so far.
+    
+    Results (agregar_resultado) are stored in one of these encodings:
+    - "jpeg": the composed RGB page as a JPEG stream, embedded as is
+    - "paleta": the page as palette indices (paleta_comparacion), Flate
+      compressed; lossless
+    - "mascaras": the gray base page, faded by its /Decode array instead of
+      composing it, with each highlight painted through its bit-packed mask
+      (an explicit 1-bit /Mask of a one-pixel colour image); nothing is
+      composed and the masks are written as they are held. The fade may differ
+      from the composed page by one gray level
+    - "vectorial": the page of the original PDF itself (show_pdf_page), so its
+      vectors and text are kept and stay searchable, faded by a white overlay
+      at 70% opacity, with the highlights painted through their masks as in
+      "mascaras". Rotated pages (/Rotate) are turned as they were rendered.
+      Pages past the end of the original only get the highlights
+    
+    Page sizes in points equal the image sizes in pixels (72 pixels per inch).
+    """
+    
+    def __init__(
+        self, 
+        ruta: str | Path, 
+        codificacion: str = "jpeg", 
+        nivel_compresion: int = 1, 
+        original: str | Path | None = None, 
+        dpi: int | None = None
+    ) -> None:
+        """
+        Args:
+            ruta: Final path of the PDF
+            codificacion: Encoding of the result pages ("jpeg", "paleta", "mascaras" or "vectorial")
+            nivel_compresion: zlib level (1-9) of the Flate streams of the lossless encodings
+            original: Base PDF whose pages are copied by the "vectorial" encoding
+            dpi: Resolution the pages were compared at (for "vectorial", default from configuration)
+        """
+        if not PYMUPDF_AVAILABLE:
+            raise ImportError("PyMuPDF not installed. Install with: pip install PyMuPDF")
+        if codificacion == "vectorial" and original is None:
+            raise ValueError("The vectorial encoding needs the original PDF")
+        
+        self._original = fitz.open(str(original)) if codificacion == "vectorial" else None
+        self._zoom = (dpi or get_dpi()) / 72.0
+        self.codificacion = codificacion
+        self.nivel_compresion = nivel_compresion
+        self.ruta = Path(ruta)
+        self.ruta_parcial = self.ruta.with_name(f"{self.ruta.stem}.parcial.pdf")
+        self._doc: fitz.Document | None = fitz.open()
+        self._en_disco = False
+        self._pendientes = 0
+        self.num_paginas = 0
+    
+    def __enter__(self) -> EscritorPDF:
+        return self
+    
+    def __exit__(self, tipo: type | None, *exc_info: object) -> None:
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.abandonar()
+    
+    def _nueva_pagina(self, ancho: int, alto: int) -> fitz.Page:
+        self._pendientes += 1
+        self.num_paginas += 1
+        return self._doc.new_page(width=ancho, height=alto)
+    
+    def agregar_imagen(self, imagen: Image.Image, rotulo: str | None = None) -> int:
+        """
+        Append a comparison page.
+        
+        Args:
+            imagen: Composed page
+            rotulo: Text stamped in the top-left corner (e.g. the original page number)
+        
+        Returns:
+            Page number in the output (1-indexed)
+        """
+        flujo = io.BytesIO()
+        imagen.save(flujo, "JPEG", quality=CALIDAD_JPEG_SALIDA, optimize=True)
+        pagina = self._nueva_pagina(imagen.width, imagen.height)
+        pagina.insert_image(pagina.rect, stream=flujo.getvalue())
+        self._rotular(pagina, rotulo)
+        return self.num_paginas
+    
+    def agregar_resultado(self, resultado: ResultadoHoja, rotulo: str | None = None) -> int:
+        """
+        Append the comparison page of a result, in the writer's encoding.
+        
+        Args:
+            resultado: Compared page
+            rotulo: Text stamped in the top-left corner (e.g. the original page number)
+        
+        Returns:
+            Page number in the output (1-indexed)
+        """
+        if self.codificacion == "jpeg":
+            return self.agregar_imagen(resultado.imagen(), rotulo)
+        
+        alto, ancho = resultado.fondo.shape
+        pagina = self._nueva_pagina(ancho, alto)
+        if self.codificacion == "paleta":
+            _, paleta = paleta_comparacion()
+            espacio = f"[/Indexed /DeviceRGB {len(paleta) // 3 - 1} <{paleta.hex()}>]"
+            pagina.insert_image(pagina.rect, xref=self._imagen(
+                resultado.indices(), ancho, alto, ColorSpace=espacio, BitsPerComponent=8
+            ))
+        elif self.codificacion == "vectorial":
+            if resultado.pagina <= len(self._original):
+                # Scaled exactly as the page was rendered (not fitted to the rounded pixel size),
+                # so it lies under the masks; same fade as tabla_fantasma: 30% of the page over 70% white
+                original = self._original[resultado.pagina - 1]
+                destino = original.rect * fitz.Matrix(self._zoom, self._zoom)
+                # show_pdf_page maps a rotated page's box with its unrotated transform, so the
+                # page is shown unrotated and turned as /Rotate would turn it (clockwise)
+                rotacion = original.rotation
+                original.set_rotation(0)
+                pagina.show_pdf_page(destino, self._original, original.number, rotate=-rotacion)
+                original.set_rotation(rotacion)
+                pagina.draw_rect(pagina.rect, color=None, fill=(1, 1, 1), fill_opacity=0.7, width=0)
+            self._pintar_mascaras(pagina, resultado)
+        else:
+            pagina.insert_image(pagina.rect, xref=self._imagen(
+                resultado.fondo, ancho, alto, ColorSpace="/DeviceGray", BitsPerComponent=8, Decode="[0.7 1]"
+            ))
+            self._pintar_mascaras(pagina, resultado)
+        self._rotular(pagina, rotulo)
+        return self.num_paginas
+    
+    def _pintar_mascaras(self, pagina: fitz.Page, resultado: ResultadoHoja) -> None:
+        """Paint the highlights of a result through its bit-packed masks, over the whole page."""
+        alto, ancho = resultado.fondo.shape
+        for mascara, color in ((resultado.verde, Colors.GREEN), (resultado.magenta, Colors.MAGENTA)):
+            if mascara is not None:
+                xref_mascara = self._imagen(mascara, ancho, alto, ImageMask="true", Decode="[1 0]")
+                pagina.insert_image(pagina.rect, xref=self._imagen(
+                    bytes(color), 1, 1, comprimir=False, 
+                    ColorSpace="/DeviceRGB", BitsPerComponent=8, Mask=f"{xref_mascara} 0 R"
+                ))
+    
+    def _imagen(self, datos: np.ndarray | bytes, ancho: int, alto: int, comprimir: bool = True, **claves) -> int:
+        """
+        Add an image XObject with the given raw samples and dictionary entries.
+        
+        Returns:
+            xref of the new object
+        """
+        datos = np.ascontiguousarray(datos).tobytes() if isinstance(datos, np.ndarray) else datos
+        claves = {"Type": "/XObject", "Subtype": "/Image", "Width": ancho, "Height": alto, **claves}
+        xref = self._doc.get_new_xref()
+        self._doc.update_object(xref, "<<" + "".join(f"/{clave} {valor}" for clave, valor in claves.items()) + ">>")
+        if comprimir:
+            self._doc.update_stream(xref, zlib.compress(datos, self.nivel_compresion), compress=False)
+            # update_stream leaves the stream unfiltered; the filter is declared afterwards
+            self._doc.xref_set_key(xref, "Filter", "/FlateDecode")
+        else:
+            self._doc.update_stream(xref, datos, compress=False)
+        return xref
+    
+    @staticmethod
+    def _rotular(pagina: fitz.Page, rotulo: str | None) -> None:
+        """Stamp a label in a white box in the top-left corner of the page."""
+        if not rotulo:
+            return
+        tamano = max(12, pagina.rect.height / 60)
+        margen = tamano / 3
+        largo = fitz.Font("helv").text_length(rotulo, fontsize=tamano)
+        caja = fitz.Rect(margen, margen, 3 * margen + largo, 3 * margen + tamano)
+        pagina.draw_rect(caja, color=(0, 0, 0), fill=(1, 1, 1), width=1)
+        pagina.insert_text((2 * margen, 2 * margen + 0.8 * tamano), rotulo, fontname="helv", fontsize=tamano)
+    
+    def agregar_marcador(self, tamano: tuple[int, int], texto: str) -> int:
+        """
+        Append a placeholder: a blank page of the given (width, height) with a centred note.
+        
+        Returns:
+            Page number in the output (1-indexed)
+        """
+        ancho, alto = tamano
+        pagina = self._nueva_pagina(ancho, alto)
+        tamano_texto = max(12, alto / 40)
+        largo = fitz.Font("helv").text_length(texto, fontsize=tamano_texto)
+        pagina.insert_text(((ancho - largo) / 2, alto / 2), texto, fontname="helv", fontsize=tamano_texto)
+        return self.num_paginas
+    
+    def volcar(self) -> None:
+        """Write the pending pages to disk and release them from memory."""
+        if not self._pendientes:
+            return
+        if self._en_disco:
+            self._doc.saveIncr()
+        else:
+            self._doc.save(str(self.ruta_parcial))
+            self._en_disco = True
+        self._doc.close()
+        self._doc = fitz.open(str(self.ruta_parcial))
+        self._pendientes = 0
+    
+    def cerrar(self) -> bool:
+        """
+        Flush the last pages and move the file to its final name.
+        
+        Returns:
+            Whether a PDF was written (False if no page was ever added)
+        """
+        self.volcar()
+        self._cerrar_documentos()
+        if self._en_disco:
+            os.replace(self.ruta_parcial, self.ruta)
+        return self._en_disco
+    
+    def abandonar(self) -> None:
+        """Keep what can be saved of an interrupted output under the partial name."""
+        try:
+            self.volcar()
+        except Exception as e:
+            logger.warning(f"Could not flush the last pages of {self.ruta.name}: {e}")
+        finally:
+            self._cerrar_documentos()
+        if self._en_disco:
+            logger.warning(f"Partial comparison PDF kept: {self.ruta_parcial}")
+    
+    def _cerrar_documentos(self) -> None:
+        self._doc.close()
+        if self._original is not None:
+            self._original.close()
+
+
+def escribir_indice_cambios(
+    ruta: str | Path, 
+    registro_match: dict, 
+    paginas: list[dict], 
+    dpi: int, 
+    motor: str, 
+    segundos: float, 
+    paginas_salida: str = "todas"
+) -> None:
+    """
+    Write the change index of a document pair: a JSON file listing, for every
+    page, whether it changed, the added/removed pixel counts, the bounding
+    boxes of the change zones, the alignment method and the processing time,
+    and the page it became in the comparison PDF (pagina_salida, None if left out).
+    
+    Coordinates are pixels of the comparison page, which are also PDF points of
+    the comparison PDF (pages are saved at 72 pixels per inch).
+    
+    Args:
+        ruta: Path of the JSON file
+        registro_match: Dictionary with file information of the pair
+        paginas: Page entries (see ResultadoHoja.resumen)
+        dpi: Resolution the pages were compared at
+        motor: Comparison engine
+        segundos: Total processing time of the pair
+        paginas_salida: Which pages were written to the comparison PDF
+    """
+    indice = {
+        "original": registro_match['origen']['ruta'],
+        "nuevo": registro_match['destino']['ruta'],
+        "dpi": dpi,
+        "motor": motor,
+        "paginas_salida": paginas_salida,
+        "paginas_con_cambios": [p["pagina"] for p in paginas if p.get("cambios")],
+        "segundos": round(segundos, 3),
+        "paginas": paginas,
+    }
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(indice, f, ensure_ascii=False, indent=1)
 
 
 def procesar_par_de_archivos(
@@ -562,17 +3910,26 @@ def procesar_par_de_archivos(
     carpeta_salida: str | Path,
     callback_progreso: Callable[[str], None] | None = None,
     callback_estado: Callable[[str], None] | None = None,
-    dpi: int | None = None
+    dpi: int | None = None,
+    motor: str | None = None
 ) -> bool:
     """
     Process a pair of PDF files and generate a comparison PDF.
     
+    The PDF is written page by page as the batches complete (see EscritorPDF).
+    Unless disabled in the configuration, a change index (see
+    escribir_indice_cambios) is written next to it as Comparativa_<name>.json.
+    Pages without differences can be left out of the PDF (the kept pages are
+    labelled with their original number) or replaced by a small placeholder.
+    
     Args:
         registro_match: Dictionary with file information to compare
         carpeta_salida: Output folder path
         callback_progreso: Progress callback function
         callback_estado: Status callback function
         dpi: Resolution for conversion (default 300)
+        motor: Comparison engine, "raster" or "vectorial" (default from configuration).
+            The vector engine falls back to raster for pages without vector content.
     
     Returns:
         True if successful, False otherwise
@@ -584,11 +3941,16 @@ def procesar_par_de_archivos(
     
     if dpi is None:
         dpi = get_dpi()
+    if motor is None:
+        motor = get_motor_comparacion()
     
     ruta_original = registro_match['origen']['ruta']
     ruta_nueva = registro_match['destino']['ruta']
     nombre_base = os.path.basename(ruta_original)
-    ruta_salida_pdf = Path(carpeta_salida) / f"Comparativa_{nombre_base}"
+    # Files found in subfolders keep their subfolder in the output, so equal names do not collide
+    subcarpeta = Path(registro_match['origen'].get('clave', nombre_base)).parent
+    ruta_salida_pdf = Path(carpeta_salida) / subcarpeta / f"Comparativa_{nombre_base}"
+    ruta_indice = ruta_salida_pdf.with_suffix(".json")
 
     if not os.path.exists(ruta_original) or not os.path.exists(ruta_nueva):
         if callback_estado:
@@ -598,78 +3960,252 @@ def procesar_par_de_archivos(
     try:
         if callback_estado:
             callback_estado(f"📊 Analyzing: {nombre_base[:40]}...")
+        inicio = time.perf_counter()
         
-        n_a = obtener_numero_paginas(ruta_original)
-        n_b = obtener_numero_paginas(ruta_nueva)
-        max_pages = max(n_a, n_b)
-        
-        imagenes_finales: list[Image.Image] = []
-        
-        # Use threading instead of multiprocessing in frozen executables to avoid multiple windows
-        if getattr(sys, 'frozen', False):
-            # In frozen executable, use threading backend to avoid multiprocessing issues
-            cores = 1  # Use single thread to avoid issues
-            backend = 'threading'
-        else:
-            cores = max(1, min(2, multiprocessing.cpu_count() - 1))
-            backend = 'loky'  # Default multiprocessing backend
-        
-        batch_size = get_batch_size()
-        for lote_inicio in range(1, max_pages + 1, batch_size):
-            lote_fin = min(lote_inicio + batch_size - 1, max_pages)
+        doc_a = abrir_documento(ruta_original)
+        doc_b = abrir_documento(ruta_nueva)
+        escritor: EscritorPDF | None = None
+        try:
+            n_a = doc_a.num_paginas if doc_a else 0
+            n_b = doc_b.num_paginas if doc_b else 0
+            max_pages = max(n_a, n_b)
             
-            if callback_estado:
-                callback_estado(f"📄 Page {lote_inicio}-{lote_fin}/{max_pages}: {nombre_base[:30]}...")
+            # Unchanged pages skip the raster pipeline (and the new page is never rendered)
+            identicas = detectar_paginas_identicas(doc_a, doc_b) if doc_a and doc_b else set()
+            if identicas and len(identicas) == max_pages:
+                logger.info(f"{nombre_base}: documents are identical, no changes")
+                if callback_estado:
+                    callback_estado(f"🟰 No changes: {nombre_base[:40]}")
+            elif identicas:
+                logger.info(f"{nombre_base}: {len(identicas)}/{max_pages} pages unchanged")
             
-            # Load batch
-            try:
-                pages_a = pdf_a_imagenes(ruta_original, dpi=dpi, first_page=lote_inicio, last_page=lote_fin)
-            except Exception as e:
-                logger.warning(f"Error loading original file: {e}")
-                pages_a = []
+            # Oversized pages are rendered tile by tile instead of as full pages
+            tamano_tesela = get_tamano_tesela()
+            teseladas = {
+                i for i in range(max_pages) 
+                if requiere_teselas(doc_a, doc_b, i, dpi, tamano_tesela)
+            }
+            if teseladas:
+                logger.info(f"{nombre_base}: {len(teseladas)} oversized pages processed in tiles")
             
-            try:
-                pages_b = pdf_a_imagenes(ruta_nueva, dpi=dpi, first_page=lote_inicio, last_page=lote_fin)
-            except Exception as e:
-                logger.warning(f"Error loading new file: {e}")
-                pages_b = []
+            # Coarse-to-fine pages render their own regions (raster engine only)
+            dpi_previo = get_dpi_previo()
+            adaptativas: set[int] = set()
+            if get_modo_adaptativo() and motor == "raster" and dpi_previo < dpi and doc_a and doc_b:
+                adaptativas = set(range(min(n_a, n_b))) - identicas - teseladas
             
-            # Normalize batch size
-            lote_size = max(len(pages_a), len(pages_b))
-            pages_a.extend([None] * (lote_size - len(pages_a)))
-            pages_b.extend([None] * (lote_size - len(pages_b)))
+            def modo_pagina(indice: int) -> str:
+                if indice in teseladas:
+                    return "teselas"
+                if indice in adaptativas:
+                    return "adaptativa"
+                return motor
             
-            # Process in parallel (or sequential if frozen)
-            imgs_lote = Parallel(n_jobs=cores, verbose=0, backend=backend)(
-                delayed(procesar_hoja_premium)(pages_a[i], pages_b[i], lote_inicio + i) 
-                for i in range(lote_size)
-            )
-            imagenes_finales.extend(img for img in imgs_lote if img is not None)
+            # Pages without differences may be left out of the output or replaced by a
+            # placeholder; identical pages then need no rendering at all
+            paginas_salida = get_paginas_salida()
+            solo_cambios = paginas_salida != "todas"
             
-            # Clean up batch
-            gc.collect()
-
-        if imagenes_finales:
-            if callback_estado:
-                callback_estado(f"💾 Saving: {nombre_base[:40]}...")
+            # Either the workers render their own pages from the file paths, or pages
+            # are rendered here lazily, one batch at a time, and sent to the workers
+            en_trabajadores = get_despacho_paginas() == "trabajadores"
+            ajustes = get_config().to_dict() if CONFIG_AVAILABLE else None
+            propias = teseladas | adaptativas
+            if en_trabajadores or not doc_a:
+                paginas_a = iter(())
+            else:
+                paginas_a = doc_a.renderizar_paginas(dpi, omitir=propias | identicas if solo_cambios else propias)
+            if en_trabajadores or not doc_b:
+                paginas_b = iter(())
+            else:
+                paginas_b = doc_b.renderizar_paginas(dpi, omitir=identicas | propias)
             
-            imagenes_finales[0].save(
-                str(ruta_salida_pdf), 
-                save_all=True, 
-                append_images=imagenes_finales[1:], 
-                optimize=True
+            alineaciones: Counter = Counter()
+            areas_omitidas: list[float] = []
+            procesadas = 0
+            
+            # Page cache lookups of this pair: counted here, or by the workers that render the pages
+            cache = obtener_cache_paginas()
+            consultas_previas = (cache.aciertos, cache.fallos) if cache else (0, 0)
+            consultas_trabajadores = [0, 0]
+            
+            # Page entries of the change index
+            indice_cambios = get_indice_cambios()
+            separacion = round(SEPARACION_ZONAS_MM / 25.4 * dpi)
+            paginas_indice: list[dict] = []
+            
+            # Alignment model of the pair: the last transform found is offered to the
+            # next batch (worker tasks also pass it from page to page), so pages
+            # sharing an offset skip the estimation
+            reutilizar = get_reutilizar_alineacion()
+            pista: np.ndarray | None = None
+            
+            # Use threading instead of multiprocessing in frozen executables to avoid multiple windows
+            if getattr(sys, 'frozen', False):
+                # In frozen executable, use threading backend to avoid multiprocessing issues
+                cores = 1  # Use single thread to avoid issues
+                backend = 'threading'
+            else:
+                cores = max(1, min(2, multiprocessing.cpu_count() - 1))
+                backend = 'loky'  # Default multiprocessing backend
+            
+            # Pages go to the output as they are composed and reach the disk after
+            # every batch; an interrupted run keeps the pages written so far
+            ruta_salida_pdf.parent.mkdir(parents=True, exist_ok=True)
+            escritor = EscritorPDF(
+                ruta_salida_pdf, get_codificacion_salida(), get_compresion_salida(), original=ruta_original, dpi=dpi
             )
             
-            # Clean up
-            for img in imagenes_finales:
-                img.close()
-            gc.collect()
             
-            if callback_progreso:
-                callback_progreso(nombre_base)
-            return True
+            batch_size = get_batch_size()
+            for lote_inicio in range(1, max_pages + 1, batch_size):
+                lote_fin = min(lote_inicio + batch_size - 1, max_pages)
+                
+                if callback_estado:
+                    callback_estado(f"📄 Page {lote_inicio}-{lote_fin}/{max_pages}: {nombre_base[:30]}...")
+                
+                # Load batch (empty when the workers render their own pages)
+                lote_size = lote_fin - lote_inicio + 1
+                pages_a = _siguiente_lote(paginas_a, lote_size, "original")
+                pages_b = _siguiente_lote(paginas_b, lote_size, "new")
+                pages_a.extend([None] * (lote_size - len(pages_a)))
+                pages_b.extend([None] * (lote_size - len(pages_b)))
+                
+                # Process in parallel (or sequential if frozen)
+                resultados: list[ResultadoHoja | None] = [None] * lote_size
+                tareas, posiciones = [], []
+                paginas_trabajadores: list[tuple[int, str, bool]] = []
+                for i in range(lote_size):
+                    indice = lote_inicio - 1 + i
+                    modo, identica = modo_pagina(indice), indice in identicas
+                    
+                    if identica and solo_cambios:
+                        resultados[i] = ResultadoHoja.sin_renderizar(indice + 1, doc_a.tamano_pagina(indice, dpi))
+                        continue
+                    
+                    if en_trabajadores:
+                        posiciones.append(i)
+                        paginas_trabajadores.append((indice, modo, identica))
+                        continue
+                    
+                    # Tiled and coarse-to-fine pages render their own regions
+                    # from the open documents, so they run in this process
+                    if indice in propias:
+                        resultados[i] = cronometrar(comparar_pagina, doc_a, doc_b, indice, modo, identica, dpi)
+                        continue
+                    
+                    posiciones.append(i)
+                    if identica:
+                        tareas.append(delayed(cronometrar)(procesar_hoja_sin_cambios, pages_a[i], indice + 1))
+                        continue
+                    
+                    primitivas = None
+                    if motor == "vectorial" and pages_a[i] is not None and pages_b[i] is not None:
+                        primitivas = _primitivas_par(doc_a, doc_b, indice)
+                    
+                    if primitivas:
+                        tareas.append(delayed(cronometrar)(
+                            procesar_hoja_vectorial, pages_a[i], pages_b[i], *primitivas, dpi, indice + 1
+                        ))
+                    else:
+                        tareas.append(delayed(cronometrar)(
+                            comparar_hoja, pages_a[i], pages_b[i], indice + 1, 
+                            misma_geometria(doc_a, doc_b, indice), pista
+                        ))
+                
+                if paginas_trabajadores:
+                    # One run of consecutive pages per worker, so each opens the documents once
+                    paso = -(-len(paginas_trabajadores) // cores)
+                    for inicio_grupo in range(0, len(paginas_trabajadores), paso):
+                        tareas.append(delayed(procesar_paginas_trabajador)(
+                            ruta_original, ruta_nueva, paginas_trabajadores[inicio_grupo:inicio_grupo + paso], 
+                            dpi, ajustes, pista
+                        ))
+                    salidas = Parallel(n_jobs=cores, verbose=0, backend=backend)(tareas)
+                    for i, resultado in zip(posiciones, (r for grupo, _ in salidas for r in grupo)):
+                        resultados[i] = resultado
+                    for aciertos, fallos in (consultas for _, consultas in salidas):
+                        consultas_trabajadores[0] += aciertos
+                        consultas_trabajadores[1] += fallos
+                elif tareas:
+                    for i, resultado in zip(posiciones, Parallel(n_jobs=cores, verbose=0, backend=backend)(tareas)):
+                        resultados[i] = resultado
+                for i, resultado in enumerate(resultados):
+                    pagina = lote_inicio + i
+                    if resultado is None:
+                        if indice_cambios:
+                            paginas_indice.append({"pagina": pagina, "error": True})
+                        continue
+                    
+                    procesadas += 1
+                    pagina_salida = None
+                    if resultado.tiene_cambios or not solo_cambios:
+                        rotulo = f"Página {pagina}" if paginas_salida == "cambiadas" else None
+                        pagina_salida = escritor.agregar_resultado(resultado, rotulo)
+                    elif paginas_salida == "marcador":
+                        alto, ancho = resultado.fondo.shape[:2]
+                        pagina_salida = escritor.agregar_marcador((ancho, alto), f"Página {pagina}: sin cambios")
+                    
+                    if indice_cambios:
+                        paginas_indice.append({**resultado.resumen(separacion), "pagina_salida": pagina_salida})
+                    if resultado.alineacion:
+                        alineaciones[resultado.alineacion] += 1
+                    if resultado.area_omitida is not None:
+                        areas_omitidas.append(resultado.area_omitida)
+                    if reutilizar and resultado.alineacion in ALINEACIONES_REUTILIZABLES:
+                        pista = resultado.homografia
+                
+                # Clean up batch
+                escritor.volcar()
+                del pages_a, pages_b
+                gc.collect()
+        except BaseException:
+            if escritor is not None:
+                escritor.abandonar()
+            raise
+        finally:
+            for doc in (doc_a, doc_b):
+                if doc:
+                    doc.cerrar()
         
-        return False
+        if alineaciones:
+            resumen = ", ".join(f"{n} {metodo}" for metodo, n in alineaciones.most_common())
+            logger.info(f"{nombre_base}: pages aligned by {resumen}")
+        if areas_omitidas:
+            logger.info(
+                f"{nombre_base}: {np.mean(areas_omitidas):.0%} of the diffed page area skipped as unchanged"
+            )
+        
+        if cache is not None:
+            if en_trabajadores:
+                aciertos, fallos = consultas_trabajadores
+            else:
+                aciertos, fallos = cache.aciertos - consultas_previas[0], cache.fallos - consultas_previas[1]
+            if aciertos + fallos:
+                logger.info(
+                    f"Page cache: {aciertos} hits, {fallos} misses "
+                    f"({aciertos / (aciertos + fallos):.0%} hit ratio)"
+                )
+
+        if callback_estado and escritor.num_paginas:
+            callback_estado(f"💾 Saving: {nombre_base[:40]}...")
+        if escritor.cerrar():
+            gc.collect()
+        elif procesadas:
+            # Only changed pages were requested and there are none
+            logger.info(f"{nombre_base}: no changed pages, comparison PDF not written")
+        else:
+            return False
+        
+        if indice_cambios:
+            escribir_indice_cambios(
+                ruta_indice, registro_match, paginas_indice, dpi, motor, 
+                time.perf_counter() - inicio, paginas_salida
+            )
+        
+        if callback_progreso:
+            callback_progreso(nombre_base)
+        return True
 
     except Exception as e:
         logger.error(f"Error processing files: {e}")
@@ -0,0 +1,79 @@
+"""Shared fixtures: default configuration and small synthetic drawings."""
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+import fitz
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from configuracion import ConfiguracionApp, get_config, set_config
+
+
+@pytest.fixture(autouse=True)
+def config(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> ConfiguracionApp:
+    """
+    Default configuration for every test (not the user's config.json), with
+    the per-user caches redirected to a temporary folder.
+    """
+    monkeypatch.setattr(fc, "get_cache_path", lambda: tmp_path / "cache")
+    monkeypatch.setattr(fc, "_cache_paginas", None)
+    monkeypatch.setattr(fc, "_cache_huellas", None)
+    
+    anterior = get_config()
+    actual = ConfiguracionApp()
+    set_config(actual)
+    yield actual
+    set_config(anterior)
+
+
+def dibujar_plano(page: fitz.Page, semilla: int = 5, rev: str = "A", desplazamiento: tuple[float, float] = (0, 0)) -> None:
+    """Draw a CAD-like sheet: thin boxes with small dimension labels and a title block."""
+    rnd = random.Random(semilla)
+    dx, dy = desplazamiento
+    ancho, alto = page.rect.width, page.rect.height
+    forma = page.new_shape()
+    for _ in range(120):
+        x0, y0 = rnd.uniform(40, ancho - 300), rnd.uniform(40, alto - 200)
+        forma.draw_rect(fitz.Rect(x0 + dx, y0 + dy, x0 + dx + rnd.uniform(10, 120), y0 + dy + rnd.uniform(10, 90)))
+        forma.insert_text((x0 + dx + 3, y0 + dy + 10), f"{rnd.randint(100, 9999)}", fontsize=5)
+    
+    bx, by = ancho - 260 + dx, alto - 110 + dy
+    forma.draw_rect(fitz.Rect(bx, by, bx + 250, by + 100))
+    for n, texto in enumerate(["CONSTRUCTORA ANDES SAS", "PROYECTO TORRE NORTE", f"PLANO {semilla}", f"REV {rev}"]):
+        forma.insert_text((bx + 8, by + 16 + n * 15), texto, fontsize=9)
+    forma.finish(color=(0, 0, 0), width=0.5)
+    forma.commit()
+
+
+def pagina_gris(ruta, numero: int = 0) -> np.ndarray:
+    """Page of a PDF rendered in gray at 72 DPI (one pixel per point)."""
+    with fitz.open(ruta) as doc:
+        pixmap = doc[numero].get_pixmap(colorspace=fitz.csGRAY)
+        return np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.h, pixmap.w).astype(int)
+
+
+def registro(ruta_a: Path, ruta_b: Path) -> dict:
+    """Match record of two files, as comparar_listas_completo gives it."""
+    return {
+        "tipo": "match",
+        "origen": {"clave": ruta_a.name, "ruta": str(ruta_a)},
+        "destino": {"clave": ruta_b.name, "ruta": str(ruta_b)},
+    }
+
+
+@pytest.fixture
+def crear_pdf(tmp_path: Path):
+    """Factory writing a PDF whose pages are drawn by the given callables (each receives the page)."""
+    def crear(nombre: str, paginas: list, tamano: tuple[float, float] = (1191, 842)) -> Path:
+        doc = fitz.open()
+        for dibujar in paginas:
+            dibujar(doc.new_page(width=tamano[0], height=tamano[1]))
+        ruta = tmp_path / nombre
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        doc.save(ruta)
+        doc.close()
+        return ruta
+    return crear
@@ -0,0 +1,257 @@
+"""Page alignment: reduced-resolution homographies, alignment tiers (alinear_paginas) and their reuse."""
+from __future__ import annotations
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano
+
+DESPLAZAMIENTO = (6, -4)
+
+
+@pytest.fixture
+def desplazados(crear_pdf):
+    """Four sheets and the same four drawn with a common offset."""
+    original = crear_pdf("a.pdf", [lambda page, n=n: dibujar_plano(page, semilla=n) for n in range(4)])
+    nuevo = crear_pdf("b.pdf", [
+        lambda page, n=n: dibujar_plano(page, semilla=n, desplazamiento=DESPLAZAMIENTO) for n in range(4)
+    ])
+    return str(original), str(nuevo)
+
+
+@pytest.fixture
+def girada():
+    """A 150 DPI sheet (2482 x 1755 px), the same sheet rotated 0.4 degrees and shifted, and the true homography."""
+    with fitz.open() as doc:
+        page = doc.new_page(width=1191, height=842)
+        dibujar_plano(page)
+        pixmap = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY)
+    base = np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.h, pixmap.w).copy()
+    alto, ancho = base.shape
+    verdad = np.vstack([cv2.getRotationMatrix2D((ancho / 2, alto / 2), 0.4, 1.0), [0, 0, 1]])
+    verdad[:2, 2] += (25.3, -14.6)
+    movida = cv2.warpPerspective(base, np.linalg.inv(verdad), (ancho, alto), borderValue=255)
+    return base, movida, verdad
+
+
+def error_esquinas(h_matrix: np.ndarray, verdad: np.ndarray, forma: tuple[int, int]) -> float:
+    """Largest distance, in pixels, between where two homographies put the page corners."""
+    alto, ancho = forma
+    esquinas = np.float32([[0, 0], [ancho, 0], [ancho, alto], [0, alto]]).reshape(-1, 1, 2)
+    return float(np.abs(cv2.perspectiveTransform(esquinas, h_matrix) - cv2.perspectiveTransform(esquinas, verdad)).max())
+
+
+def test_escalar_homografia():
+    verdad = np.array([[1.0, 0.01, 30.0], [-0.01, 1.0, -12.0], [0.0, 0.0, 1.0]])
+    # Reduced renders at a quarter and a fifth of (2000 x 1000) and (2100 x 1050) pixels
+    reducir_a, reducir_b = np.diag([0.25, 0.25, 1.0]), np.diag([0.2, 0.2, 1.0])
+    h_small = reducir_a @ verdad @ np.linalg.inv(reducir_b)
+
+    h_matrix = fc.escalar_homografia(h_small, (250, 500), (210, 420), (2000, 1000), (2100, 1050))
+    np.testing.assert_allclose(h_matrix, verdad, atol=1e-9)
+    # Without a homography the new page is stretched onto the base page
+    np.testing.assert_allclose(fc.escalar_homografia(None, (250, 500), (210, 420), (2000, 1000), (2100, 1050)),
+                               np.diag([2000 / 2100, 1000 / 1050, 1.0]))
+
+
+@pytest.mark.parametrize("resolucion", [1000, 1500])
+@pytest.mark.parametrize("refinar", [True, False])
+def test_alinea_sobre_la_pagina_reducida(config, girada, monkeypatch, resolucion, refinar):
+    config.resolucion_alineacion = resolucion
+    config.refinar_alineacion = refinar
+    base, movida, verdad = girada
+    formas = []
+    estimar = fc._estimar_homografia_orb
+
+    def espiar(gray_base, gray_move, max_features):
+        formas.append(gray_base.shape)
+        return estimar(gray_base, gray_move, max_features)
+
+    monkeypatch.setattr(fc, "_estimar_homografia_orb", espiar)
+    h_matrix = fc.estimar_homografia(base, movida)
+
+    # Features are only searched on the reduced page, yet the corners land within one reduced pixel
+    assert max(formas[0]) == resolucion and len(formas) == 1
+    assert error_esquinas(h_matrix, verdad, base.shape) < max(base.shape) / resolucion
+
+
+def test_refinar_corrige_la_homografia_reducida(girada):
+    base, movida, verdad = girada
+    inicial = verdad.copy()
+    inicial[:2, 2] += (2.5, -1.5)
+
+    refinada = fc.refinar_homografia(base, movida, inicial, 6.0)
+    assert error_esquinas(refinada, verdad, base.shape) < 0.5
+    # A residual beyond the tolerance is not trusted
+    np.testing.assert_array_equal(fc.refinar_homografia(base, movida, inicial, 1.0), inicial)
+
+
+@pytest.fixture
+def llamadas_orb(monkeypatch) -> list:
+    """Every ORB homography estimation."""
+    llamadas = []
+    estimar = fc.estimar_homografia
+
+    def espiar(gray_base, gray_move):
+        llamadas.append(gray_base.shape)
+        return estimar(gray_base, gray_move)
+
+    monkeypatch.setattr(fc, "estimar_homografia", espiar)
+    return llamadas
+
+
+def test_identidad_sin_buscar_puntos(config, girada, llamadas_orb):
+    config.prealineacion = True
+    base, _, _ = girada
+
+    alineacion = fc.alinear_paginas(base, base.copy(), misma_geometria=True)
+    assert alineacion.metodo == "identidad" and llamadas_orb == []
+    np.testing.assert_array_equal(alineacion.homografia, np.eye(3))
+    # Pages with different boxes are never taken as already aligned
+    assert fc.alinear_paginas(base, base.copy()).metodo == "correlacion"
+
+
+def test_desplazamiento_por_correlacion(config, girada, llamadas_orb):
+    config.prealineacion = True
+    base, _, _ = girada
+    verdad = np.array([[1, 0, 17.5], [0, 1, -9.25], [0, 0, 1]])
+    desplazada = cv2.warpPerspective(base, np.linalg.inv(verdad), base.shape[::-1], borderValue=255)
+
+    alineacion = fc.alinear_paginas(base, desplazada, misma_geometria=True)
+    assert alineacion.metodo == "correlacion" and llamadas_orb == []
+    assert error_esquinas(alineacion.homografia, verdad, base.shape) < 0.5
+
+
+@pytest.mark.parametrize("grados, metodo", [(0.4, "correlacion"), (3.0, "orb")])
+def test_giro(config, girada, llamadas_orb, grados, metodo):
+    config.prealineacion = True
+    config.resolucion_alineacion = 1500
+    base, _, _ = girada
+    alto, ancho = base.shape
+    verdad = np.vstack([cv2.getRotationMatrix2D((ancho / 2, alto / 2), grados, 1.0), [0, 0, 1]])
+    movida = cv2.warpPerspective(base, np.linalg.inv(verdad), (ancho, alto), borderValue=255)
+
+    # The refinement of the correlation tier absorbs a slight rotation; a larger one needs ORB
+    alineacion = fc.alinear_paginas(base, movida, misma_geometria=True)
+    assert alineacion.metodo == metodo and len(llamadas_orb) == (metodo == "orb")
+    assert error_esquinas(alineacion.homografia, verdad, base.shape) < 1.0
+
+
+def test_sin_prealineacion_siempre_orb(config, girada, llamadas_orb):
+    config.prealineacion = False
+    config.resolucion_alineacion = 1500
+    base, _, _ = girada
+
+    assert fc.alinear_paginas(base, base.copy(), misma_geometria=True).metodo == "orb"
+    assert len(llamadas_orb) == 1
+
+
+def test_pagina_en_blanco_sin_alineacion(config, girada):
+    config.prealineacion = True
+    base, _, _ = girada
+
+    alineacion = fc.alinear_paginas(base, np.full_like(base, 255), misma_geometria=True)
+    assert alineacion.metodo == "ninguna" and alineacion.homografia is None
+
+
+def test_seleccionar_en_rejilla():
+    # A dense corner (cell 0, 0) with strong points, and two weak points in every other cell of a 2 x 2 grid
+    densos = [cv2.KeyPoint(10 + i % 10, 10 + i // 10, 7, response=1.0 + i) for i in range(100)]
+    debiles = [cv2.KeyPoint(x, y, 7, response=0.1 * n) for n, (x, y) in enumerate(
+        [(150, 20), (160, 30), (20, 150), (30, 160), (150, 150), (160, 160)]
+    )]
+
+    seleccion = fc.seleccionar_en_rejilla(tuple(densos + debiles), 2, 8, (200, 200))
+
+    assert len(seleccion) == 8
+    assert all(kp in seleccion for kp in debiles)
+    # The dense cell only keeps its share of the budget: its two strongest points
+    assert sorted(kp.response for kp in seleccion if kp in densos) == [99.0, 100.0]
+
+
+@pytest.fixture
+def girada_72(girada):
+    """The rotated pair at 72 DPI."""
+    base, movida, verdad = girada
+    escala = np.diag([72 / 150, 72 / 150, 1.0])
+    reducir = lambda gris: cv2.resize(gris, None, fx=72 / 150, fy=72 / 150, interpolation=cv2.INTER_AREA)
+    return reducir(base), reducir(movida), escala @ verdad @ np.linalg.inv(escala)
+
+
+def test_rejilla_reparte_los_puntos(config, girada_72):
+    base, _, _ = girada_72
+    alto, ancho = base.shape
+    ocupacion = {}
+    for celdas in (0, 8):
+        config.rejilla_orb = celdas
+        keypoints, descriptores = fc._detectar_orb(base, 2000)
+        assert len(keypoints) == len(descriptores) <= 2000
+        por_celda = np.zeros((8, 8), int)
+        for kp in keypoints:
+            por_celda[min(7, int(kp.pt[1] * 8 / alto)), min(7, int(kp.pt[0] * 8 / ancho))] += 1
+        ocupacion[celdas] = por_celda
+
+    # At least the same cells reached, but no cell takes more than its share of the budget
+    assert (ocupacion[8] > 0).sum() >= (ocupacion[0] > 0).sum()
+    assert ocupacion[8].max() <= -(-2000 // 64) < ocupacion[0].max()
+
+
+@pytest.mark.parametrize("emparejador, clase", [("flann", cv2.FlannBasedMatcher), ("fuerza_bruta", cv2.BFMatcher)])
+def test_emparejador_configurado(config, emparejador, clase):
+    config.emparejador_orb = emparejador
+    assert isinstance(fc.crear_emparejador_orb(), clase)
+
+
+def test_flann_empareja_como_la_busqueda_exhaustiva(config, girada_72):
+    config.rejilla_orb = 8
+    base, movida, verdad = girada_72
+    keypoints_mover, descriptores_mover = fc._detectar_orb(movida, 5000)
+    keypoints_base, descriptores_base = fc._detectar_orb(base, 5000)
+
+    correctas = {}
+    for emparejador in ("flann", "fuerza_bruta"):
+        config.emparejador_orb = emparejador
+        parejas = fc._emparejar_orb(descriptores_mover, descriptores_base)
+        origen = np.float32([keypoints_mover[m.queryIdx].pt for m in parejas]).reshape(-1, 1, 2)
+        destino = np.float32([keypoints_base[m.trainIdx].pt for m in parejas]).reshape(-1, 1, 2)
+        correctas[emparejador] = np.count_nonzero(
+            np.linalg.norm(cv2.perspectiveTransform(origen, verdad) - destino, axis=2) < 3
+        )
+        assert correctas[emparejador] > 0.5 * len(parejas)
+        assert error_esquinas(fc._estimar_homografia_orb(base, movida, 5000), verdad, base.shape) < 1.0
+
+    assert correctas["flann"] >= correctas["fuerza_bruta"]
+
+
+@pytest.mark.parametrize("reutilizar", [True, False])
+def test_trabajador_pasa_la_alineacion_de_pagina_en_pagina(config, desplazados, reutilizar):
+    config.prealineacion = True
+    config.reutilizar_alineacion = reutilizar
+    paginas = [(indice, "raster", False) for indice in range(4)]
+
+    resultados, _ = fc.procesar_paginas_trabajador(*desplazados, paginas, 72)
+
+    metodos = [resultado.alineacion for resultado in resultados]
+    assert metodos[0] in ("correlacion", "orb")
+    if reutilizar:
+        assert metodos[1:] == ["reutilizada"] * 3
+    else:
+        assert "reutilizada" not in metodos
+
+
+def test_reutilizar_no_cambia_las_mascaras(config, desplazados):
+    config.prealineacion = True
+    paginas = [(indice, "raster", False) for indice in range(4)]
+    salidas = []
+    for reutilizar in (True, False):
+        config.reutilizar_alineacion = reutilizar
+        salidas.append(fc.procesar_paginas_trabajador(*desplazados, paginas, 72)[0])
+
+    for reutilizado, estimado in zip(*salidas):
+        for mascara_reutilizada, mascara_estimada in zip(reutilizado.mascaras(), estimado.mascaras()):
+            assert (mascara_reutilizada is None) == (mascara_estimada is None)
+            if mascara_estimada is not None:
+                assert (mascara_reutilizada != mascara_estimada).mean() < 0.001
@@ -0,0 +1,68 @@
+"""One-to-one pairing (asignar_subasta, IndiceTrigramas) against brute force."""
+from __future__ import annotations
+
+import itertools
+import random
+
+import pytest
+
+import funciones_comparador as fc
+from benchmarks.bench_emparejamiento import diccionario_carpeta, revision_sintetica
+
+
+def mejor_total(candidatos: list[tuple[list[int], list[float]]], num_destinos: int) -> float:
+    """Best total benefit of a one-to-one assignment, trying every one (sources may stay unassigned)."""
+    beneficios = [dict(zip(destinos, valores)) for destinos, valores in candidatos]
+    mejor = 0.0
+    opciones = list(range(num_destinos)) + [None] * len(candidatos)
+    for asignacion in set(itertools.permutations(opciones, len(candidatos))):
+        if all(d is None or d in b for d, b in zip(asignacion, beneficios)):
+            mejor = max(mejor, sum(b[d] for d, b in zip(asignacion, beneficios) if d is not None))
+    return mejor
+
+
+@pytest.mark.parametrize("semilla", range(30))
+def test_subasta_optima(semilla):
+    rng = random.Random(semilla)
+    origenes, num_destinos = rng.randint(1, 5), rng.randint(1, 5)
+    candidatos = []
+    for _ in range(origenes):
+        destinos = rng.sample(range(num_destinos), rng.randint(0, num_destinos))
+        candidatos.append((destinos, [rng.choice([0.5, 0.75, 0.9, 1.0]) ** fc.EXPONENTE_ASIGNACION for _ in destinos]))
+
+    asignacion = fc.asignar_subasta(candidatos, num_destinos)
+
+    asignados = [d for d in asignacion if d >= 0]
+    assert len(asignados) == len(set(asignados))
+    total = 0.0
+    for (destinos, valores), d in zip(candidatos, asignacion):
+        if d >= 0:
+            total += valores[destinos.index(d)]
+    assert total >= mejor_total(candidatos, num_destinos) - origenes * fc.EPSILON_SUBASTA
+
+
+def emparejar(origen, destino):
+    resultados = fc.comparar_listas_completo(diccionario_carpeta(origen), diccionario_carpeta(destino), 0.5, "nombre")
+    return {r["origen"]["clave"]: r["destino"]["clave"] for r in resultados if r["tipo"] == "match"}
+
+
+def test_indice_como_comparar_con_todos(monkeypatch):
+    origen, destino, verdad = revision_sintetica(300, semilla=4)
+    con_indice = emparejar(origen, destino)
+    monkeypatch.setattr(fc, "CANDIDATOS_POR_ORIGEN", len(destino))  # Every destination is a candidate
+    con_todos = emparejar(origen, destino)
+    
+    correctos = [sum(pares.get(o) == d for o, d in verdad.items()) for pares in (con_indice, con_todos)]
+    
+    assert len(set(con_indice.values())) == len(con_indice)
+    assert correctos[0] >= correctos[1] - len(verdad) // 50
+    assert correctos[0] >= 0.9 * len(verdad)
+
+
+def test_indice_encuentra_el_nombre_mas_parecido():
+    origen, destino, _ = revision_sintetica(200, semilla=1)
+    indice = fc.IndiceTrigramas(destino)
+    for nombre in origen[:50]:
+        ratios = [fc.SequenceMatcher(None, nombre, otro).ratio() for otro in destino]
+        mejor = max(range(len(destino)), key=ratios.__getitem__)
+        assert mejor in indice.candidatos(nombre, fc.CANDIDATOS_POR_ORIGEN).tolist()
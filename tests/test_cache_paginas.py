@@ -0,0 +1,82 @@
+"""On-disk page cache (CachePaginas): lookups, LRU eviction by size, and its use by a comparison."""
+from __future__ import annotations
+
+import logging
+import os
+
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano, registro
+
+KB = 1024
+
+
+def pagina(semilla: int) -> np.ndarray:
+    """A page that does not compress (PNG stores it at about its raw size, 10 KB)."""
+    return np.random.default_rng(semilla).integers(0, 256, (100, 100), dtype=np.uint8)
+
+
+@pytest.fixture
+def cache(tmp_path) -> fc.CachePaginas:
+    return fc.CachePaginas(tmp_path / "paginas", 35 * KB)
+
+
+def test_aciertos_y_fallos(cache):
+    clave = fc.CachePaginas.clave("huella", 0, 72, True)
+    assert cache.obtener(clave) is None
+
+    cache.guardar(clave, pagina(0))
+
+    np.testing.assert_array_equal(cache.obtener(clave), pagina(0))
+    assert cache.obtener(fc.CachePaginas.clave("huella", 1, 72, True)) is None
+    assert (cache.aciertos, cache.fallos) == (1, 2)
+
+
+def test_archivo_danado_es_un_fallo(cache):
+    clave = fc.CachePaginas.clave("huella", 0, 72, True)
+    cache.guardar(clave, pagina(0))
+    cache._ruta(clave).write_bytes(b"not a png")
+
+    assert cache.obtener(clave) is None
+    assert (cache.aciertos, cache.fallos) == (0, 1)
+
+
+def test_clave_distingue_pagina_dpi_y_color():
+    claves = {
+        fc.CachePaginas.clave(huella, indice, dpi, gris)
+        for huella in ("a", "b") for indice in (0, 1) for dpi in (72, 150) for gris in (True, False)
+    }
+    assert len(claves) == 16
+
+
+def test_desaloja_la_menos_usada_por_tamano(cache):
+    claves = [fc.CachePaginas.clave("huella", i, 72, True) for i in range(4)]
+    for i, clave in enumerate(claves[:3]):
+        cache.guardar(clave, pagina(i))
+        os.utime(cache._ruta(clave), (1000 + i, 1000 + i))  # Used in order 0, 1, 2
+    assert cache.obtener(claves[0]) is not None  # Page 0 becomes the most recently used
+
+    cache.guardar(claves[3], pagina(3))  # 40 KB over a 35 KB cap
+
+    assert [cache._ruta(clave).exists() for clave in claves] == [True, False, True, True]
+    tamano = sum(entrada.stat().st_size for entrada in os.scandir(cache.directorio))
+    assert tamano <= 0.9 * cache.max_bytes
+
+
+@pytest.mark.parametrize("despacho", ["trabajadores", "principal"])
+def test_comparacion_informa_aciertos_y_fallos(config, crear_pdf, tmp_path, caplog, despacho):
+    config.dpi = 72
+    config.usar_cache = True
+    config.despacho_paginas = despacho
+    config.prealineacion = True
+    original = crear_pdf("a/plano.pdf", [lambda page: dibujar_plano(page, semilla=1)] * 2)
+    nuevo = crear_pdf("b/plano.pdf", [lambda page: dibujar_plano(page, semilla=1, rev="B")] * 2)
+
+    with caplog.at_level(logging.INFO, logger="funciones_comparador"):
+        assert fc.procesar_par_de_archivos(registro(original, nuevo), tmp_path / "salida1")
+        assert "Page cache: 0 hits, 4 misses" in caplog.text
+        caplog.clear()
+        assert fc.procesar_par_de_archivos(registro(original, nuevo), tmp_path / "salida2")
+        assert "Page cache: 4 hits, 0 misses (100% hit ratio)" in caplog.text
@@ -0,0 +1,100 @@
+"""Page dispatch: workers that render their own pages (procesar_paginas_trabajador)."""
+from __future__ import annotations
+
+import multiprocessing
+
+import fitz
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano, pagina_gris, registro
+
+
+@pytest.fixture
+def config(config):
+    config.dpi = 72
+    config.batch_size = 3
+    # The sheets are not moved; the quick alignment tier finds that they are in place
+    config.prealineacion = True
+    return config
+
+
+def revision(page, semilla: int) -> None:
+    """The sheet with a new note."""
+    dibujar_plano(page, semilla=semilla)
+    page.insert_text((page.rect.width / 2, page.rect.height / 2), "VER DETALLE 4", fontsize=14)
+
+
+@pytest.fixture
+def par(crear_pdf):
+    """Five sheets; the new version adds a note to sheets 2 and 3 and adds a sixth sheet."""
+    original = crear_pdf("a/plano.pdf", [lambda page, n=n: dibujar_plano(page, semilla=n) for n in range(5)])
+    nuevo = crear_pdf("b/plano.pdf", [
+        lambda page, n=n: (revision if n in (1, 2) else dibujar_plano)(page, semilla=n) for n in range(6)
+    ])
+    return original, nuevo
+
+
+def comparar(par, salida) -> list[np.ndarray]:
+    assert fc.procesar_par_de_archivos(registro(*par), salida)
+    ruta = salida / "Comparativa_plano.pdf"
+    with fitz.open(ruta) as doc:
+        return [pagina_gris(ruta, n) for n in range(len(doc))]
+
+
+@pytest.mark.parametrize("procesos", [1, 3])
+def test_trabajadores_igual_que_el_proceso_principal(config, par, tmp_path, monkeypatch, procesos):
+    # With more than one CPU the pages go to separate worker processes
+    monkeypatch.setattr(multiprocessing, "cpu_count", lambda: procesos)
+    config.despacho_paginas = "principal"
+    principal = comparar(par, tmp_path / "principal")
+    config.despacho_paginas = "trabajadores"
+    trabajadores = comparar(par, tmp_path / "trabajadores")
+
+    assert len(trabajadores) == len(principal) == 6
+    for pagina_trabajadores, pagina_principal in zip(trabajadores, principal):
+        np.testing.assert_array_equal(pagina_trabajadores, pagina_principal)
+
+
+def test_las_tareas_no_llevan_imagenes(config, par, tmp_path, monkeypatch):
+    config.despacho_paginas = "trabajadores"
+    tareas = []
+    trabajador = fc.procesar_paginas_trabajador
+
+    def espiar(*args):
+        tareas.append(args)
+        return trabajador(*args)
+
+    def no_renderizar(*args, **kwargs):
+        raise AssertionError("the main process rendered a batch of pages")
+
+    monkeypatch.setattr(fc, "procesar_paginas_trabajador", espiar)
+    monkeypatch.setattr(fc.DocumentoPDF, "renderizar_paginas", no_renderizar)
+    comparar(par, tmp_path / "salida")
+
+    assert [indice for *_, paginas, _dpi, _ajustes, _pista in tareas for indice, _, _ in paginas] == list(range(6))
+    for ruta_a, ruta_b, paginas, dpi, ajustes, pista in tareas:
+        assert (ruta_a, ruta_b, dpi) == (str(par[0]), str(par[1]), 72)
+        assert ajustes["despacho_paginas"] == "trabajadores"
+        # Only a 3 x 3 alignment hint, never a page image
+        assert pista is None or pista.shape == (3, 3)
+
+
+def test_el_trabajador_cierra_los_documentos(par, monkeypatch):
+    abiertos = []
+    abrir = fc.abrir_documento
+
+    def espiar(ruta):
+        doc = abrir(ruta)
+        abiertos.append(doc)
+        return doc
+
+    monkeypatch.setattr(fc, "abrir_documento", espiar)
+    resultados, _ = fc.procesar_paginas_trabajador(
+        str(par[0]), str(par[1]), [(1, "raster", False), (5, "raster", False)], 72
+    )
+
+    assert [r.pagina for r in resultados] == [2, 6]
+    assert all(r.tiene_cambios for r in resultados)
+    assert len(abiertos) == 2 and all(doc._doc is None for doc in abiertos)
@@ -0,0 +1,98 @@
+"""Coarse-to-fine comparison (procesar_hoja_adaptativa) against the full-page comparison."""
+from __future__ import annotations
+
+import cv2
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano
+
+
+@pytest.fixture
+def config(config):
+    # The sheets are not moved; the quick alignment tier finds that they are in place
+    config.prealineacion = True
+    return config
+
+
+def punto(page):
+    dibujar_plano(page)
+    page.draw_circle((page.rect.width / 2, page.rect.height / 2), 1.2, color=(0, 0, 0), fill=(0, 0, 0))
+
+
+def cota(page):
+    dibujar_plano(page)
+    page.insert_text((page.rect.width / 3, page.rect.height / 3), "2.35", fontsize=5)
+
+
+def linea(page):
+    dibujar_plano(page)
+    x, y = page.rect.width / 4, page.rect.height / 4
+    page.draw_line((x, y), (x + 60, y), width=0.3)
+
+
+@pytest.fixture
+def documentos(crear_pdf):
+    original = crear_pdf("a.pdf", [dibujar_plano] * 4)
+    nuevo = crear_pdf("b.pdf", [lambda page: dibujar_plano(page, rev="B"), punto, cota, linea])
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(nuevo) as doc_b:
+        yield doc_a, doc_b
+
+
+def manchas_perdidas(completa: np.ndarray | None, adaptativa: np.ndarray | None) -> int:
+    """Blobs of the full-page mask with no pixel in the adaptive mask."""
+    if completa is None:
+        return 0
+    n, etiquetas = cv2.connectedComponents(completa.astype(np.uint8))
+    encontradas = set(np.unique(etiquetas[adaptativa > 0])) if adaptativa is not None else set()
+    return sum(1 for k in range(1, n) if k not in encontradas)
+
+
+@pytest.mark.parametrize("dpi, dpi_previo", [(200, 72), (300, 72), (300, 50)])
+@pytest.mark.parametrize("indice", range(4))
+def test_encuentra_todos_los_cambios_de_la_pagina_completa(documentos, indice, dpi, dpi_previo):
+    doc_a, doc_b = documentos
+    completa = fc.comparar_pagina(doc_a, doc_b, indice, "raster", False, dpi)
+    adaptativa = fc.procesar_hoja_adaptativa(doc_a, doc_b, indice, dpi, dpi_previo)
+    
+    for mascara_completa, mascara_adaptativa in zip(completa.mascaras(), adaptativa.mascaras()):
+        assert manchas_perdidas(mascara_completa, mascara_adaptativa) == 0
+
+
+def test_detecta_la_letra_de_revision(documentos):
+    doc_a, doc_b = documentos
+    assert fc.comparar_pagina(doc_a, doc_b, 0, "raster", False, 300).tiene_cambios
+    assert fc.procesar_hoja_adaptativa(doc_a, doc_b, 0, 300, 72).tiene_cambios
+
+
+def test_el_fondo_es_la_pagina_a_resolucion_completa(documentos):
+    doc_a, doc_b = documentos
+    adaptativa = fc.procesar_hoja_adaptativa(doc_a, doc_b, 1, 200, 72)
+    
+    np.testing.assert_array_equal(adaptativa.fondo, fc.comparar_pagina(doc_a, doc_b, 1, "raster", False, 200).fondo)
+
+
+@pytest.mark.parametrize("paginas_salida, fondo_completo", [("todas", True), ("cambiadas", False), ("marcador", False)])
+def test_sin_cambios_no_renderiza_la_nueva_a_resolucion_completa(config, crear_pdf, monkeypatch, paginas_salida, fondo_completo):
+    config.paginas_salida = paginas_salida
+    original = crear_pdf("a.pdf", [dibujar_plano])
+    regiones, paginas = [], []
+    renderizar_pagina = fc.DocumentoPDF.renderizar_pagina
+    
+    def espiar_pagina(doc, indice, dpi=None, gris=None):
+        paginas.append(dpi)
+        return renderizar_pagina(doc, indice, dpi, gris)
+    
+    monkeypatch.setattr(fc.DocumentoPDF, "renderizar_region", lambda *args: regiones.append(args))
+    monkeypatch.setattr(fc.DocumentoPDF, "renderizar_pagina", espiar_pagina)
+    
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(original) as doc_b:
+        resultado = fc.procesar_hoja_adaptativa(doc_a, doc_b, 0, 300, 72)
+        ancho, alto = doc_a.tamano_pagina(0, 300)
+    
+    assert not resultado.tiene_cambios
+    assert resultado.fondo.shape == (alto, ancho)
+    assert regiones == []
+    # Only the background of a page that is written is rendered at full resolution
+    assert paginas == [72, 72, 300] if fondo_completo else paginas == [72, 72]
@@ -0,0 +1,96 @@
+"""Pairing by content fingerprint (HuellaContenido, SimilitudContenido)."""
+from __future__ import annotations
+
+import os
+import random
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano
+
+HOJAS = 14  # More than CANDIDATOS_POR_ORIGEN, so candidates come from the indices
+
+
+def escanear(ruta):
+    """Replace a PDF by an image-only copy of it (no text layer)."""
+    original = fitz.open(ruta)
+    copia = fitz.open()
+    for page in original:
+        nueva = copia.new_page(width=page.rect.width, height=page.rect.height)
+        nueva.insert_image(nueva.rect, pixmap=page.get_pixmap(dpi=100))
+    original.close()
+    copia.save(ruta)
+
+
+@pytest.fixture
+def revision_renombrada(crear_pdf, tmp_path):
+    """Source sheets and their next revision under unrelated names; returns the true pairs."""
+    nombres = random.Random(3).sample(range(10000, 99999), HOJAS)
+    pares = {}
+    for hoja, nombre in enumerate(nombres):
+        origen = crear_pdf(f"origen/TN-ARQ-{hoja:03d}.pdf", [lambda page, s=hoja: dibujar_plano(page, semilla=s)])
+        destino = crear_pdf(f"destino/entrega_{nombre}.pdf", [lambda page, s=hoja: dibujar_plano(page, semilla=s, rev="B")])
+        if hoja == 3:
+            escanear(origen)
+            escanear(destino)
+        pares[origen.name] = destino.name
+    return tmp_path / "origen", tmp_path / "destino", pares
+
+
+def emparejar(origen, destino, estrategia):
+    resultados = fc.comparar_listas_completo(fc.procesar_carpeta(origen), fc.procesar_carpeta(destino), 0.5, estrategia)
+    return {r["origen"]["clave"]: r["destino"]["clave"] for r in resultados if r["tipo"] == "match"}
+
+
+@pytest.mark.parametrize("estrategia", ["contenido", "combinada"])
+def test_empareja_archivos_renombrados(revision_renombrada, estrategia):
+    origen, destino, pares = revision_renombrada
+    assert emparejar(origen, destino, estrategia) == pares
+
+
+def test_por_nombre_no_los_encuentra(revision_renombrada):
+    origen, destino, pares = revision_renombrada
+    emparejados = emparejar(origen, destino, "nombre")
+    assert sum(emparejados.get(clave) == valor for clave, valor in pares.items()) < HOJAS // 2
+
+
+def test_preseleccion_incluye_la_mejor_pareja(revision_renombrada):
+    origen, destino, _ = revision_renombrada
+    contenido = fc.SimilitudContenido(fc.procesar_carpeta(origen), fc.procesar_carpeta(destino))
+    for i in range(HOJAS):
+        similitudes = [contenido.similitud(i, j) for j in range(HOJAS)]
+        assert int(np.argmax(similitudes)) in contenido.candidatos(i, fc.CANDIDATOS_POR_ORIGEN)
+
+
+def test_hash_estable_con_la_resolucion():
+    pagina = np.full((842, 1191), 255, dtype=np.uint8)
+    rnd = np.random.default_rng(0)
+    for x, y, w, h in rnd.integers(20, 600, size=(40, 4)):
+        cv2.rectangle(pagina, (int(x), int(y)), (int(x + w), int(y + h // 2)), 0, 3)
+    
+    grande = fc.hash_diferencias(cv2.resize(pagina, (512, 362), interpolation=cv2.INTER_AREA))
+    pequena = fc.hash_diferencias(cv2.resize(pagina, (256, 181), interpolation=cv2.INTER_AREA))
+    otra = fc.hash_diferencias(np.ascontiguousarray(pagina[::-1, ::-1]))
+    assert (grande ^ pequena).bit_count() <= 4
+    assert (grande ^ otra).bit_count() > 16
+
+
+def test_huellas_en_cache_hasta_que_cambia_el_archivo(crear_pdf, monkeypatch):
+    ruta = crear_pdf("carpeta/plano.pdf", [dibujar_plano])
+    calculadas = []
+    calcular = fc.huella_contenido
+    monkeypatch.setattr(fc, "huella_contenido", lambda r: calculadas.append(r) or calcular(r))
+    
+    primera = fc.huellas_contenido(fc.procesar_carpeta(ruta.parent))
+    fc._cache_huellas = None  # As in a new run: read back from the file
+    assert fc.huellas_contenido(fc.procesar_carpeta(ruta.parent)) == primera
+    assert len(calculadas) == 1
+    
+    os.utime(ruta, (1, 1))
+    fc.huellas_contenido(fc.procesar_carpeta(ruta.parent))
+    assert len(calculadas) == 2
+    assert primera[0].paginas == 1 and "rev" in primera[0].texto
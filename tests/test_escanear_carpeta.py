@@ -0,0 +1,105 @@
+"""Folder scanning (escanear_carpeta) and the file keys of nested folders (procesar_carpeta)."""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import pytest
+
+import funciones_comparador as fc
+
+
+def crear_arbol(raiz: Path, archivos: list[str]) -> Path:
+    """Create small files at the given relative paths; each holds as many bytes as its path has characters."""
+    for relativa in archivos:
+        ruta = raiz / relativa
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_bytes(b"x" * len(relativa))
+    return raiz
+
+
+@pytest.fixture
+def arbol(tmp_path) -> Path:
+    raiz = crear_arbol(tmp_path / "proyecto", [
+        "A-101.pdf", "A-102.PDF", "notas.txt",
+        "estructura/E-201.pdf", "estructura/E-201.dwg",
+        "estructura/detalles/E-301.pdf",
+        "instalaciones/A-101.pdf",
+        ".cache_paginas/A-101.pdf",
+    ])
+    # A link back to the project root would loop
+    os.symlink(raiz, raiz / "estructura" / "enlace")
+    return raiz
+
+
+def relativas(raiz: Path, **kwargs) -> list[str]:
+    return [archivo.relativa for archivo in fc.escanear_carpeta(raiz, **kwargs)]
+
+
+def test_solo_la_carpeta(arbol):
+    assert sorted(relativas(arbol)) == ["A-101.pdf", "A-102.PDF"]
+
+
+def test_recursivo(arbol):
+    # Depth first, subfolders in name order; hidden folders and links are skipped
+    encontrados = relativas(arbol, recursivo=True)
+    assert sorted(encontrados[:2]) == ["A-101.pdf", "A-102.PDF"]
+    assert encontrados[2:] == [
+        "estructura/E-201.pdf", "estructura/detalles/E-301.pdf", "instalaciones/A-101.pdf",
+    ]
+
+
+@pytest.mark.parametrize("patrones, esperados", [
+    (["*"], ["A-101.pdf", "A-102.PDF", "notas.txt"]),
+    (["*.DWG", "*.txt"], ["notas.txt"]),
+    (["a-1*"], ["A-101.pdf", "A-102.PDF"]),
+])
+def test_patrones_sin_distinguir_mayusculas(arbol, patrones, esperados):
+    assert sorted(relativas(arbol, patrones=patrones)) == esperados
+
+
+def test_datos_del_archivo(arbol):
+    [archivo] = [a for a in fc.escanear_carpeta(arbol, recursivo=True) if a.nombre == "E-301.pdf"]
+
+    assert Path(archivo.ruta) == arbol / "estructura" / "detalles" / "E-301.pdf"
+    assert archivo.tamano == len("estructura/detalles/E-301.pdf")
+    assert archivo.modificado == os.stat(archivo.ruta).st_mtime
+
+
+def test_entrega_los_archivos_sobre_la_marcha(arbol, monkeypatch):
+    # The first file is yielded before any subfolder is listed
+    abiertas = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, "scandir", lambda ruta: abiertas.append(ruta) or scandir(ruta))
+
+    next(fc.escanear_carpeta(arbol, recursivo=True))
+    assert abiertas == [os.fspath(arbol)]
+
+
+def test_claves_de_carpetas_anidadas(config, arbol):
+    config.recorrer_subcarpetas = True
+    config.filtro_archivos = "*.pdf; *.dwg"
+
+    archivos = fc.procesar_carpeta(arbol)
+
+    assert sorted(archivos) == [
+        "A-101.pdf", "A-102.PDF", "estructura/E-201.dwg", "estructura/E-201.pdf",
+        "estructura/detalles/E-301.pdf", "instalaciones/A-101.pdf",
+    ]
+    # Equal names in different subfolders keep apart
+    assert archivos["A-101.pdf"]["valor"] != archivos["instalaciones/A-101.pdf"]["valor"]
+    assert archivos["instalaciones/A-101.pdf"]["valor"].startswith("instalaciones/")
+    assert archivos["estructura/detalles/E-301.pdf"]["path"] == str(arbol / "estructura" / "detalles" / "E-301.pdf")
+
+
+def test_empareja_dentro_de_la_misma_subcarpeta(tmp_path):
+    nombres = ["A-101.pdf", "estructura/A-101.pdf", "instalaciones/A-101.pdf"]
+    origen = fc.procesar_carpeta(crear_arbol(tmp_path / "rev1", nombres), recursivo=True)
+    destino = fc.procesar_carpeta(crear_arbol(tmp_path / "rev2", nombres), recursivo=True)
+
+    parejas = {
+        registro["origen"]["clave"]: registro["destino"]["clave"]
+        for registro in fc.comparar_listas_completo(origen, destino, estrategia="nombre")
+        if registro["tipo"] == "match"
+    }
+    assert parejas == {nombre: nombre for nombre in nombres}
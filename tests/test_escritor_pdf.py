@@ -0,0 +1,104 @@
+"""Comparison PDF writer (EscritorPDF): encodings and partial output."""
+from __future__ import annotations
+
+import fitz
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano, pagina_gris
+
+
+def dibujar(page: fitz.Page, nuevo: bool = False) -> None:
+    """A small sheet; the new version adds a circle."""
+    page.draw_rect(fitz.Rect(50, 50, 300, 150), color=(0, 0, 0), width=2)
+    page.insert_text((60, 300), "PLANTA BAJA", fontsize=30)
+    if nuevo:
+        page.draw_circle((450, 200), 40, color=(0, 0, 0), width=3)
+
+
+def pdf_rotado(ruta, rotacion: int, nuevo: bool = False):
+    doc = fitz.open()
+    page = doc.new_page(width=600, height=400)
+    dibujar(page, nuevo)
+    page.set_cropbox(fitz.Rect(10, 20, 590, 370))
+    page.set_rotation(rotacion)
+    doc.save(ruta)
+    doc.close()
+    return ruta
+
+
+def escribir(ruta, resultados, codificacion: str, original=None, dpi: int = 72) -> None:
+    with fc.EscritorPDF(ruta, codificacion, original=original, dpi=dpi) as escritor:
+        for resultado in resultados:
+            escritor.agregar_resultado(resultado)
+
+
+@pytest.mark.parametrize("dpi", [72, 100])
+@pytest.mark.parametrize("rotacion", [0, 90, 180, 270])
+def test_vectorial_sigue_la_rotacion_de_la_pagina(tmp_path, rotacion, dpi):
+    original = pdf_rotado(tmp_path / "a.pdf", rotacion)
+    nuevo = pdf_rotado(tmp_path / "b.pdf", rotacion, nuevo=True)
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(nuevo) as doc_b:
+        resultado = fc.comparar_pagina(doc_a, doc_b, 0, "raster", False, dpi)
+    assert resultado.tiene_cambios
+
+    escribir(tmp_path / "mascaras.pdf", [resultado], "mascaras")
+    escribir(tmp_path / "vectorial.pdf", [resultado], "vectorial", original, dpi)
+
+    raster, vectorial = pagina_gris(tmp_path / "mascaras.pdf"), pagina_gris(tmp_path / "vectorial.pdf")
+    assert vectorial.shape == raster.shape == resultado.fondo.shape
+    # Same drawing under the same highlights; only anti-aliasing differs
+    assert np.abs(vectorial - raster).mean() < 0.1
+
+
+def pagina_rgb(ruta) -> np.ndarray:
+    """First page of a PDF rendered in RGB at 72 DPI (one pixel per point)."""
+    with fitz.open(ruta) as doc:
+        pixmap = doc[0].get_pixmap(colorspace=fitz.csRGB, alpha=False)
+        return np.frombuffer(pixmap.samples, np.uint8).reshape(pixmap.h, pixmap.w, 3).astype(int)
+
+
+def revision(page):
+    """A sheet with a new note and a new box."""
+    dibujar_plano(page)
+    page.insert_text((500, 400), "VER DETALLE 4", fontsize=14)
+    page.draw_rect(fitz.Rect(300, 300, 420, 380), color=(0, 0, 0), width=0.5)
+
+
+@pytest.fixture(params=["cambios", "sin_cambios"])
+def resultado(request, config, crear_pdf):
+    """Result of comparing a sheet with its revision at 100 DPI, or of a page without changes."""
+    config.prealineacion = True
+    original, nuevo = crear_pdf("a.pdf", [dibujar_plano]), crear_pdf("b.pdf", [revision])
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(nuevo) as doc_b:
+        if request.param == "sin_cambios":
+            return fc.procesar_hoja_sin_cambios(doc_a.renderizar_pagina(0, 100, gris=True), 1)
+        resultado = fc.comparar_pagina(doc_a, doc_b, 0, "raster", False, 100)
+    assert resultado.tiene_cambios
+    return resultado
+
+
+@pytest.mark.parametrize("codificacion, diferencia_maxima", [("paleta", 0), ("mascaras", 1)])
+def test_codificacion_como_la_pagina_compuesta(tmp_path, resultado, codificacion, diferencia_maxima):
+    compuesta = resultado.componer().astype(int)
+    escribir(tmp_path / "salida.pdf", [resultado], codificacion)
+
+    # Lossless: the palette is exact; the faded background of "mascaras" may be one gray level off
+    assert np.abs(pagina_rgb(tmp_path / "salida.pdf") - compuesta).max() <= diferencia_maxima
+    # The JPEG encoding is only close
+    escribir(tmp_path / "jpeg.pdf", [resultado], "jpeg")
+    assert np.abs(pagina_rgb(tmp_path / "jpeg.pdf") - compuesta).mean() < 1
+
+
+@pytest.mark.parametrize("codificacion", ["paleta", "mascaras"])
+def test_compresion_y_tamano(tmp_path, resultado, codificacion):
+    tamanos = {}
+    for nivel in (1, 9):
+        ruta = tmp_path / f"{codificacion}_{nivel}.pdf"
+        with fc.EscritorPDF(ruta, codificacion, nivel) as escritor:
+            escritor.agregar_resultado(resultado)
+        tamanos[nivel] = ruta.stat().st_size
+    escribir(tmp_path / "jpeg.pdf", [resultado], "jpeg")
+
+    assert tamanos[9] < tamanos[1] < (tmp_path / "jpeg.pdf").stat().st_size
@@ -0,0 +1,80 @@
+"""Connected-component noise removal (limpiar_ruido_mascara, area_componentes) against the per-contour loop."""
+from __future__ import annotations
+
+import cv2
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+
+
+def limpiar_por_contorno(mask: np.ndarray, min_area: int) -> np.ndarray:
+    """Previous implementation: contourArea and drawContours once per blob."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    mask_clean = np.zeros_like(mask)
+    for cnt in contours:
+        if cv2.contourArea(cnt) > min_area:
+            cv2.drawContours(mask_clean, [cnt], -1, 255, -1)
+    return mask_clean
+
+
+def mascara_ruidosa(semilla: int, alto: int = 600, ancho: int = 800) -> np.ndarray:
+    """Speckle, thin strokes, rings with holes and blobs touching the border."""
+    rng = np.random.default_rng(semilla)
+    mask = ((rng.random((alto, ancho)) > 0.97) * 255).astype(np.uint8)
+    for _ in range(40):
+        x, y = int(rng.integers(-20, ancho)), int(rng.integers(-20, alto))
+        cv2.line(mask, (x, y), (x + int(rng.integers(-60, 60)), y + int(rng.integers(-60, 60))), 255, int(rng.integers(1, 4)))
+        cv2.circle(mask, (x, y), int(rng.integers(2, 30)), 255, int(rng.integers(1, 3)))
+    return mask
+
+
+@pytest.mark.parametrize("min_area", [0, 1, 5, 15, 60])
+@pytest.mark.parametrize("semilla", range(4))
+def test_igual_que_por_contorno(semilla, min_area):
+    mask = mascara_ruidosa(semilla)
+    np.testing.assert_array_equal(fc.limpiar_ruido_mascara(mask, min_area), limpiar_por_contorno(mask, min_area))
+
+
+def test_areas_como_contour_area():
+    mask = mascara_ruidosa(7)
+    relleno = cv2.copyMakeBorder(mask, 1, 1, 1, 1, cv2.BORDER_CONSTANT, value=0)
+    contours, _ = cv2.findContours(relleno, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cv2.drawContours(relleno, contours, -1, 255, -1)
+    n_etiquetas, etiquetas = cv2.connectedComponents(relleno, connectivity=8, ltype=cv2.CV_32S)
+    
+    areas = fc.area_componentes(relleno, etiquetas, n_etiquetas)
+    
+    for contorno in contours:
+        x, y = contorno[0, 0]
+        assert areas[etiquetas[y, x]] == cv2.contourArea(contorno)
+
+
+def test_rellena_huecos_y_bordes():
+    mask = np.zeros((80, 80), dtype=np.uint8)
+    cv2.rectangle(mask, (10, 10), (50, 40), 255, 1)  # Closed outline: filled
+    cv2.rectangle(mask, (0, 60), (30, 79), 255, 1)  # Closed along the image border: filled
+    cv2.line(mask, (60, 5), (75, 5), 255, 1)  # Open stroke: no area
+    
+    limpia = fc.limpiar_ruido_mascara(mask, 15)
+    
+    assert limpia[25, 30] == 255 and limpia[70, 10] == 255
+    assert not limpia[5, 60:76].any()
+    np.testing.assert_array_equal(limpia, limpiar_por_contorno(mask, 15))
+
+
+def test_grupos_dentro_de_otra_ventana():
+    mask = np.zeros((400, 400), dtype=np.uint8)
+    cv2.polylines(mask, [np.array([[20, 20], [20, 380], [380, 380], [380, 20]])], False, 255, 2)  # Open U
+    cv2.rectangle(mask, (150, 150), (250, 250), 255, 1)  # Closed square inside the U's window
+    cv2.circle(mask, (300, 100), 1, 255, -1)  # Speck inside the U's window
+    
+    limpia = fc.limpiar_ruido_mascara(mask, 15)
+    
+    assert limpia[200, 200] == 255 and limpia[100, 100] == 0 and limpia[100, 300] == 0
+    np.testing.assert_array_equal(limpia, limpiar_por_contorno(mask, 15))
+
+
+def test_mascara_vacia():
+    mask = np.zeros((50, 60), dtype=np.uint8)
+    np.testing.assert_array_equal(fc.limpiar_ruido_mascara(mask, 15), mask)
@@ -0,0 +1,87 @@
+"""Vector comparison engine (procesar_hoja_vectorial) against the raster engine."""
+from __future__ import annotations
+
+import cv2
+import fitz
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano
+
+DPI = 150
+# Whole pixels at DPI, so the shifted sheet renders exactly like the original one
+DESPLAZAMIENTO = (7.2, -4.8)
+NOTA = fitz.Rect(500, 386, 610, 400)
+
+
+@pytest.fixture
+def config(config):
+    # The raster engine compares sheets in place; the quick alignment tier finds that
+    config.prealineacion = True
+    return config
+
+
+def revision(page, desplazamiento=(0, 0)):
+    """Revision B of the sheet, with a new note."""
+    dibujar_plano(page, rev="B", desplazamiento=desplazamiento)
+    page.insert_text((NOTA.x0 + desplazamiento[0], NOTA.y1 + desplazamiento[1]), "VER DETALLE 4", fontsize=14)
+
+
+def escaneo(page):
+    """The revision as a scanned image: no vector content."""
+    origen = fitz.open()
+    revision(origen.new_page(width=page.rect.width, height=page.rect.height))
+    page.insert_image(page.rect, pixmap=origen[0].get_pixmap(dpi=100, colorspace=fitz.csGRAY))
+
+
+@pytest.fixture
+def documentos(crear_pdf):
+    original = crear_pdf("a.pdf", [dibujar_plano] * 3)
+    nuevo = crear_pdf("b.pdf", [revision, lambda page: revision(page, DESPLAZAMIENTO), escaneo])
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(nuevo) as doc_b:
+        yield doc_a, doc_b
+
+
+def test_encuentra_los_cambios_del_motor_raster(documentos):
+    doc_a, doc_b = documentos
+    vectorial = fc.comparar_pagina(doc_a, doc_b, 0, "vectorial", False, DPI)
+    raster = fc.comparar_pagina(doc_a, doc_b, 0, "raster", False, DPI)
+
+    assert vectorial.alineacion == "vectorial"
+    verde_vectorial, magenta_vectorial = vectorial.mascaras()
+    verde_raster, _ = raster.mascaras()
+    assert magenta_vectorial is None
+
+    n, etiquetas = cv2.connectedComponents(verde_raster.astype(np.uint8), connectivity=8)
+    assert set(np.unique(etiquetas[verde_vectorial > 0])) >= set(range(1, n))
+    # The new note, in pixels
+    x0, y0, x1, y1 = (int(v * DPI / 72) for v in NOTA)
+    assert verde_vectorial[y0:y1, x0:x1].any()
+
+
+def test_pagina_desplazada_da_los_mismos_cambios(documentos):
+    doc_a, doc_b = documentos
+    en_su_sitio = fc.comparar_pagina(doc_a, doc_b, 0, "vectorial", False, DPI)
+    desplazada = fc.comparar_pagina(doc_a, doc_b, 1, "vectorial", False, DPI)
+
+    assert desplazada.alineacion == "vectorial"
+    for mascara_desplazada, mascara_en_su_sitio in zip(desplazada.mascaras(), en_su_sitio.mascaras()):
+        np.testing.assert_array_equal(mascara_desplazada, mascara_en_su_sitio)
+
+
+def test_diferenciar_primitivas(documentos):
+    doc_a, doc_b = documentos
+    eliminadas, agregadas, (dx, dy) = fc.diferenciar_primitivas(doc_a.primitivas_pagina(0), doc_b.primitivas_pagina(1))
+
+    assert (dx, dy) == pytest.approx(DESPLAZAMIENTO, abs=0.01)
+    assert {p[0] for p in agregadas.palabras} == {"VER", "DETALLE", "4", "B"}
+    assert [p[0] for p in eliminadas.palabras] == ["A"]
+
+
+def test_escaneo_usa_el_motor_raster(documentos):
+    doc_a, doc_b = documentos
+    assert doc_b.primitivas_pagina(2) is None
+
+    resultado = fc.comparar_pagina(doc_a, doc_b, 2, "vectorial", False, DPI)
+    assert resultado is not None and resultado.alineacion != "vectorial"
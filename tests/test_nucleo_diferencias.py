@@ -0,0 +1,90 @@
+"""Diff kernel (NucleoDiferencias) against the separate full-frame passes it replaced."""
+from __future__ import annotations
+
+import cv2
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from benchmarks.bench_nucleo_diferencias import diferencias_por_pasadas, pagina_sintetica
+
+
+def par_modificado(
+    semilla: int, 
+    motas: int = 200, 
+    ancho: int = 1400, 
+    alto: int = 1000
+) -> tuple[np.ndarray, np.ndarray]:
+    """A drawing and a revision of it: a few local edits and some scanner-like speckle."""
+    base = pagina_sintetica(ancho, alto, semilla)
+    nueva = base.copy()
+    rng = np.random.default_rng(semilla)
+    for _ in range(3):
+        x, y = int(rng.integers(0, ancho - 200)), int(rng.integers(0, alto - 100))
+        cv2.putText(nueva, "NOTA", (x, y + 60), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+        nueva[y:y + 40, x + 100:x + 180] = 255
+    puntos = rng.integers(0, [alto, ancho], size=(motas, 2))
+    nueva[puntos[:, 0], puntos[:, 1]] = rng.integers(0, 200, size=motas)
+    return base, nueva
+
+
+@pytest.mark.parametrize("ajustes", [
+    {}, 
+    {"usar_blur": False}, 
+    {"umbral_bin": 120, "kernel_size": 5, "iteraciones": 1}, 
+    {"bloque_sin_cambios": 0},
+])
+@pytest.mark.parametrize("semilla", range(3))
+def test_igual_que_por_pasadas(config, ajustes, semilla):
+    for clave, valor in ajustes.items():
+        setattr(config, clave, valor)
+    base, nueva = par_modificado(semilla)
+    
+    nucleo = fc.obtener_nucleo_diferencias()
+    verde, magenta = nucleo.mascaras(base, nueva, fc.get_min_contour_area())
+    resultado = nucleo.componer(base, verde, magenta)
+    
+    np.testing.assert_array_equal(resultado, diferencias_por_pasadas(base, nueva))
+
+
+def test_buffers_reutilizados_no_arrastran_la_pagina_anterior():
+    nucleo = fc.obtener_nucleo_diferencias()
+    base, nueva = par_modificado(0)
+    nucleo.mascaras(base, nueva, 15)
+    
+    otra_base, otra_nueva = par_modificado(1)
+    verde, magenta = nucleo.mascaras(otra_base, otra_nueva, 15)
+    assert cv2.countNonZero(verde) + cv2.countNonZero(magenta) > 0
+    np.testing.assert_array_equal(nucleo.componer(otra_base, verde, magenta), diferencias_por_pasadas(otra_base, otra_nueva))
+
+
+@pytest.mark.parametrize("bloque", [32, 64, 128])
+@pytest.mark.parametrize("ajustes", [
+    {}, 
+    {"usar_blur": False}, 
+    {"umbral_bin": 20, "kernel_size": 5, "iteraciones": 3}, 
+    {"kernel_size": 4, "iteraciones": 1},
+])
+def test_omitir_bloques_sin_cambios_es_exacto(config, bloque, ajustes):
+    for clave, valor in ajustes.items():
+        setattr(config, clave, valor)
+    nucleo = fc.obtener_nucleo_diferencias()
+    
+    # Local edits only (blocks skipped), and with speckle all over the page (few or no blocks skipped)
+    for semilla, motas in ((0, 0), (1, 0), (2, 0), (0, 200)):
+        base, nueva = par_modificado(semilla, motas)
+        config.bloque_sin_cambios = 0
+        esperadas = [m.copy() for m in nucleo.mascaras(base, nueva, 15)]
+        config.bloque_sin_cambios = bloque
+        obtenidas = nucleo.mascaras(base, nueva, 15)
+        
+        assert nucleo.area_omitida > 0 or motas
+        for obtenida, esperada in zip(obtenidas, esperadas):
+            np.testing.assert_array_equal(obtenida, esperada)
+
+
+def test_pagina_escaneada_usa_la_pagina_completa():
+    base = pagina_sintetica(1400, 1000, 0)
+    ruido = np.random.default_rng(0).integers(-3, 4, size=base.shape)
+    nueva = np.clip(base.astype(int) + ruido, 0, 255).astype(np.uint8)
+    assert fc.obtener_nucleo_diferencias().regiones_con_cambios(base, nueva, 64) is None
@@ -0,0 +1,62 @@
+"""Page content fingerprints (huella_pagina, detectar_paginas_identicas)."""
+from __future__ import annotations
+
+import shutil
+
+import fitz
+import numpy as np
+
+import funciones_comparador as fc
+from conftest import dibujar_plano
+
+
+def plano(semilla, rev="A"):
+    return lambda page: dibujar_plano(page, semilla=semilla, rev=rev)
+
+
+def con_imagen(valor):
+    """A sheet with an embedded image, drawn with the same content stream whatever the pixels."""
+    def dibujar(page):
+        pixeles = np.full((40, 40, 3), valor, dtype=np.uint8)
+        pix = fitz.Pixmap(fitz.csRGB, 40, 40, pixeles.tobytes(), False)
+        page.insert_image(fitz.Rect(100, 100, 300, 300), pixmap=pix)
+    return dibujar
+
+
+def renders_iguales(ruta_a, ruta_b, indice):
+    with fitz.open(ruta_a) as doc_a, fitz.open(ruta_b) as doc_b:
+        return doc_a[indice].get_pixmap(dpi=50).samples == doc_b[indice].get_pixmap(dpi=50).samples
+
+
+def test_paginas_identicas_en_otro_archivo(crear_pdf, tmp_path):
+    original = crear_pdf("a.pdf", [plano(1), plano(2), plano(3)])
+    # Same pages 0 and 2 written in another order, so their objects get other numbers
+    doc = fitz.open()
+    for dibujar in (plano(3), plano(2, rev="B"), plano(1)):
+        dibujar(doc.new_page(width=1191, height=842))
+    doc.move_page(2, 0)
+    doc.move_page(2, 1)
+    nuevo = tmp_path / "b.pdf"
+    doc.save(nuevo, garbage=4)
+    
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(nuevo) as doc_b:
+        identicas = fc.detectar_paginas_identicas(doc_a, doc_b)
+    
+    assert identicas == {0, 2}
+    assert all(renders_iguales(original, nuevo, i) for i in identicas)
+    assert not renders_iguales(original, nuevo, 1)
+
+
+def test_copia_exacta(crear_pdf, tmp_path):
+    original = crear_pdf("a.pdf", [plano(1), plano(2)])
+    copia = tmp_path / "copia.pdf"
+    shutil.copy(original, copia)
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(copia) as doc_b:
+        assert fc.detectar_paginas_identicas(doc_a, doc_b) == {0, 1}
+
+
+def test_recursos_distintos_con_el_mismo_contenido(crear_pdf):
+    original = crear_pdf("a.pdf", [con_imagen(0)])
+    nuevo = crear_pdf("b.pdf", [con_imagen(200)])
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(nuevo) as doc_b:
+        assert fc.detectar_paginas_identicas(doc_a, doc_b) == set()
@@ -0,0 +1,58 @@
+"""Pruned pattern detection (detectar_mejor_patron) against the pairwise SequenceMatcher loop."""
+from __future__ import annotations
+
+import random
+from difflib import SequenceMatcher
+
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from benchmarks.bench_emparejamiento import carpetas_sinteticas, patron_por_pares
+
+
+def subsecuencia_comun(a: str, b: str) -> int:
+    """Longest common subsequence by dynamic programming."""
+    fila = [0] * (len(b) + 1)
+    for ca in a:
+        anterior = 0
+        for j, cb in enumerate(b, start=1):
+            anterior, fila[j] = fila[j], anterior + 1 if ca == cb else max(fila[j], fila[j - 1])
+    return fila[-1]
+
+
+def textos_aleatorios(n: int, semilla: int, max_longitud: int = 90) -> list[str]:
+    rng = random.Random(semilla)
+    return ["".join(rng.choice("abcñé-_0123") for _ in range(rng.randint(0, max_longitud))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("semilla", range(3))
+def test_subsecuencia_exacta_hasta_64_y_cota_despues(semilla):
+    textos = textos_aleatorios(25, semilla)
+    codigos, _ = fc.indice_caracteres(textos)
+    
+    for i, base in enumerate(textos):
+        cotas = fc.cota_subsecuencia_comun(codigos[i, :len(base)], codigos)
+        for otro, cota in zip(textos, cotas.tolist()):
+            exacta = subsecuencia_comun(base, otro)
+            coincidencias = sum(bloque.size for bloque in SequenceMatcher(None, base, otro).get_matching_blocks())
+            assert cota == exacta if len(base) <= 64 else cota >= exacta
+            assert coincidencias <= cota
+
+
+@pytest.mark.parametrize("umbral", [0.5, 0.7, 0.9])
+@pytest.mark.parametrize("esquema", list(carpetas_sinteticas(1)))
+def test_igual_que_por_pares(esquema, umbral):
+    nombres = carpetas_sinteticas(150, semilla=2)[esquema]
+    assert fc.detectar_mejor_patron(nombres, umbral) == patron_por_pares(nombres, umbral)
+
+
+@pytest.mark.parametrize("nombres", [
+    [], 
+    ["unico.pdf"], 
+    ["", "", "a.pdf"], 
+    ["Planta baja ñandú.pdf", "Planta baja ñandú R1.pdf", "Fachada.pdf"], 
+    textos_aleatorios(60, 9, max_longitud=20),
+])
+def test_casos_limite(nombres):
+    assert fc.detectar_mejor_patron(nombres, 0.6) == patron_por_pares(nombres, 0.6)
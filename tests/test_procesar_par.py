@@ -0,0 +1,182 @@
+"""Comparison of a document pair end to end (procesar_par_de_archivos)."""
+from __future__ import annotations
+
+import json
+
+import fitz
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano, registro
+
+
+@pytest.fixture
+def config(config):
+    config.dpi = 72
+    return config
+
+
+@pytest.fixture
+def par(crear_pdf):
+    """Six sheets; the new version changes the revision letter of sheets 2 and 5."""
+    original = crear_pdf("a/plano.pdf", [lambda page, n=n: dibujar_plano(page, semilla=n) for n in range(6)])
+    nuevo = crear_pdf("b/plano.pdf", [
+        lambda page, n=n: dibujar_plano(page, semilla=n, rev="B" if n in (1, 4) else "A") for n in range(6)
+    ])
+    return original, nuevo
+
+
+# Note added by the revisions and its box, in points (pixels of the comparison page at 72 DPI)
+TEXTO_NOTA = "VER DETALLE 4"
+NOTA = fitz.Rect(560, 404, 560 + fitz.get_text_length(TEXTO_NOTA, fontsize=14), 414)
+
+
+def revision(page, semilla: int) -> None:
+    """The sheet with a new note."""
+    dibujar_plano(page, semilla=semilla)
+    page.insert_text(NOTA.bl, TEXTO_NOTA, fontsize=14)
+
+
+@pytest.fixture
+def revisiones(crear_pdf):
+    """Five sheets; the new version adds a note to sheets 2 and 5 and adds a sixth sheet."""
+    original = crear_pdf("a/plano.pdf", [lambda page, n=n: dibujar_plano(page, semilla=n) for n in range(5)])
+    nuevo = crear_pdf("b/plano.pdf", [
+        lambda page, n=n: (revision if n in (1, 4) else dibujar_plano)(page, semilla=n) for n in range(6)
+    ])
+    return original, nuevo
+
+
+@pytest.fixture
+def documentos_abiertos(monkeypatch):
+    """Every document session opened by the comparison."""
+    abiertos = []
+    abrir = fc.abrir_documento
+
+    def espiar(ruta):
+        doc = abrir(ruta)
+        abiertos.append(doc)
+        return doc
+
+    monkeypatch.setattr(fc, "abrir_documento", espiar)
+    return abiertos
+
+
+def test_interrupcion_deja_pdf_parcial(config, par, tmp_path, monkeypatch, documentos_abiertos):
+    config.batch_size = 2
+    comparar = fc.comparar_hoja
+
+    def interrumpir_en_pagina_5(img_base, img_move, index, *args):
+        if index == 5:
+            raise KeyboardInterrupt
+        return comparar(img_base, img_move, index, *args)
+
+    monkeypatch.setattr(fc, "comparar_hoja", interrumpir_en_pagina_5)
+    salida = tmp_path / "salida"
+
+    with pytest.raises(KeyboardInterrupt):
+        fc.procesar_par_de_archivos(registro(*par), salida)
+
+    assert not (salida / "Comparativa_plano.pdf").exists()
+    with fitz.open(salida / "Comparativa_plano.parcial.pdf") as parcial:
+        assert len(parcial) == 4  # The two batches before the interrupted one
+    assert documentos_abiertos and all(doc._doc is None for doc in documentos_abiertos)
+
+
+def test_error_del_escritor_cierra_los_documentos(config, par, tmp_path, monkeypatch, documentos_abiertos):
+    def fallar(*args, **kwargs):
+        raise RuntimeError("cannot open the original")
+
+    monkeypatch.setattr(fc, "EscritorPDF", fallar)
+
+    assert not fc.procesar_par_de_archivos(registro(*par), tmp_path / "salida")
+    assert len(documentos_abiertos) == 2 and all(doc._doc is None for doc in documentos_abiertos)
+
+
+def test_indice_lista_las_paginas_que_cambian(config, revisiones, tmp_path):
+    config.indice_cambios = True
+    config.prealineacion = True
+    salida = tmp_path / "salida"
+
+    assert fc.procesar_par_de_archivos(registro(*revisiones), salida)
+    indice = json.loads((salida / "Comparativa_plano.json").read_text(encoding="utf-8"))
+
+    assert indice["paginas_con_cambios"] == [2, 5, 6]
+    assert (indice["original"], indice["nuevo"], indice["dpi"]) == (str(revisiones[0]), str(revisiones[1]), 72)
+    paginas = {pagina["pagina"]: pagina for pagina in indice["paginas"]}
+    assert sorted(paginas) == [1, 2, 3, 4, 5, 6]
+    assert [paginas[n]["pagina_salida"] for n in range(1, 7)] == [1, 2, 3, 4, 5, 6]
+
+    for n in (2, 5):
+        # One zone: the note, boxed to zone cells
+        assert paginas[n]["pixeles_anadidos"] > 0 and paginas[n]["pixeles_eliminados"] == 0
+        [zona] = paginas[n]["zonas"]
+        assert (NOTA.tl + NOTA.br) / 2 in fitz.Rect(zona)
+        assert fitz.Rect(zona) in NOTA + (-16, -16, 16, 16)
+    for n in (1, 3, 4):
+        assert not paginas[n]["cambios"] and paginas[n]["zonas"] == []
+        assert paginas[n]["pixeles_anadidos"] == paginas[n]["pixeles_eliminados"] == 0
+    # The sheet missing from the original is new as a whole
+    assert paginas[6]["pixeles_eliminados"] == 0 and len(paginas[6]["zonas"]) >= 1
+
+
+def test_sin_indice_de_cambios(config, revisiones, tmp_path):
+    config.indice_cambios = False
+    salida = tmp_path / "salida"
+
+    assert fc.procesar_par_de_archivos(registro(*revisiones), salida)
+    assert (salida / "Comparativa_plano.pdf").exists()
+    assert not (salida / "Comparativa_plano.json").exists()
+
+
+def test_zonas_de_cambio():
+    mascara = np.zeros((400, 600), bool)
+    mascara[100:110, 100:150] = True
+    mascara[140:150, 160:170] = True  # 30 px below the first change
+    mascara[300:340, 500:520] = True
+    empaquetada = np.packbits(mascara, axis=1)
+
+    # Boxes are exact to one 8 px cell, largest first
+    assert fc.zonas_de_cambio(empaquetada, (600, 400), 64) == [(96, 96, 176, 152), (496, 296, 520, 344)]
+    assert len(fc.zonas_de_cambio(empaquetada, (600, 400), 16)) == 3
+    assert fc.zonas_de_cambio(None, (600, 400), 30) == []
+
+
+@pytest.mark.parametrize("paginas_salida, textos", [
+    ("todas", [""] * 6),
+    ("cambiadas", ["Página 2", "Página 5", "Página 6"]),
+    ("marcador", ["Página 1: sin cambios", "", "Página 3: sin cambios", "Página 4: sin cambios", "", ""]),
+])
+def test_paginas_en_el_pdf_comparativo(config, revisiones, tmp_path, monkeypatch, paginas_salida, textos):
+    config.paginas_salida = paginas_salida
+    config.indice_cambios = True
+    config.prealineacion = True
+    renderizadas = []
+    sin_cambios = fc.procesar_hoja_sin_cambios
+    monkeypatch.setattr(fc, "procesar_hoja_sin_cambios", lambda *args: renderizadas.append(args[1]) or sin_cambios(*args))
+    salida = tmp_path / "salida"
+
+    assert fc.procesar_par_de_archivos(registro(*revisiones), salida)
+
+    with fitz.open(salida / "Comparativa_plano.pdf") as pdf:
+        assert [page.get_text().strip() for page in pdf] == textos
+    indice = json.loads((salida / "Comparativa_plano.json").read_text(encoding="utf-8"))
+    salidas = [pagina["pagina_salida"] for pagina in indice["paginas"]]
+    assert salidas == ([None, 1, None, None, 2, 3] if paginas_salida == "cambiadas" else [1, 2, 3, 4, 5, 6])
+    # Pages known to be identical are only rendered when the whole document is written
+    assert renderizadas == ([1, 3, 4] if paginas_salida == "todas" else [])
+
+
+def test_solo_cambios_sin_cambios_no_escribe_pdf(config, crear_pdf, tmp_path):
+    config.paginas_salida = "cambiadas"
+    config.indice_cambios = True
+    original = crear_pdf("a/plano.pdf", [lambda page, n=n: dibujar_plano(page, semilla=n) for n in range(3)])
+    nuevo = crear_pdf("b/plano.pdf", [lambda page, n=n: dibujar_plano(page, semilla=n) for n in range(3)])
+    salida = tmp_path / "salida"
+
+    assert fc.procesar_par_de_archivos(registro(original, nuevo), salida)
+    assert not (salida / "Comparativa_plano.pdf").exists()
+    indice = json.loads((salida / "Comparativa_plano.json").read_text(encoding="utf-8"))
+    assert indice["paginas_con_cambios"] == []
+    assert [pagina["pagina_salida"] for pagina in indice["paginas"]] == [None] * 3
@@ -0,0 +1,68 @@
+"""Tiled comparison (procesar_hoja_teselada) against the full-page comparison."""
+from __future__ import annotations
+
+import fitz
+import numpy as np
+import pytest
+
+import funciones_comparador as fc
+from conftest import dibujar_plano
+
+DPI = 100
+TESELA = 256
+
+
+@pytest.fixture
+def config(config):
+    # The sheets are not moved; the quick alignment tier finds that they are in place
+    config.prealineacion = True
+    return config
+
+
+def rectangulo(page):
+    """The sheet plus a new 300 x 400 pt outline across several tile borders."""
+    dibujar_plano(page)
+    page.draw_rect(fitz.Rect(150, 100, 450, 500), color=(0, 0, 0), width=1)
+
+
+def nota(page):
+    """The sheet plus a note near the centre."""
+    dibujar_plano(page)
+    page.insert_text((page.rect.width / 2, page.rect.height / 2), "VER DETALLE 4", fontsize=14)
+
+
+@pytest.fixture
+def documentos(crear_pdf):
+    original = crear_pdf("a.pdf", [dibujar_plano] * 2)
+    nuevo = crear_pdf("b.pdf", [rectangulo, nota, rectangulo])
+    with fc.DocumentoPDF(original) as doc_a, fc.DocumentoPDF(nuevo) as doc_b:
+        yield doc_a, doc_b
+
+
+@pytest.mark.parametrize("indice", range(3))
+def test_igual_que_la_pagina_completa(documentos, indice):
+    doc_a, doc_b = documentos
+    completa = fc.comparar_pagina(doc_a, doc_b, indice, "raster", False, DPI)
+    teselada = fc.procesar_hoja_teselada(doc_a, doc_b, indice, DPI, TESELA)
+
+    assert teselada.tiene_cambios
+    np.testing.assert_array_equal(teselada.fondo, completa.fondo)
+    for mascara_teselada, mascara_completa in zip(teselada.mascaras(), completa.mascaras()):
+        np.testing.assert_array_equal(mascara_teselada, mascara_completa)
+
+
+def test_rellena_el_rectangulo_que_cruza_teselas(documentos):
+    doc_a, doc_b = documentos
+    # Page 3 is missing from the base, so the whole outline is new and closed
+    verde, _ = fc.procesar_hoja_teselada(doc_a, doc_b, 2, DPI, TESELA).mascaras()
+
+    # Centre of the outline (300, 300 pt), a tile corner away from every edge of it
+    assert verde[int(300 * DPI / 72), int(300 * DPI / 72)]
+
+
+def test_paginas_identicas_sin_mascaras(documentos):
+    doc_a, _ = documentos
+    resultado = fc.procesar_hoja_teselada(doc_a, doc_a, 0, DPI, TESELA, sin_cambios=True)
+
+    assert not resultado.tiene_cambios
+    np.testing.assert_array_equal(resultado.fondo, doc_a.renderizar_pagina(0, DPI, gris=True))